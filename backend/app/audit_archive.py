@@ -0,0 +1,403 @@
+"""Tiered audit retention: old events move from audit_events into immutable segment files.
+
+The archive job takes sealed, checkpointed events older than AFTERME_AUDIT_RETENTION_DAYS,
+re-checks their hash chain, and writes them as one segment file per AUDIT_SEGMENT_EVENTS
+events under AFTERME_AUDIT_ARCHIVE_DIR, then deletes them from the table in the same
+transaction that records the segment in audit_segments. Segments are cut along the chain, so
+with AFTERME_AUDIT_CHAIN=0 nothing is archived (and the job says so in the log).
+
+A segment is columnar: rows are split into groups, and each group stores every column as
+its own zlib-compressed chunk (integers delta-encoded, strings as lengths + bytes). The footer
+is the sparse index: per group, the id/seq/time ranges and a bloom filter of actors, so a read
+decodes only the groups, and in them only the columns, it needs. Files are read through mmap
+and chunks are decompressed straight out of the mapping.
+
+    file = MAGIC | chunk ... | zlib(footer json) | footer length (u64) | MAGIC
+
+`scan` and `sealed` are the read side; routes/audit.py and audit_chain.py merge them with the
+live table.
+"""
+import base64, hashlib, json, logging, mmap, os, struct, threading, zlib
+from array import array
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timedelta
+from itertools import accumulate
+from sqlalchemy import delete, func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from .db import SessionLocal
+from .jobs import enqueue, handler
+from . import models
+
+logger = logging.getLogger("afterme.audit")
+
+AUDIT_RETENTION = timedelta(days=float(os.environ.get("AFTERME_AUDIT_RETENTION_DAYS", "90")))  # 0 = keep everything live
+AUDIT_ARCHIVE_DIR = os.environ.get("AFTERME_AUDIT_ARCHIVE_DIR", "./audit-archive")
+AUDIT_ARCHIVE_INTERVAL = timedelta(seconds=float(os.environ.get("AFTERME_AUDIT_ARCHIVE_INTERVAL", "3600")))
+AUDIT_SEGMENT_EVENTS = int(os.environ.get("AFTERME_AUDIT_SEGMENT_EVENTS", str(256 * 1024)))
+AUDIT_SEGMENT_CACHE = int(os.environ.get("AFTERME_AUDIT_SEGMENT_CACHE", "32"))  # open mappings kept
+GROUP_ROWS = 1024
+MAGIC = b"AFTSEG01"
+EPOCH = datetime(1970, 1, 1)
+
+ArchivedEvent = namedtuple(
+    "ArchivedEvent",
+    ["id", "actor", "action", "target_type", "target_id", "metadata_json", "created_at", "seq", "entry_hash"],
+)
+INT_COLUMNS = ("id", "seq", "created_at")
+STR_COLUMNS = ("actor", "action", "target_type", "target_id", "metadata_json")
+COLUMNS = INT_COLUMNS + STR_COLUMNS + ("entry_hash",)
+
+def _micros(dt: datetime) -> int:
+    return (dt - EPOCH) // timedelta(microseconds=1)
+
+def _datetime(us: int) -> datetime:
+    return EPOCH + timedelta(microseconds=us)
+
+# -- bloom filter over actors, one per group ---------------------------------------------
+
+BLOOM_BITS_PER_KEY = 10
+BLOOM_HASHES = 7
+
+def _bloom_key(key: str) -> tuple[int, int]:
+    return struct.unpack("<II", hashlib.blake2b(key.encode(), digest_size=8).digest())
+
+def _bloom_positions(hk: tuple[int, int], bits: int):
+    return [(hk[0] + i * hk[1]) % bits for i in range(BLOOM_HASHES)]
+
+def _bloom(keys: set[str]) -> bytes:
+    bits = max(64, len(keys) * BLOOM_BITS_PER_KEY)
+    buf = bytearray((bits + 7) // 8)
+    for key in keys:
+        for p in _bloom_positions(_bloom_key(key), len(buf) * 8):
+            buf[p >> 3] |= 1 << (p & 7)
+    return bytes(buf)
+
+def _bloom_has(buf: bytes, hk: tuple[int, int]) -> bool:
+    return all(buf[p >> 3] & (1 << (p & 7)) for p in _bloom_positions(hk, len(buf) * 8))
+
+# -- column encodings ---------------------------------------------------------------------
+
+def _encode_ints(values: list[int]) -> bytes:
+    return zlib.compress(array("q", [b - a for a, b in zip([0] + values, values)]).tobytes())
+
+def _decode_ints(chunk) -> list[int]:
+    deltas = array("q")
+    deltas.frombytes(zlib.decompress(chunk))
+    return list(accumulate(deltas))
+
+def _encode_strs(values: list[str]) -> bytes:
+    # NUL-separated when no value contains one (always, for what the app logs), which decodes
+    # with a single split; length-prefixed otherwise.
+    if not any("\x00" in v for v in values):
+        return zlib.compress(b"\x00" + "\x00".join(values).encode())
+    data = [v.encode() for v in values]
+    lengths = array("I", map(len, data)).tobytes()
+    return zlib.compress(b"\x01" + struct.pack("<I", len(lengths)) + lengths + b"".join(data))
+
+def _decode_strs(chunk) -> list[str]:
+    raw = zlib.decompress(chunk)
+    if raw[0] == 0:
+        return raw[1:].decode().split("\x00")
+    (n,) = struct.unpack_from("<I", raw, 1)
+    lengths = array("I")
+    lengths.frombytes(raw[5:5 + n])
+    out, pos = [], 5 + n
+    for length in lengths:
+        out.append(raw[pos:pos + length].decode())
+        pos += length
+    return out
+
+def _encode_hashes(values: list[str]) -> bytes:
+    return zlib.compress(b"".join(bytes.fromhex(v) for v in values), 1)
+
+def _decode_hashes(chunk) -> bytes:
+    return zlib.decompress(chunk)  # 32 bytes per row, sliced out per selected row
+
+def _encode(name: str, values: list) -> bytes:
+    if name == "created_at":
+        return _encode_ints([_micros(v) for v in values])
+    if name in INT_COLUMNS:
+        return _encode_ints(values)
+    if name == "entry_hash":
+        return _encode_hashes(values)
+    return _encode_strs(values)
+
+def _decode(name: str, chunk):
+    """Column values; created_at stays in microseconds and entry_hash as packed bytes until a
+    row is actually built from them."""
+    if name in INT_COLUMNS:
+        return _decode_ints(chunk)
+    if name == "entry_hash":
+        return _decode_hashes(chunk)
+    return _decode_strs(chunk)
+
+# -- segment files ------------------------------------------------------------------------
+
+def write_segment(path: str, rows: list) -> int:
+    """Write `rows` (ArchivedEvent-like, in seq order) to `path`; returns the file size."""
+    groups = []
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC)
+        for lo in range(0, len(rows), GROUP_ROWS):
+            part = rows[lo:lo + GROUP_ROWS]
+            chunks = []
+            for name in COLUMNS:
+                data = _encode(name, [getattr(r, name) for r in part])
+                chunks.append([f.tell(), len(data)])
+                f.write(data)
+            groups.append({
+                "rows": len(part),
+                "id": [min(r.id for r in part), max(r.id for r in part)],
+                "seq": [part[0].seq, part[-1].seq],
+                "ts": [_micros(min(r.created_at for r in part)), _micros(max(r.created_at for r in part))],
+                "actors": base64.b64encode(_bloom({r.actor for r in part})).decode(),
+                "chunks": chunks,
+            })
+        footer = zlib.compress(json.dumps({"columns": COLUMNS, "rows": len(rows), "groups": groups}).encode())
+        f.write(footer)
+        f.write(struct.pack("<Q", len(footer)) + MAGIC)
+        f.flush()
+        os.fsync(f.fileno())
+        size = f.tell()
+    os.replace(tmp, path)
+    return size
+
+class Segment:
+    """Read side of one segment file, mapped once and shared by every request."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        end = len(self._mm)
+        if self._mm[:8] != MAGIC or self._mm[end - 8:] != MAGIC:
+            raise ValueError(f"{path} is not an audit segment")
+        (footer_len,) = struct.unpack_from("<Q", self._mm, end - 16)
+        footer = json.loads(zlib.decompress(memoryview(self._mm)[end - 16 - footer_len:end - 16]))
+        self.columns = {name: i for i, name in enumerate(footer["columns"])}
+        self.groups = footer["groups"]
+        for g in self.groups:
+            g["actors"] = base64.b64decode(g["actors"])
+
+    def column(self, group: dict, name: str) -> list:
+        offset, length = group["chunks"][self.columns[name]]
+        return _decode(name, memoryview(self._mm)[offset:offset + length])  # no copy before zlib
+
+    def rows(self, group: dict, indices: list[int], decoded: dict) -> list[ArchivedEvent]:
+        c = {name: decoded[name] if name in decoded else self.column(group, name) for name in ArchivedEvent._fields}
+        hashes = c["entry_hash"]
+        return [
+            ArchivedEvent(
+                c["id"][i], c["actor"][i], c["action"][i], c["target_type"][i], c["target_id"][i], c["metadata_json"][i],
+                _datetime(c["created_at"][i]), c["seq"][i], hashes[i * 32:i * 32 + 32].hex(),
+            )
+            for i in indices
+        ]
+
+_segments: OrderedDict[str, Segment] = OrderedDict()
+_segments_lock = threading.Lock()
+
+def open_segment(name: str) -> Segment:
+    path = os.path.join(AUDIT_ARCHIVE_DIR, name)
+    with _segments_lock:
+        seg = _segments.get(path)
+        if seg is not None:
+            _segments.move_to_end(path)
+            return seg
+    seg = Segment(path)
+    with _segments_lock:
+        _segments[path] = seg
+        while len(_segments) > AUDIT_SEGMENT_CACHE:
+            _segments.popitem(last=False)  # unmapped once the last reader lets go
+    return seg
+
+# -- reads ----------------------------------------------------------------------------------
+
+def scan(
+    db: Session,
+    actor: str | None = None,
+    action: str | None = None,
+    target_type: str | None = None,
+    target_id: str | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    before_id: int | None = None,
+    descending: bool = False,
+    after_id: int | None = None,
+):
+    """Archived events matching the same filters as the live audit queries, in seq order
+    (reversed if `descending`), optionally only those with after_id < id < before_id."""
+    s = models.AuditSegment
+    q = select(s.path)
+    if since:
+        q = q.where(s.max_created_at >= since)
+    if until:
+        q = q.where(s.min_created_at < until)
+    if before_id is not None:
+        q = q.where(s.first_id < before_id)
+    if after_id is not None:
+        q = q.where(s.last_id > after_id)
+    names = list(db.execute(q.order_by(s.first_seq.desc() if descending else s.first_seq)).scalars())
+    lo = _micros(since) if since else None
+    hi = _micros(until) if until else None
+    actor_key = _bloom_key(actor) if actor else None
+    equal = [(n, v) for n, v in (("actor", actor), ("action", action), ("target_type", target_type), ("target_id", target_id)) if v]
+    for name in names:
+        seg = open_segment(name)
+        for g in reversed(seg.groups) if descending else seg.groups:
+            # Sparse index: skip groups outside the time/id window or without the actor.
+            if (lo is not None and g["ts"][1] < lo) or (hi is not None and g["ts"][0] >= hi):
+                continue
+            if before_id is not None and g["id"][0] >= before_id:
+                continue
+            if after_id is not None and g["id"][1] <= after_id:
+                continue
+            if actor_key and not _bloom_has(g["actors"], actor_key):
+                continue
+            decoded, keep = {}, range(g["rows"])
+            if lo is not None or hi is not None:
+                ts = decoded["created_at"] = seg.column(g, "created_at")
+                keep = [i for i in keep if (lo is None or ts[i] >= lo) and (hi is None or ts[i] < hi)]
+            if (before_id is not None or after_id is not None) and keep:
+                ids = decoded["id"] = seg.column(g, "id")
+                keep = [i for i in keep if (before_id is None or ids[i] < before_id) and (after_id is None or ids[i] > after_id)]
+            for col, value in equal:
+                if not keep:
+                    break
+                vals = decoded[col] = seg.column(g, col)
+                keep = [i for i in keep if vals[i] == value]
+            if keep:
+                rows = seg.rows(g, list(keep), decoded)
+                yield from reversed(rows) if descending else rows
+
+def sealed(db: Session, first_seq: int, last_seq: int):
+    """Archived events with first_seq <= seq <= last_seq, in seq order."""
+    s = models.AuditSegment
+    names = db.execute(
+        select(s.path).where(s.first_seq <= last_seq).where(s.last_seq >= first_seq).order_by(s.first_seq)
+    ).scalars()
+    for name in names:
+        seg = open_segment(name)
+        for g in seg.groups:
+            if g["seq"][1] < first_seq or g["seq"][0] > last_seq:
+                continue
+            seqs = seg.column(g, "seq")
+            keep = [i for i, q in enumerate(seqs) if first_seq <= q <= last_seq]
+            yield from seg.rows(g, keep, {"seq": seqs})
+
+def by_id(db: Session, event_id: int) -> ArchivedEvent | None:
+    s = models.AuditSegment
+    for name in db.execute(select(s.path).where(s.first_id <= event_id).where(s.last_id >= event_id)).scalars():
+        seg = open_segment(name)
+        for g in seg.groups:
+            if g["id"][0] <= event_id <= g["id"][1]:
+                ids = seg.column(g, "id")
+                if event_id in ids:
+                    return seg.rows(g, [ids.index(event_id)], {"id": ids})[0]
+    return None
+
+def head(db: Session) -> tuple[int, str] | None:
+    """(seq, entry_hash) of the newest archived event."""
+    row = db.execute(
+        select(models.AuditSegment.last_seq, models.AuditSegment.last_hash).order_by(models.AuditSegment.last_seq.desc()).limit(1)
+    ).first()
+    return (row.last_seq, row.last_hash) if row else None
+
+def seq_bounds(db: Session, since: datetime | None, until: datetime | None) -> tuple[int | None, int | None]:
+    """Seq range of the segments holding events in [since, until) (segment granularity)."""
+    s = models.AuditSegment
+    first = last = None
+    if since is not None:
+        first = db.execute(select(func.min(s.first_seq)).where(s.max_created_at >= since)).scalar()
+    if until is not None:
+        last = db.execute(select(func.max(s.last_seq)).where(s.min_created_at < until)).scalar()
+    return first, last
+
+# -- archiving ------------------------------------------------------------------------------
+
+def _archive_one(cutoff: datetime) -> int:
+    from .audit_chain import GENESIS, leaf_hash
+
+    e, s = models.AuditEvent, models.AuditSegment
+    with SessionLocal() as db:
+        prev = head(db)
+        done, prev_hash = (prev[0], bytes.fromhex(prev[1])) if prev else (0, GENESIS)
+        # Everything before the oldest young event, in whole checkpointed blocks.
+        young = db.execute(select(func.min(e.seq)).where(e.created_at >= cutoff)).scalar()
+        bound = done + AUDIT_SEGMENT_EVENTS if young is None else min(young - 1, done + AUDIT_SEGMENT_EVENTS)
+        end = db.execute(
+            select(func.max(models.AuditCheckpoint.last_seq)).where(models.AuditCheckpoint.last_seq <= bound)
+        ).scalar()
+        if not end or end <= done:
+            return 0
+        rows = db.execute(
+            select(e.id, e.actor, e.action, e.target_type, e.target_id, e.metadata_json, e.created_at, e.seq, e.entry_hash)
+            .where(e.seq.between(done + 1, end)).order_by(e.seq)
+        ).all()
+        if len(rows) != end - done or rows[0].seq != done + 1:
+            logger.error("audit archive: events %d..%d are incomplete, not archiving", done + 1, end)
+            return 0
+        for r in rows:
+            prev_hash = hashlib.sha256(prev_hash + leaf_hash(r, r.seq)).digest()
+            if prev_hash.hex() != r.entry_hash:
+                logger.error("audit archive: chain broken at seq %d, not archiving", r.seq)
+                return 0
+
+        name = f"audit-{done + 1:012d}-{end:012d}.seg"
+        os.makedirs(AUDIT_ARCHIVE_DIR, exist_ok=True)
+        size = write_segment(os.path.join(AUDIT_ARCHIVE_DIR, name), rows)
+        db.add(s(
+            path=name, first_seq=done + 1, last_seq=end,
+            first_id=min(r.id for r in rows), last_id=max(r.id for r in rows),
+            min_created_at=min(r.created_at for r in rows), max_created_at=max(r.created_at for r in rows),
+            rows=len(rows), bytes=size, last_hash=rows[-1].entry_hash, created_at=datetime.utcnow(),
+        ))
+        db.execute(delete(e).where(e.seq.between(done + 1, end)))
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()  # another archiver wrote the same range (and the same file)
+            return 0
+    logger.info("archived audit events %d..%d to %s (%d bytes)", done + 1, end, name, size)
+    return len(rows)
+
+_warned = False
+
+def _enabled() -> bool:
+    global _warned
+    from .audit_chain import AUDIT_CHAIN
+
+    if AUDIT_RETENTION and not AUDIT_CHAIN and not _warned:
+        logger.warning("audit archive: AFTERME_AUDIT_CHAIN=0, so there are no checkpointed blocks to archive; "
+                       "every event stays in audit_events")
+        _warned = True
+    return bool(AUDIT_RETENTION) and AUDIT_CHAIN
+
+def archive(now: datetime | None = None) -> int:
+    """Archive every due event; returns how many moved out of audit_events."""
+    if not _enabled():
+        return 0
+    cutoff = (now or datetime.utcnow()) - AUDIT_RETENTION
+    total = 0
+    while n := _archive_one(cutoff):
+        total += n
+    return total
+
+@handler("audit_archive")
+def run_archive(payload: dict, attempt: int, final: bool):
+    archive()
+
+def schedule(db: Session) -> bool:
+    """Queue an archive run unless one is already waiting; the caller commits and notifies."""
+    if not _enabled():
+        return False
+    j = models.Job
+    if db.query(j.id).filter(j.kind == "audit_archive", j.status.in_(["queued", "running"])).first():
+        return False
+    enqueue(db, "audit_archive", {})
+    return True
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    print(f"archived {archive()} events")
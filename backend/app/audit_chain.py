@@ -0,0 +1,270 @@
+"""Tamper evidence for the audit log: a hash chain plus Merkle checkpoints.
+
+Rows are inserted unsealed (seq and entry_hash NULL), so neither request handlers nor the
+batched audit writer wait on each other. The sealer then takes unsealed rows in id order,
+numbers them with a gap-free seq and chains them:
+
+    leaf(e)       = sha256(0x00 || canonical(e))
+    entry_hash(n) = sha256(entry_hash(n-1) || leaf(n)),   entry_hash(0) = 32 zero bytes
+
+Every AUDIT_BLOCK_SIZE sealed events get an audit_checkpoints row holding the Merkle root of
+the block's leaves and the chain hash at its last event. An event's inclusion proof is its path
+inside the block plus the block root's path in a tree over all checkpoint roots: O(log n)
+hashes. A verifier that remembers the last block it checked only rescans the blocks after it.
+
+Several sealers (one per worker process) may race; the unique index on seq lets exactly one
+of them commit a given range, the others roll back and retry on their next pass.
+"""
+import hashlib, json, logging, os
+from datetime import datetime
+from sqlalchemy import bindparam, func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from .db import SessionLocal
+from . import audit_archive, models
+
+logger = logging.getLogger("afterme.audit")
+
+AUDIT_CHAIN = os.environ.get("AFTERME_AUDIT_CHAIN", "1") == "1"
+AUDIT_BLOCK_SIZE = int(os.environ.get("AFTERME_AUDIT_BLOCK_SIZE", "1024"))
+SEAL_BATCH = int(os.environ.get("AFTERME_AUDIT_SEAL_BATCH", "5000"))
+VERIFY_BATCH = 10_000
+GENESIS = bytes(32)
+
+_sha256 = hashlib.sha256
+E = models.AuditEvent
+_LEAF_COLUMNS = (E.id, E.actor, E.action, E.target_type, E.target_id, E.metadata_json, E.created_at)
+
+def leaf_hash(row, seq: int) -> bytes:
+    """`row` has the _LEAF_COLUMNS attributes; seq is part of the leaf so events can't be reordered."""
+    canonical = json.dumps(
+        [seq, row.id, row.actor, row.action, row.target_type, row.target_id, row.metadata_json, row.created_at.isoformat()],
+        separators=(",", ":"), ensure_ascii=False,
+    )
+    return _sha256(b"\x00" + canonical.encode()).digest()
+
+def _node(left: bytes, right: bytes) -> bytes:
+    return _sha256(b"\x01" + left + right).digest()
+
+def merkle_root(leaves: list[bytes]) -> bytes:
+    level = leaves
+    while len(level) > 1:
+        nxt = [_node(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            nxt.append(level[-1])  # an odd node is promoted unchanged
+        level = nxt
+    return level[0] if level else GENESIS
+
+def merkle_path(leaves: list[bytes], index: int) -> list[list[str]]:
+    """Sibling hashes from leaf to root as [side, hex], side being where the sibling sits."""
+    path, level = [], leaves
+    while len(level) > 1:
+        sibling = index ^ 1
+        if sibling < len(level):
+            path.append(["L" if sibling < index else "R", level[sibling].hex()])
+        nxt = [_node(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            nxt.append(level[-1])
+        level, index = nxt, index // 2
+    return path
+
+def apply_path(leaf: bytes, path: list[list[str]]) -> bytes:
+    h = leaf
+    for side, sibling in path:
+        h = _node(bytes.fromhex(sibling), h) if side == "L" else _node(h, bytes.fromhex(sibling))
+    return h
+
+def _head(db: Session) -> tuple[int, bytes]:
+    row = db.execute(select(E.seq, E.entry_hash).where(E.seq.is_not(None)).order_by(E.seq.desc()).limit(1)).first()
+    if row is None:
+        row = audit_archive.head(db)  # every sealed event has been archived
+    return (row[0], bytes.fromhex(row[1])) if row else (0, GENESIS)
+
+def _block_leaves(db: Session, block: int) -> list[bytes]:
+    first = block * AUDIT_BLOCK_SIZE + 1
+    return [leaf_hash(r, r.seq) for r in _sealed_rows(db, first, first + AUDIT_BLOCK_SIZE - 1)]
+
+def _checkpoint(db: Session, head_seq: int, head_hash: bytes, fresh: dict[int, bytes]):
+    """Write checkpoints for every block completed up to head_seq. `fresh` holds leaves sealed in
+    this pass so the block being closed doesn't have to be read back."""
+    last = db.execute(select(func.max(models.AuditCheckpoint.block))).scalar()
+    block = 0 if last is None else last + 1
+    while (block + 1) * AUDIT_BLOCK_SIZE <= head_seq:
+        first, end = block * AUDIT_BLOCK_SIZE + 1, (block + 1) * AUDIT_BLOCK_SIZE
+        if first in fresh and end in fresh:
+            leaves = [fresh[s] for s in range(first, end + 1)]
+        else:
+            leaves = _block_leaves(db, block)
+        chain = head_hash.hex() if end == head_seq else db.execute(select(E.entry_hash).where(E.seq == end)).scalar()
+        db.add(models.AuditCheckpoint(
+            block=block, first_seq=first, last_seq=end,
+            merkle_root=merkle_root(leaves).hex(), chain_hash=chain, created_at=datetime.utcnow(),
+        ))
+        block += 1
+
+def seal(limit: int = SEAL_BATCH) -> int:
+    """Chain up to `limit` unsealed events and checkpoint any completed blocks; returns how many were sealed."""
+    with SessionLocal() as db:
+        seq, prev = _head(db)
+        rows = db.execute(select(*_LEAF_COLUMNS).where(E.seq.is_(None)).order_by(E.id).limit(limit)).all()
+        if not rows:
+            return 0
+        params, fresh = [], {}
+        for r in rows:
+            seq += 1
+            leaf = leaf_hash(r, seq)
+            prev = _sha256(prev + leaf).digest()
+            fresh[seq] = leaf
+            params.append({"eid": r.id, "s": seq, "h": prev.hex()})
+        t = E.__table__  # Core UPDATE: executemany with our own bind names
+        db.execute(
+            update(t).where(t.c.id == bindparam("eid")).where(t.c.seq.is_(None))
+            .values(seq=bindparam("s"), entry_hash=bindparam("h")),
+            params,
+        )
+        _checkpoint(db, seq, prev, fresh)
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()  # another sealer took this range first
+            return 0
+    return len(rows)
+
+def seal_all() -> int:
+    total = 0
+    while n := seal():
+        total += n
+    return total
+
+def checkpoint_roots(db: Session) -> list[bytes]:
+    return [bytes.fromhex(r) for r in db.execute(select(models.AuditCheckpoint.merkle_root).order_by(models.AuditCheckpoint.block)).scalars()]
+
+def anchor(db: Session) -> dict:
+    """What an auditor keeps: the root over all checkpoints, and the block count it covers."""
+    roots = checkpoint_roots(db)
+    head_seq, head_hash = _head(db)
+    return {"blocks": len(roots), "root": merkle_root(roots).hex(), "head_seq": head_seq, "head_hash": head_hash.hex()}
+
+def prove(db: Session, event_id: int) -> dict | None:
+    """Inclusion proof for one event, or None if it isn't covered by a checkpoint yet."""
+    row = db.execute(select(*_LEAF_COLUMNS, E.seq).where(E.id == event_id)).first() or audit_archive.by_id(db, event_id)
+    if row is None or row.seq is None:
+        return None
+    block, index = divmod(row.seq - 1, AUDIT_BLOCK_SIZE)
+    cp = db.get(models.AuditCheckpoint, block)
+    if cp is None:
+        return None
+    leaves = _block_leaves(db, block)
+    roots = checkpoint_roots(db)
+    return {
+        "event_id": event_id,
+        "seq": row.seq,
+        "leaf": leaf_hash(row, row.seq).hex(),
+        "block": block,
+        "block_path": merkle_path(leaves, index),
+        "block_root": cp.merkle_root,
+        "anchor_path": merkle_path(roots, block),
+        "anchor_root": merkle_root(roots).hex(),
+        "anchor_blocks": len(roots),
+    }
+
+def check_proof(proof: dict) -> bool:
+    block_root = apply_path(bytes.fromhex(proof["leaf"]), proof["block_path"])
+    if block_root.hex() != proof["block_root"]:
+        return False
+    return apply_path(block_root, proof["anchor_path"]).hex() == proof["anchor_root"]
+
+def _sealed_rows(db: Session, first: int, last: int):
+    """Sealed events with first <= seq <= last, in seq order; archived ones come first."""
+    yield from audit_archive.sealed(db, first, last)
+    stmt = (
+        select(*_LEAF_COLUMNS, E.seq, E.entry_hash)
+        .where(E.seq.between(first, last)).order_by(E.seq)
+        .execution_options(yield_per=VERIFY_BATCH)
+    )
+    for rows in db.execute(stmt).partitions():
+        yield from rows
+
+def verify(db: Session, from_block: int = 0, to_block: int | None = None, tail: bool = True) -> dict:
+    """Recompute blocks from_block..to_block against their checkpoints, then (if `tail`) the sealed
+    events after the last checkpoint. Starts from the chain hash stored at from_block - 1, so an
+    auditor who already checked up to some block only pays for what came after it."""
+    cps = db.query(models.AuditCheckpoint).filter(models.AuditCheckpoint.block >= from_block)
+    if to_block is not None:
+        cps = cps.filter(models.AuditCheckpoint.block <= to_block)
+    cps = cps.order_by(models.AuditCheckpoint.block).all()
+    if from_block > 0:
+        start = db.get(models.AuditCheckpoint, from_block - 1)
+        if start is None:
+            return {"ok": False, "error": f"no checkpoint for block {from_block - 1}", "blocks": 0, "events": 0}
+        prev, next_seq = bytes.fromhex(start.chain_hash), start.last_seq + 1
+    else:
+        prev, next_seq = GENESIS, 1
+    result = {"ok": True, "from_block": from_block, "blocks": 0, "events": 0}
+
+    def fail(reason: str, **where):
+        result.update(ok=False, error=reason, **where)
+        return result
+
+    def walk(first: int, last: int, leaves: list | None):
+        nonlocal prev, next_seq
+        for r in _sealed_rows(db, first, last):
+            if r.seq != next_seq:
+                return f"seq {next_seq} missing"
+            leaf = leaf_hash(r, r.seq)
+            prev = _sha256(prev + leaf).digest()
+            if prev.hex() != r.entry_hash:
+                return f"chain broken at seq {r.seq} (event {r.id})"
+            if leaves is not None:
+                leaves.append(leaf)
+            next_seq += 1
+            result["events"] += 1
+        return None
+
+    for cp in cps:
+        if cp.first_seq != next_seq:
+            return fail(f"checkpoint {cp.block} starts at seq {cp.first_seq}, expected {next_seq}", block=cp.block)
+        leaves: list[bytes] = []
+        if err := walk(cp.first_seq, cp.last_seq, leaves):
+            return fail(err, block=cp.block)
+        if next_seq != cp.last_seq + 1:
+            return fail(f"block {cp.block} is missing events", block=cp.block)
+        if merkle_root(leaves).hex() != cp.merkle_root:
+            return fail(f"merkle root mismatch in block {cp.block}", block=cp.block)
+        if prev.hex() != cp.chain_hash:
+            return fail(f"chain hash mismatch at end of block {cp.block}", block=cp.block)
+        result["blocks"] += 1
+        result["last_block"] = cp.block
+    if tail and to_block is None:
+        head_seq, _ = _head(db)
+        if head_seq >= next_seq and (err := walk(next_seq, head_seq, None)):
+            return fail(err)
+    result["head_seq"] = next_seq - 1
+    result["head_hash"] = prev.hex()
+    return result
+
+def blocks_between(db: Session, since: datetime | None, until: datetime | None) -> tuple[int, int | None]:
+    """Checkpointed blocks that hold the events created in [since, until)."""
+    first, last = 0, None
+    archived_first, archived_last = audit_archive.seq_bounds(db, since, until)
+    if since is not None:
+        seq = archived_first or db.execute(select(func.min(E.seq)).where(E.created_at >= since)).scalar()
+        first = (seq - 1) // AUDIT_BLOCK_SIZE if seq else 0
+    if until is not None:
+        seq = db.execute(select(func.max(E.seq)).where(E.created_at < until)).scalar() or archived_last
+        last = (seq - 1) // AUDIT_BLOCK_SIZE if seq else -1
+    return first, last
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Seal pending audit events and verify the chain.")
+    ap.add_argument("--from-block", type=int, default=0, help="resume after a previously verified block")
+    ap.add_argument("--no-seal", action="store_true")
+    args = ap.parse_args()
+    if not args.no_seal:
+        print(f"sealed {seal_all()} events")
+    with SessionLocal() as db:
+        report = verify(db, args.from_block)
+        report["anchor"] = anchor(db)
+    print(json.dumps(report, indent=2))
+    raise SystemExit(0 if report["ok"] else 1)
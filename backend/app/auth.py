@@ -1,13 +1,15 @@
-from fastapi import Depends, HTTPException
+from fastapi import Depends, Header, HTTPException
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from itsdangerous import URLSafeSerializer
 import hashlib, hmac, os, secrets
 
 SECRET = os.environ.get("AFTERME_AUTH_SECRET", "dev-secret-change-me")
 serializer = URLSafeSerializer(SECRET, salt="afterme-auth")
+ADMIN_TOKEN = os.environ.get("AFTERME_ADMIN_TOKEN", "dev-admin-token-change-me")
 
 security = HTTPBearer(auto_error=False)
-PASSWORD_ITERATIONS = 120_000
+# Cost for new hashes; users hashed at a different cost are rehashed on their next login.
+PASSWORD_ITERATIONS = int(os.environ.get("AFTERME_PASSWORD_ITERATIONS", "120000"))
 
 def make_token(user_id: int) -> str:
     return serializer.dumps({"user_id": user_id})
@@ -22,17 +24,21 @@ def require_user_id(creds: HTTPAuthorizationCredentials = Depends(security)) ->
     except Exception:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-def hash_password(password: str, salt: str | None = None) -> tuple[str, str]:
+def require_admin(x_admin_token: str | None = Header(None)) -> None:
+    if x_admin_token is None or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+def hash_password(password: str, salt: str | None = None, iterations: int = PASSWORD_ITERATIONS) -> tuple[str, str]:
     if salt is None:
         salt = secrets.token_hex(16)
     digest = hashlib.pbkdf2_hmac(
         "sha256",
         password.encode("utf-8"),
         salt.encode("utf-8"),
-        PASSWORD_ITERATIONS,
+        iterations,
     ).hex()
     return salt, digest
 
-def verify_password(password: str, salt: str, expected_hash: str) -> bool:
-    _, digest = hash_password(password, salt=salt)
+def verify_password(password: str, salt: str, expected_hash: str, iterations: int = PASSWORD_ITERATIONS) -> bool:
+    _, digest = hash_password(password, salt=salt, iterations=iterations)
     return hmac.compare_digest(digest, expected_hash)
@@ -0,0 +1,39 @@
+import hashlib, os, tempfile
+from fastapi import HTTPException, UploadFile
+
+UPLOAD_DIR = os.environ.get("AFTERME_UPLOAD_DIR", "app/../uploads")
+MAX_UPLOAD_BYTES = int(os.environ.get("AFTERME_MAX_UPLOAD_MB", "25")) * 1024 * 1024
+CHUNK_SIZE = 1024 * 1024
+
+def blob_path(digest: str) -> str:
+    return os.path.join(UPLOAD_DIR, "blobs", digest[:2], digest)
+
+def store_upload(upload: UploadFile, max_bytes: int = MAX_UPLOAD_BYTES) -> str:
+    """Stream an upload to disk, hashing as we go, and return the path of its content-addressed blob.
+
+    Identical documents share one blob, so resubmitting a claim doesn't store the files again.
+    """
+    tmp_dir = os.path.join(UPLOAD_DIR, "tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    sha = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while chunk := upload.file.read(CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(status_code=413, detail=f"{upload.filename or 'upload'} exceeds {max_bytes // (1024 * 1024)} MB")
+                sha.update(chunk)
+                out.write(chunk)
+        path = blob_path(sha.hexdigest())
+        if os.path.exists(path):
+            os.remove(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+        return path
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -0,0 +1,112 @@
+import logging, os, threading
+from datetime import datetime, timedelta
+from sqlalchemy import bindparam, or_, update
+from .db import SessionLocal
+from . import models
+
+logger = logging.getLogger("afterme.checkins")
+
+CHECKIN_FLUSH_INTERVAL = float(os.environ.get("AFTERME_CHECKIN_FLUSH_INTERVAL", "2"))  # seconds
+CHECKIN_FLUSH_BATCH = int(os.environ.get("AFTERME_CHECKIN_FLUSH_BATCH", "1000"))
+
+class CheckinBuffer:
+    """Coalesces "I'm alive" check-ins: only the latest timestamp per user is kept and
+    written, in batches, every `flush_interval` seconds."""
+
+    def __init__(self, flush_interval: float, batch_size: int):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._pending: dict[int, datetime] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.received = 0
+        self.written = 0
+
+    def record(self, user_id: int, at: datetime):
+        with self._lock:
+            self.received += 1
+            prev = self._pending.get(user_id)
+            if prev is None or at > prev:
+                self._pending[user_id] = at
+
+    def pending_for(self, user_id: int) -> datetime | None:
+        with self._lock:
+            return self._pending.get(user_id)
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="checkin-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def flush(self) -> int:
+        """Write every pending check-in; returns how many made it to the database."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        items = list(pending.items())
+        for i in range(0, len(items), self.batch_size):
+            try:
+                self._write(items[i:i + self.batch_size])
+            except Exception:
+                logger.exception("failed to write check-ins; requeueing")
+                self._requeue(items[i:])
+                return i
+        return len(items)
+
+    def _requeue(self, items: list[tuple[int, datetime]]):
+        # Not through record(): these were already counted as received.
+        with self._lock:
+            for user_id, at in items:
+                prev = self._pending.get(user_id)
+                if prev is None or at > prev:
+                    self._pending[user_id] = at
+
+    def _write(self, batch: list[tuple[int, datetime]]):
+        u = models.User
+        with SessionLocal() as db:
+            intervals = dict(db.query(u.id, u.checkin_interval_hours).filter(u.id.in_([uid for uid, _ in batch])).all())
+            params = [
+                {"uid": uid, "ts": at, "due": at + timedelta(hours=intervals[uid])}
+                for uid, at in batch if uid in intervals
+            ]
+            updated = 0
+            if params:
+                # Multiple workers may flush the same user; never move a check-in backwards.
+                updated = db.connection().execute(
+                    update(u)
+                    .where(u.id == bindparam("uid"))
+                    .where(or_(u.last_checkin_at.is_(None), u.last_checkin_at < bindparam("ts")))
+                    .values(last_checkin_at=bindparam("ts"), next_due_at=bindparam("due")),
+                    params,
+                ).rowcount
+            db.commit()
+        with self._lock:
+            self.written += max(updated, 0)  # rows actually moved forward; deleted users don't count
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+buffer = CheckinBuffer(CHECKIN_FLUSH_INTERVAL, CHECKIN_FLUSH_BATCH)
+
+def overdue_owners(db, now: datetime, after: tuple[datetime, int] | None, limit: int) -> list[models.User]:
+    """Owners whose next check-in is past due, oldest deadline first: a range scan on next_due_at."""
+    u = models.User
+    q = db.query(u).filter(u.next_due_at <= now)
+    if after is not None:
+        due, uid = after
+        q = q.filter(or_(u.next_due_at > due, (u.next_due_at == due) & (u.id > uid)))
+    return q.order_by(u.next_due_at, u.id).limit(limit).all()
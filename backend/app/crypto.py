@@ -1,21 +1,109 @@
-import json
-import os
-from cryptography.fernet import Fernet
+import json, os, threading, time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from cryptography.fernet import Fernet, InvalidToken
+from sqlalchemy.exc import IntegrityError
+from . import keyring, models
+from .db import SessionLocal
+from .metrics import add_crypto_bytes
 
-# Hackathon-friendly: one server key for demo.
-# In real life: per-vault DEKs + KEK wrapping.
-FERNET_KEY = os.environ.get("AFTERME_FERNET_KEY")
-if not FERNET_KEY:
-    # Generate deterministic dev key if none provided (fine for hackathon).
-    # For production, never auto-generate.
-    FERNET_KEY = Fernet.generate_key().decode()
+# Envelope encryption: each owner has a data key (DEK) that encrypts their payloads; the DEK
+# is stored wrapped by the server key-encryption key (the keyring, see keyring.py). Rotating
+# the KEK only rewraps the data_keys table.
+ENVELOPE_PREFIX = "dek1:"  # values without it predate DEKs and are encrypted with the KEK directly
+DEK_CACHE_SIZE = int(os.environ.get("AFTERME_DEK_CACHE_SIZE", "10000"))
+DEK_CACHE_TTL = float(os.environ.get("AFTERME_DEK_CACHE_TTL", "300"))  # seconds
+BULK_CHUNK = 256
+_bulk_pool = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1), thread_name_prefix="crypto-bulk")
 
-fernet = Fernet(FERNET_KEY.encode() if isinstance(FERNET_KEY, str) else FERNET_KEY)
+class DekCache:
+    """Bounded LRU of unwrapped DEKs; entries also expire after `ttl` seconds."""
 
-def encrypt_payload(payload: dict) -> str:
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[int, tuple[float, Fernet]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, owner_id: int) -> Fernet | None:
+        with self._lock:
+            entry = self._entries.get(owner_id)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[owner_id]
+                return None
+            self._entries.move_to_end(owner_id)
+            return entry[1]
+
+    def put(self, owner_id: int, dek: Fernet):
+        with self._lock:
+            self._entries[owner_id] = (time.monotonic() + self.ttl, dek)
+            self._entries.move_to_end(owner_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+dek_cache = DekCache(DEK_CACHE_SIZE, DEK_CACHE_TTL)
+
+def _kek_decrypt(token: bytes) -> bytes:
+    try:
+        return keyring.fernet().decrypt(token)
+    except InvalidToken:
+        # Another worker may have rotated in a key we haven't loaded yet.
+        if not keyring.reload():
+            raise
+        return keyring.fernet().decrypt(token)
+
+def owner_dek(owner_id: int) -> Fernet:
+    """The owner's unwrapped DEK, created on first use.
+
+    Uses its own short transaction so a new DEK is durable before anything is encrypted with it.
+    """
+    dek = dek_cache.get(owner_id)
+    if dek is not None:
+        return dek
+    with SessionLocal() as db:
+        wrapped = db.query(models.DataKey.wrapped_dek).filter(models.DataKey.owner_id == owner_id).scalar()
+        if wrapped is None:
+            wrapped = keyring.fernet().encrypt(Fernet.generate_key()).decode()
+            db.add(models.DataKey(owner_id=owner_id, wrapped_dek=wrapped))
+            try:
+                db.commit()
+            except IntegrityError:  # a concurrent request created it first
+                db.rollback()
+                wrapped = db.query(models.DataKey.wrapped_dek).filter(models.DataKey.owner_id == owner_id).scalar()
+    dek = Fernet(_kek_decrypt(wrapped.encode()))
+    dek_cache.put(owner_id, dek)
+    return dek
+
+def encrypt_payload(payload: dict, owner_id: int) -> str:
     raw = json.dumps(payload).encode("utf-8")
-    return fernet.encrypt(raw).decode("utf-8")
+    add_crypto_bytes(encrypted=len(raw))
+    return ENVELOPE_PREFIX + owner_dek(owner_id).encrypt(raw).decode("utf-8")
 
-def decrypt_payload(token: str) -> dict:
-    raw = fernet.decrypt(token.encode("utf-8"))
+def decrypt_payload(token: str, owner_id: int) -> dict:
+    if token.startswith(ENVELOPE_PREFIX):
+        raw = owner_dek(owner_id).decrypt(token[len(ENVELOPE_PREFIX):].encode("utf-8"))
+    else:
+        raw = _kek_decrypt(token.encode("utf-8"))
+    add_crypto_bytes(decrypted=len(raw))
     return json.loads(raw.decode("utf-8"))
+
+def encrypt_payloads(payloads: list[dict], owner_id: int) -> list[str]:
+    """encrypt_payload for many payloads of one owner, in parallel chunks."""
+    dek = owner_dek(owner_id)
+
+    def chunk(part: list[dict]) -> tuple[list[str], int]:
+        raws = [json.dumps(p).encode("utf-8") for p in part]
+        return [ENVELOPE_PREFIX + dek.encrypt(raw).decode("utf-8") for raw in raws], sum(map(len, raws))
+
+    parts = [payloads[i:i + BULK_CHUNK] for i in range(0, len(payloads), BULK_CHUNK)]
+    tokens = []
+    for part, size in _bulk_pool.map(chunk, parts):
+        tokens.extend(part)
+        add_crypto_bytes(encrypted=size)  # counted here: pool threads don't see the request context
+    return tokens
@@ -1,12 +1,49 @@
-from sqlalchemy import create_engine
+import os
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
+from .metrics import instrument_engine
 
-DATABASE_URL = "sqlite:///./afterme.db"
+DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///./afterme.db")
 
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False},  # sqlite only
-)
+# SQLite: WAL lets readers run alongside the single writer; busy_timeout makes writers
+# wait for the lock instead of failing with "database is locked".
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("AFTERME_SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_BYTES = int(os.environ.get("AFTERME_SQLITE_MMAP_BYTES", str(256 * 1024 * 1024)))
+
+# Server databases (PostgreSQL): per-process connection pool.
+DB_POOL_SIZE = int(os.environ.get("AFTERME_DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.environ.get("AFTERME_DB_MAX_OVERFLOW", "20"))
+DB_POOL_RECYCLE = int(os.environ.get("AFTERME_DB_POOL_RECYCLE", "1800"))  # seconds
+
+def make_engine(url: str = DATABASE_URL) -> Engine:
+    if not url.startswith("sqlite"):
+        return create_engine(
+            url,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_pre_ping=True,
+        )
+
+    eng = create_engine(
+        url,
+        connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+    )
+
+    @event.listens_for(eng, "connect")
+    def _sqlite_pragmas(dbapi_conn, _record):
+        cur = dbapi_conn.cursor()
+        cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute("PRAGMA synchronous=NORMAL")
+        cur.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cur.execute(f"PRAGMA mmap_size={SQLITE_MMAP_BYTES}")
+        cur.close()
+
+    return eng
+
+engine = make_engine()
+instrument_engine(engine)
 
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 
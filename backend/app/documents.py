@@ -0,0 +1,170 @@
+"""Claim document processing, run by the job workers after submit_claim returns.
+
+Each document is re-hashed against its content-addressed blob name, typed from its magic
+bytes, measured (PDF page count, image dimensions), given a thumbnail when Pillow is
+installed, and passed to the verifier. Results land on Claim.documents_json and
+Claim.documents_status. Claims submitted before this existed are marked "unchecked" by the
+migration (`backfill`) rather than left "queued" with no job behind them.
+
+The verifier is pluggable: AFTERME_DOC_VERIFIER="package.module:function" is called as
+fn(kind, path, metadata) -> {"ok": bool, "reason": str}. The default stub only checks
+that the file is a non-empty PDF or image.
+"""
+import hashlib, importlib, json, os, re, struct
+from datetime import datetime
+from sqlalchemy import select, update
+from sqlalchemy.engine import Connection
+from .blobs import CHUNK_SIZE, UPLOAD_DIR
+from .db import SessionLocal
+from .jobs import handler
+from .listing import bump_owner_version
+from . import models
+
+try:
+    from PIL import Image
+except ImportError:  # thumbnails are optional
+    Image = None
+
+DOC_VERIFIER = os.environ.get("AFTERME_DOC_VERIFIER", "")
+THUMBNAIL_SIZE = (256, 256)
+_PDF_PAGE = re.compile(rb"/Type\s*/Page[^s]")
+
+def sniff(head: bytes) -> str:
+    if head.startswith(b"%PDF"):
+        return "application/pdf"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    return "application/octet-stream"
+
+def _image_size(path: str, mime: str) -> tuple[int, int] | None:
+    with open(path, "rb") as f:
+        if mime == "image/png":
+            f.seek(16)
+            return struct.unpack(">II", f.read(8))
+        # JPEG: walk segments to the first start-of-frame marker.
+        f.seek(2)
+        while True:
+            marker = f.read(2)
+            if len(marker) < 2 or marker[0] != 0xFF:
+                return None
+            (length,) = struct.unpack(">H", f.read(2))
+            if 0xC0 <= marker[1] <= 0xCF and marker[1] not in (0xC4, 0xC8, 0xCC):
+                height, width = struct.unpack(">xHH", f.read(5))
+                return width, height
+            f.seek(length - 2, os.SEEK_CUR)
+
+def _pdf_pages(path: str) -> int:
+    pages, tail = 0, b""
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            buf = tail + chunk
+            pages += len(_PDF_PAGE.findall(buf))
+            tail = buf[-32:]
+            pages -= len(_PDF_PAGE.findall(tail))  # matches in the overlap are counted with the next chunk
+    return pages + len(_PDF_PAGE.findall(tail))
+
+def _thumbnail(path: str, digest: str) -> str | None:
+    if Image is None:
+        return None
+    out = os.path.join(UPLOAD_DIR, "previews", digest[:2], digest + ".png")
+    if not os.path.exists(out):
+        os.makedirs(os.path.dirname(out), exist_ok=True)
+        with Image.open(path) as im:
+            im.thumbnail(THUMBNAIL_SIZE)
+            im.save(out + ".tmp", "PNG")
+        os.replace(out + ".tmp", out)
+    return out
+
+def describe(path: str) -> dict:
+    sha = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        head = f.read(16)
+        f.seek(0)
+        while chunk := f.read(CHUNK_SIZE):
+            sha.update(chunk)
+            size += len(chunk)
+    digest = sha.hexdigest()
+    meta = {"sha256": digest, "bytes": size, "mime": sniff(head), "intact": os.path.basename(path) == digest}
+    if meta["mime"] == "application/pdf":
+        meta["pages"] = _pdf_pages(path)
+    elif meta["mime"].startswith("image/"):
+        meta["dimensions"] = _image_size(path, meta["mime"])
+        meta["preview"] = _thumbnail(path, digest)
+    return meta
+
+def stub_verifier(kind: str, path: str, meta: dict) -> dict:
+    if not meta["bytes"]:
+        return {"ok": False, "reason": "empty file"}
+    if meta["mime"] == "application/octet-stream":
+        return {"ok": False, "reason": "not a PDF or image"}
+    return {"ok": True, "reason": "stub verifier: format accepted"}
+
+def _load_verifier():
+    if not DOC_VERIFIER:
+        return stub_verifier
+    module, _, name = DOC_VERIFIER.partition(":")
+    return getattr(importlib.import_module(module), name)
+
+verifier = _load_verifier()
+
+@handler("claim_documents")
+def process_claim_documents(payload: dict, attempt: int, final: bool):
+    with SessionLocal() as db:
+        claim = db.query(models.Claim).filter(models.Claim.id == payload["claim_id"]).first()
+        if not claim:
+            return
+        paths = {"id_doc": claim.id_doc_path, "death_cert": claim.death_cert_path}
+        owner_id = db.query(models.WillPolicy.owner_id).filter(models.WillPolicy.id == claim.policy_id).scalar()
+
+    results, status = {}, "verified"
+    try:
+        for kind, path in paths.items():
+            meta = describe(path)
+            if not meta["intact"]:
+                verdict = {"ok": False, "reason": "content does not match stored hash"}
+            else:
+                verdict = verifier(kind, path, meta)
+            results[kind] = {**meta, "verdict": verdict}
+            if not verdict["ok"]:
+                status = "rejected"
+    except Exception as e:
+        if not final:
+            raise  # retried by the job queue
+        results["error"] = f"{type(e).__name__}: {e}"
+        status = "error"
+
+    with SessionLocal() as db:
+        db.query(models.Claim).filter(models.Claim.id == payload["claim_id"]).update({
+            "documents_status": status,
+            "documents_json": json.dumps(results),
+            "documents_checked_at": datetime.utcnow(),
+        })
+        bump_owner_version(db, owner_id)
+        db.commit()
+
+def backfill(conn: Connection, batch_size: int = 500) -> int:
+    """Mark claims that say "queued" but have no claim_documents job waiting as "unchecked"."""
+    claims, jobs = models.Claim.__table__, models.Job.__table__
+    queued = conn.execute(
+        select(claims.c.id).where(claims.c.documents_status == "queued").where(claims.c.documents_checked_at.is_(None))
+    ).scalars().all()
+    if not queued:
+        return 0
+    waiting = {
+        json.loads(payload).get("claim_id")
+        for payload in conn.execute(
+            select(jobs.c.payload_json).where(jobs.c.kind == "claim_documents").where(jobs.c.status.in_(["queued", "running"]))
+        ).scalars()
+    }
+    orphans = [cid for cid in queued if cid not in waiting]
+    for i in range(0, len(orphans), batch_size):
+        conn.execute(
+            update(claims)
+            .where(claims.c.id.in_(orphans[i:i + batch_size]))
+            .where(claims.c.documents_status == "queued")  # a worker may have finished it meanwhile
+            .values(documents_status="unchecked")
+        )
+    return len(orphans)
@@ -0,0 +1,282 @@
+"""Idempotency-Key support for the mutating endpoints clients retry.
+
+The first request with a key runs normally and its response is stored; a retry with the same
+key (same caller, route and body) gets the stored response back with `Idempotent-Replayed:
+true`, without running the handler. Retries that arrive while the first request is still
+running wait for it: in-process through an asyncio.Event, across workers by polling the
+pending row. Reusing a key with a different body is a 422.
+
+Hot keys live in a bounded in-memory LRU; every key is also persisted in idempotency_keys
+until AFTERME_IDEMPOTENCY_TTL runs out. 5xx and transient (409, 429, 503) responses aren't
+stored, so the retry runs again.
+
+The request body is hashed as it arrives and spooled (to disk past SPOOL_IN_MEMORY) for the
+handler, so a keyed claim upload costs no more memory than an unkeyed one. Keys are scoped by
+the Authorization header, or for anonymous callers (claim submission, issuing releases) by
+client address, so strangers never share a key space and a changed body is still a 422.
+"""
+import asyncio, hashlib, json, os, re, tempfile, threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+from starlette.concurrency import run_in_threadpool
+from .blobs import MAX_UPLOAD_BYTES
+from .db import SessionLocal
+from .ratelimit import client_ip
+from . import models
+
+IDEMPOTENCY_TTL = timedelta(seconds=float(os.environ.get("AFTERME_IDEMPOTENCY_TTL", str(24 * 3600))))
+IDEMPOTENCY_CACHE_SIZE = int(os.environ.get("AFTERME_IDEMPOTENCY_CACHE_SIZE", "10000"))
+IDEMPOTENCY_WAIT = float(os.environ.get("AFTERME_IDEMPOTENCY_WAIT", "30"))  # seconds a retry waits for the first run
+IDEMPOTENCY_LEASE = timedelta(seconds=float(os.environ.get("AFTERME_IDEMPOTENCY_LEASE", "120")))  # then a pending key is abandoned
+MAX_STORED_BODY = 1024 * 1024
+MAX_REQUEST_BODY = 2 * MAX_UPLOAD_BYTES + 1024 * 1024  # a claim's two documents plus form fields
+SPOOL_IN_MEMORY = 1024 * 1024
+REPLAY_CHUNK = 64 * 1024
+POLL_INTERVAL = 0.05
+
+ROUTES = [re.compile(p) for p in (
+    r"^/vault-items$",
+    r"^/recipients$",
+    r"^/assignments$",
+    r"^/claims$",
+    r"^/claims/\d+/issue-releases$",
+)]
+TRANSIENT = {409, 429, 503}
+REPLAY_HEADERS = {b"content-type", b"etag", b"location"}
+
+class Stored:
+    __slots__ = ("fingerprint", "status", "headers", "body", "expires_at")
+
+    def __init__(self, fingerprint: str, status: int, headers: list, body: bytes, expires_at: datetime):
+        self.fingerprint = fingerprint
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.expires_at = expires_at
+
+class ResponseCache:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: OrderedDict[str, Stored] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Stored | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at < datetime.utcnow():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: str, entry: Stored):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+cache = ResponseCache(IDEMPOTENCY_CACHE_SIZE)
+_inflight: dict[str, asyncio.Event] = {}
+
+def _load(key: str) -> models.IdempotencyKey | None:
+    with SessionLocal() as db:
+        row = db.get(models.IdempotencyKey, key)
+        if row is not None:
+            db.expunge(row)
+        return row
+
+def _reserve(key: str, fingerprint: str) -> bool:
+    """Insert the pending row; False if another request holds a live reservation or result."""
+    now = datetime.utcnow()
+    with SessionLocal() as db:
+        # Expired results and abandoned reservations give the key back.
+        db.execute(
+            delete(models.IdempotencyKey)
+            .where(models.IdempotencyKey.key == key)
+            .where(
+                (models.IdempotencyKey.expires_at < now)
+                | ((models.IdempotencyKey.status_code == 0) & (models.IdempotencyKey.created_at < now - IDEMPOTENCY_LEASE))
+            )
+        )
+        db.add(models.IdempotencyKey(key=key, fingerprint=fingerprint, status_code=0, created_at=now, expires_at=now + IDEMPOTENCY_TTL))
+        try:
+            db.commit()
+            return True
+        except IntegrityError:
+            db.rollback()
+            return False
+
+def _complete(key: str, entry: Stored | None):
+    with SessionLocal() as db:
+        if entry is None:
+            db.execute(delete(models.IdempotencyKey).where(models.IdempotencyKey.key == key))
+        else:
+            row = db.get(models.IdempotencyKey, key)
+            if row is not None:
+                row.status_code = entry.status
+                row.headers_json = json.dumps([[k.decode("latin-1"), v.decode("latin-1")] for k, v in entry.headers])
+                row.body = entry.body
+        db.commit()
+
+def _stored(row: models.IdempotencyKey) -> Stored:
+    headers = [(k.encode("latin-1"), v.encode("latin-1")) for k, v in json.loads(row.headers_json)]
+    return Stored(row.fingerprint, row.status_code, headers, row.body, row.expires_at)
+
+def _store_key(scope, client_key: bytes) -> str:
+    auth = next((v for k, v in scope["headers"] if k == b"authorization"), b"")
+    # Anonymous callers are told apart by address; the path already carries the claim id where there is one.
+    caller = auth or b"anon:" + client_ip(scope).encode("latin-1")
+    h = hashlib.sha256()
+    for part in (caller, scope["method"].encode(), scope["path"].encode(), client_key):
+        h.update(len(part).to_bytes(4, "big") + part)
+    return h.hexdigest()
+
+class _Fingerprint:
+    """sha256 of the body fed chunk by chunk, with a multipart boundary cut out wherever it falls."""
+
+    def __init__(self, scope):
+        ctype = next((v for k, v in scope["headers"] if k == b"content-type"), b"")
+        self.boundary = b""
+        if ctype.startswith(b"multipart/") and b"boundary=" in ctype:
+            # Clients pick a fresh boundary for each attempt; it isn't part of the request's meaning.
+            self.boundary = ctype.split(b"boundary=", 1)[1].split(b";")[0].strip(b'"')
+        self.hash = hashlib.sha256()
+        self.carry = b""
+
+    def update(self, chunk: bytes):
+        if not self.boundary:
+            self.hash.update(chunk)
+            return
+        data, pos = self.carry + chunk, 0
+        while (i := data.find(self.boundary, pos)) != -1:
+            self.hash.update(data[pos:i])
+            pos = i + len(self.boundary)
+        # A boundary split across chunks starts in the last len(boundary) - 1 bytes: hold them back.
+        safe = max(pos, len(data) - len(self.boundary) + 1)
+        self.hash.update(data[pos:safe])
+        self.carry = data[safe:]
+
+    def hexdigest(self) -> str:
+        self.hash.update(self.carry)
+        self.carry = b""
+        return self.hash.hexdigest()
+
+async def _send_json(send, status: int, detail: str, extra: list | None = None):
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json")] + (extra or [])})
+    await send({"type": "http.response.body", "body": json.dumps({"detail": detail}).encode()})
+
+async def _replay(send, entry: Stored):
+    await send({"type": "http.response.start", "status": entry.status,
+                "headers": entry.headers + [(b"idempotent-replayed", b"true")]})
+    await send({"type": "http.response.body", "body": entry.body})
+
+class IdempotencyMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not any(r.match(scope["path"]) for r in ROUTES):
+            return await self.app(scope, receive, send)
+        client_key = next((v for k, v in scope["headers"] if k == b"idempotency-key"), None)
+        if not client_key:
+            return await self.app(scope, receive, send)
+        if len(client_key) > 255:
+            return await _send_json(send, 400, "Idempotency-Key is too long")
+
+        # The fingerprint is needed before deciding, so the body is read up front: hashed as it
+        # streams in and spooled for the handler.
+        spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_IN_MEMORY)
+        try:
+            fp, received = _Fingerprint(scope), 0
+            while True:
+                message = await receive()
+                if message["type"] != "http.request":
+                    return  # client went away before sending the whole body
+                chunk = message.get("body", b"")
+                received += len(chunk)
+                if received > MAX_REQUEST_BODY:
+                    return await _send_json(send, 413, "Request too large")
+                fp.update(chunk)
+                if spool._rolled:
+                    await run_in_threadpool(spool.write, chunk)
+                else:
+                    spool.write(chunk)
+                if not message.get("more_body"):
+                    break
+            spool.seek(0)
+            fingerprint = fp.hexdigest()
+            await self._handle(scope, receive, send, _store_key(scope, client_key), fingerprint, spool, received)
+        finally:
+            spool.close()
+
+    async def _handle(self, scope, receive, send, key: str, fingerprint: str, spool, length: int):
+        deadline = asyncio.get_running_loop().time() + IDEMPOTENCY_WAIT
+        while True:
+            entry = cache.get(key)
+            if entry is None and (event := _inflight.get(key)) is not None:
+                # Same process: wait for the first request instead of polling the table.
+                try:
+                    await asyncio.wait_for(event.wait(), max(0.0, deadline - asyncio.get_running_loop().time()))
+                except asyncio.TimeoutError:
+                    return await _send_json(send, 409, "A request with this Idempotency-Key is still in progress", [(b"retry-after", b"1")])
+                continue
+            if entry is None:
+                row = await run_in_threadpool(_load, key)
+                if row is not None and row.status_code and row.expires_at > datetime.utcnow():
+                    entry = _stored(row)
+                    cache.put(key, entry)
+            if entry is not None:
+                if entry.fingerprint != fingerprint:
+                    return await _send_json(send, 422, "Idempotency-Key was already used with a different request")
+                return await _replay(send, entry)
+            if key not in _inflight and await run_in_threadpool(_reserve, key, fingerprint):
+                break
+            if asyncio.get_running_loop().time() >= deadline:
+                return await _send_json(send, 409, "A request with this Idempotency-Key is still in progress", [(b"retry-after", b"1")])
+            await asyncio.sleep(POLL_INTERVAL)  # another worker holds the key
+
+        event = _inflight[key] = asyncio.Event()
+        start, chunks, size = None, [], 0
+        body_done = False
+
+        async def replay_receive():
+            nonlocal body_done
+            if body_done:
+                return await receive()
+            chunk = await run_in_threadpool(spool.read, REPLAY_CHUNK) if spool._rolled else spool.read(REPLAY_CHUNK)
+            body_done = spool.tell() >= length
+            return {"type": "http.request", "body": chunk, "more_body": not body_done}
+
+        async def capture_send(message):
+            nonlocal start, size
+            if message["type"] == "http.response.start":
+                start = message
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+                if size <= MAX_STORED_BODY:
+                    chunks.append(message.get("body", b""))
+            await send(message)
+
+        entry = None
+        try:
+            await self.app(scope, replay_receive, capture_send)
+            status = start["status"] if start else 500
+            if status < 500 and status not in TRANSIENT and size <= MAX_STORED_BODY:
+                headers = [(k, v) for k, v in start["headers"] if k.lower() in REPLAY_HEADERS]
+                entry = Stored(fingerprint, status, headers, b"".join(chunks), datetime.utcnow() + IDEMPOTENCY_TTL)
+        finally:
+            await run_in_threadpool(_complete, key, entry)
+            if entry is not None:
+                cache.put(key, entry)
+            del _inflight[key]
+            event.set()
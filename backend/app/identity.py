@@ -0,0 +1,105 @@
+"""Normalized recipient identity, computed once when a recipient is added.
+
+`identity_key` hashes the normalized email, name and DOB so claim matching is a point lookup
+on (owner_id, identity_key). Tolerant matching narrows candidates by (owner_id, dob_canonical)
+and ranks them on the stored `name_tokens`.
+"""
+import hashlib, os, re, unicodedata
+from datetime import datetime
+from difflib import SequenceMatcher
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.engine import Connection
+from . import models
+
+# "exact": normalized point lookup only. "tolerant": fall back to ranking near-matches on name.
+CLAIM_MATCH_MODE = os.environ.get("AFTERME_CLAIM_MATCH", "exact")
+CLAIM_MATCH_THRESHOLD = float(os.environ.get("AFTERME_CLAIM_MATCH_THRESHOLD", "0.85"))
+
+_APOSTROPHES = re.compile(r"['’`]")  # O'Brien -> obrien
+_NON_WORD = re.compile(r"[^\w\s]")  # hyphens and other punctuation separate tokens
+_DOB_FORMATS = ("%Y-%m-%d", "%Y/%m/%d", "%Y.%m.%d", "%Y%m%d")
+
+def normalize_name(name: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", name)
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return " ".join(_NON_WORD.sub(" ", _APOSTROPHES.sub("", stripped.casefold())).split())
+
+def normalize_email(email: str) -> str:
+    return email.strip().casefold()
+
+def canonical_dob(dob: str) -> str:
+    """ISO date for the year-first formats we accept; anything else is kept as typed (trimmed)."""
+    value = dob.strip()
+    for fmt in _DOB_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date().isoformat()
+        except ValueError:
+            continue
+    return value
+
+def name_tokens(name: str) -> str:
+    # Sorted so "Doe Jane" and "Jane Doe" compare equal.
+    return " ".join(sorted(normalize_name(name).split()))
+
+def identity_key(email: str, legal_name: str, dob: str) -> str:
+    raw = "\x1f".join((normalize_email(email), name_tokens(legal_name), canonical_dob(dob)))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def identity_columns(email: str, legal_name: str, dob: str) -> dict:
+    return {
+        "identity_key": identity_key(email, legal_name, dob),
+        "dob_canonical": canonical_dob(dob),
+        "name_tokens": name_tokens(legal_name),
+    }
+
+def match_recipient(db, owner_id: int, email: str, legal_name: str, dob: str, mode: str = CLAIM_MATCH_MODE):
+    """Returns (recipient, score) or (None, 0.0). Exact matches score 1.0."""
+    rec = (
+        db.query(models.Recipient)
+        .filter(models.Recipient.owner_id == owner_id)
+        .filter(models.Recipient.identity_key == identity_key(email, legal_name, dob))
+        .first()
+    )
+    if rec or mode != "tolerant":
+        return rec, 1.0 if rec else 0.0
+
+    # Email and DOB must still agree; only the name may differ (typos, middle names, transliteration).
+    email_norm = normalize_email(email)
+    tokens = name_tokens(legal_name)
+    best, best_score = None, 0.0
+    candidates = (
+        db.query(models.Recipient)
+        .filter(models.Recipient.owner_id == owner_id)
+        .filter(models.Recipient.dob_canonical == canonical_dob(dob))
+    )
+    for cand in candidates:
+        if normalize_email(cand.email) != email_norm:
+            continue
+        score = SequenceMatcher(None, tokens, cand.name_tokens or "").ratio()
+        if score > best_score:
+            best, best_score = cand, score
+    if best_score >= CLAIM_MATCH_THRESHOLD:
+        return best, best_score
+    return None, 0.0
+
+def backfill(conn: Connection, batch_size: int = 500) -> int:
+    """Fill identity columns for recipients created before they existed."""
+    table = models.Recipient.__table__
+    done = 0
+    while True:
+        rows = conn.execute(
+            select(table.c.id, table.c.email, table.c.legal_name, table.c.dob)
+            .where(table.c.identity_key.is_(None))
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return done
+        stmt = update(table).where(table.c.id == bindparam("rid")).values(
+            identity_key=bindparam("ik"), dob_canonical=bindparam("dob_c"), name_tokens=bindparam("tokens"),
+        )
+        params = []
+        for rid, email, legal_name, dob in rows:
+            cols = identity_columns(email, legal_name, dob)
+            params.append({"rid": rid, "ik": cols["identity_key"], "dob_c": cols["dob_canonical"], "tokens": cols["name_tokens"]})
+        conn.execute(stmt, params)
+        done += len(rows)
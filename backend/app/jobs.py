@@ -0,0 +1,159 @@
+"""Persistent background job queue with a worker pool.
+
+Jobs are rows in the `jobs` table, enqueued in the same transaction as the work that needs
+them. Workers lease one job at a time with a conditional UPDATE, so several threads or
+processes can share the table; a job whose lease runs out (a crashed worker) is picked up
+again. Failures retry with exponential backoff until AFTERME_JOB_MAX_ATTEMPTS.
+
+    python -m app.jobs    # run workers outside the API process (set AFTERME_JOB_WORKERS=0 on the API)
+"""
+import json, logging, os, threading, time
+from datetime import datetime, timedelta
+from sqlalchemy import and_, func, or_, select, update
+from .db import SessionLocal
+from . import models
+
+logger = logging.getLogger("afterme.jobs")
+
+JOB_WORKERS = int(os.environ.get("AFTERME_JOB_WORKERS", "2"))  # 0 = don't run workers in this process
+JOB_MAX_ATTEMPTS = int(os.environ.get("AFTERME_JOB_MAX_ATTEMPTS", "5"))
+JOB_LEASE = timedelta(seconds=float(os.environ.get("AFTERME_JOB_LEASE", "300")))
+JOB_POLL_INTERVAL = float(os.environ.get("AFTERME_JOB_POLL_INTERVAL", "2"))  # seconds; new jobs also wake workers directly
+JOB_RETRY_BASE = float(os.environ.get("AFTERME_JOB_RETRY_BASE", "5"))  # seconds, doubled per attempt
+
+handlers: dict[str, callable] = {}
+
+def handler(kind: str):
+    def register(fn):
+        handlers[kind] = fn
+        return fn
+    return register
+
+def enqueue(db, kind: str, payload: dict) -> models.Job:
+    """Adds a job to the caller's transaction; call pool.notify() after commit."""
+    job = models.Job(kind=kind, payload_json=json.dumps(payload))
+    db.add(job)
+    return job
+
+def backlog(db) -> dict:
+    rows = db.query(models.Job.status, func.count()).group_by(models.Job.status).all()
+    counts = {"queued": 0, "running": 0, "done": 0, "failed": 0}
+    counts.update(dict(rows))
+    return counts
+
+class WorkerPool:
+    def __init__(self, workers: int, poll_interval: float):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._wake = threading.Condition()
+        self._stop = False
+        self._threads: list[threading.Thread] = []
+        self.processed = 0
+        self.failed = 0
+
+    def start(self):
+        if self._threads:
+            return
+        self._stop = False
+        for i in range(self.workers):
+            t = threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self):
+        with self._wake:
+            self._stop = True
+            self._wake.notify_all()
+        for t in self._threads:
+            t.join()
+        self._threads = []
+
+    def notify(self):
+        with self._wake:
+            self._wake.notify()
+
+    def _lease(self) -> models.Job | None:
+        j = models.Job
+        now = datetime.utcnow()
+        runnable = or_(
+            and_(j.status == "queued", j.run_after <= now),
+            and_(j.status == "running", j.locked_until < now),
+        )
+        with SessionLocal() as db:
+            for job_id in db.execute(select(j.id).where(runnable).order_by(j.run_after, j.id).limit(5)).scalars():
+                won = db.execute(
+                    update(j)
+                    .where(j.id == job_id)
+                    .where(runnable)
+                    .values(status="running", locked_until=now + JOB_LEASE, attempts=j.attempts + 1)
+                ).rowcount
+                db.commit()
+                if won:
+                    job = db.get(j, job_id)
+                    db.expunge(job)
+                    return job
+        return None
+
+    def _finish(self, job: models.Job, error: str | None):
+        now = datetime.utcnow()
+        values = {"locked_until": None}
+        if error is None:
+            values.update(status="done", finished_at=now, last_error="")
+        elif job.attempts >= JOB_MAX_ATTEMPTS:
+            values.update(status="failed", finished_at=now, last_error=error)
+        else:
+            retry_in = JOB_RETRY_BASE * 2 ** (job.attempts - 1)
+            values.update(status="queued", run_after=now + timedelta(seconds=retry_in), last_error=error)
+        with SessionLocal() as db:
+            db.execute(update(models.Job).where(models.Job.id == job.id).values(**values))
+            db.commit()
+
+    def run_one(self) -> bool:
+        job = self._lease()
+        if job is None:
+            return False
+        fn = handlers.get(job.kind)
+        try:
+            if fn is None:
+                raise LookupError(f"no handler for job kind {job.kind!r}")
+            fn(json.loads(job.payload_json), attempt=job.attempts, final=job.attempts >= JOB_MAX_ATTEMPTS)
+            error = None
+            self.processed += 1
+        except Exception as e:
+            logger.exception("job %d (%s) failed on attempt %d", job.id, job.kind, job.attempts)
+            error = f"{type(e).__name__}: {e}"
+            self.failed += 1
+        self._finish(job, error)
+        return True
+
+    def _run(self):
+        while True:
+            try:
+                worked = self.run_one()
+            except Exception:
+                logger.exception("job lease failed")
+                worked = False
+            with self._wake:
+                if self._stop:
+                    return
+                if not worked:
+                    self._wake.wait(self.poll_interval)
+                    if self._stop:
+                        return
+
+pool = WorkerPool(JOB_WORKERS, JOB_POLL_INTERVAL)
+
+if __name__ == "__main__":
+    # Handlers register on the imported app.jobs module, not on this __main__ copy.
+    from . import audit_archive, documents, jobs  # noqa: F401
+
+    logging.basicConfig(level=logging.INFO)
+    jobs.pool.workers = max(1, JOB_WORKERS)
+    jobs.pool.start()
+    try:
+        while True:
+            time.sleep(60)
+            with SessionLocal() as db:
+                logger.info("backlog %s", jobs.backlog(db))
+    except KeyboardInterrupt:
+        jobs.pool.stop()
@@ -0,0 +1,54 @@
+import multiprocessing, os, threading
+from concurrent.futures import ProcessPoolExecutor
+from fastapi import HTTPException
+from . import auth
+
+# PBKDF2 runs in worker processes so a login burst can't starve the request threadpool.
+# AFTERME_KDF_WORKERS=0 hashes inline (handy for scripts and single-core boxes).
+_CORES = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+KDF_WORKERS = int(os.environ.get("AFTERME_KDF_WORKERS", str(_CORES)))
+# Hash jobs allowed in flight (running + queued) before new ones get a 503.
+KDF_MAX_PENDING = int(os.environ.get("AFTERME_KDF_MAX_PENDING", str(max(KDF_WORKERS, 1) * 4)))
+KDF_RETRY_AFTER = os.environ.get("AFTERME_KDF_RETRY_AFTER", "1")
+
+class KdfPool:
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn: forking a process that already runs background threads is unsafe.
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._executor
+
+    def run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HTTPException(
+                status_code=503,
+                detail="Authentication is busy, retry shortly",
+                headers={"Retry-After": KDF_RETRY_AFTER},
+            )
+        try:
+            if self.workers <= 0:
+                return fn(*args)
+            return self._get_executor().submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
+
+pool = KdfPool(KDF_WORKERS, KDF_MAX_PENDING)
+
+def hash_password(password: str) -> tuple[str, str]:
+    return pool.run(auth.hash_password, password, None, auth.PASSWORD_ITERATIONS)
+
+def verify_password(password: str, salt: str, expected_hash: str, iterations: int) -> bool:
+    return pool.run(auth.verify_password, password, salt, expected_hash, iterations)
@@ -0,0 +1,200 @@
+"""Server encryption keys, shared by every worker process.
+
+Keys come from AFTERME_FERNET_KEY (comma-separated, newest first) or from a keystore file
+that the first process creates under an exclusive lock and every other process reads.
+These keys are the KEK that wraps per-owner data keys (see crypto.py). Rotation prepends a
+new primary key; old keys stay usable for decryption until the re-encryption job has
+rewrapped every data key and they are retired. Workers notice a rotation within
+RELOAD_INTERVAL, so `rotate` waits that long before walking, and `retire` refuses while any
+value still decrypts only under an old key.
+
+    python -m app.keyring rotate      # new primary key, then re-encrypt alongside the running API
+    python -m app.keyring reencrypt   # re-run the re-encryption walk
+    python -m app.keyring retire      # drop everything but the primary key
+"""
+import json, logging, os, sys, threading, time
+from contextlib import contextmanager
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+from sqlalchemy import select, update
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process dev only
+    fcntl = None
+
+logger = logging.getLogger("afterme.keyring")
+
+KEYSTORE_PATH = os.environ.get("AFTERME_KEYSTORE", "./afterme.keys")
+ENV_KEYS = os.environ.get("AFTERME_FERNET_KEY")
+REENCRYPT_BATCH = int(os.environ.get("AFTERME_REENCRYPT_BATCH", "500"))
+REENCRYPT_PAUSE = float(os.environ.get("AFTERME_REENCRYPT_PAUSE", "0.05"))  # seconds between batches
+RELOAD_INTERVAL = 5.0  # seconds between keystore mtime checks, so rotations reach every worker
+
+_lock = threading.Lock()
+_keys: list[str] = []
+_fernet: MultiFernet | None = None
+_mtime = 0.0
+_checked = 0.0
+
+@contextmanager
+def _locked_keystore():
+    fd = os.open(KEYSTORE_PATH, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        if fcntl:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        with os.fdopen(os.dup(fd), "r+") as f:
+            yield f
+    finally:
+        os.close(fd)  # releases the flock
+
+def _read(f) -> list[str]:
+    f.seek(0)
+    raw = f.read()
+    return json.loads(raw)["keys"] if raw.strip() else []
+
+def _write(f, keys: list[str]):
+    f.seek(0)
+    f.truncate()
+    json.dump({"keys": keys}, f)
+    f.flush()
+    os.fsync(f.fileno())
+
+def _load() -> list[str]:
+    global _mtime
+    if ENV_KEYS:
+        return [k.strip() for k in ENV_KEYS.split(",") if k.strip()]
+    with _locked_keystore() as f:
+        keys = _read(f)
+        if not keys:
+            keys = [Fernet.generate_key().decode()]
+            _write(f, keys)
+            logger.warning("created new keystore at %s", KEYSTORE_PATH)
+        _mtime = os.path.getmtime(KEYSTORE_PATH)
+    return keys
+
+def _install(keys: list[str]):
+    global _keys, _fernet
+    _keys = keys
+    _fernet = MultiFernet([Fernet(k.encode()) for k in keys])
+
+def fernet() -> MultiFernet:
+    if _fernet is None:
+        with _lock:
+            if _fernet is None:
+                _install(_load())
+    elif time.monotonic() - _checked > RELOAD_INTERVAL:
+        reload()
+    return _fernet
+
+def reload() -> bool:
+    """Re-read the keystore if another process changed it; returns True if the keys changed."""
+    global _checked
+    _checked = time.monotonic()
+    if ENV_KEYS or not os.path.exists(KEYSTORE_PATH) or os.path.getmtime(KEYSTORE_PATH) == _mtime:
+        return False
+    with _lock:
+        keys = _load()
+        changed = keys != _keys
+        _install(keys)
+    return changed
+
+def rotate() -> None:
+    if ENV_KEYS:
+        raise RuntimeError("keys come from AFTERME_FERNET_KEY; rotate them there")
+    with _locked_keystore() as f:
+        _write(f, [Fernet.generate_key().decode()] + _read(f))
+    reload()
+
+def retire() -> None:
+    if ENV_KEYS:
+        raise RuntimeError("keys come from AFTERME_FERNET_KEY; retire them there")
+    with _locked_keystore() as f:
+        keys = _read(f)
+        # Checked under the lock so no rotation slips in between.
+        if len(keys) > 1 and (n := stale(Fernet(keys[0].encode()))):
+            raise RuntimeError(f"{n} values don't decrypt under the primary key yet; run reencrypt first")
+        _write(f, keys[:1])
+    reload()
+
+def _reencrypt_column(db, column, batch_size: int, pause: float, where=None) -> int:
+    table = column.class_
+    pk = table.__mapper__.primary_key[0]
+    done, cursor = 0, None
+    while True:
+        stmt = select(pk, column).order_by(pk).limit(batch_size)
+        if cursor is not None:
+            stmt = stmt.where(pk > cursor)
+        if where is not None:
+            stmt = stmt.where(where)
+        rows = db.execute(stmt).all()
+        if not rows:
+            return done
+        f = fernet()
+        params = [{pk.key: key, column.key: f.rotate(token.encode()).decode()} for key, token in rows if token]
+        if params:
+            db.execute(update(table), params)
+            db.commit()
+        done += len(rows)
+        cursor = rows[-1][0]
+        time.sleep(pause)
+
+def _stale_column(db, column, primary: Fernet, batch_size: int, where=None) -> int:
+    pk = column.class_.__mapper__.primary_key[0]
+    stale, cursor = 0, None
+    while True:
+        stmt = select(pk, column).order_by(pk).limit(batch_size)
+        if cursor is not None:
+            stmt = stmt.where(pk > cursor)
+        if where is not None:
+            stmt = stmt.where(where)
+        rows = db.execute(stmt).all()
+        if not rows:
+            return stale
+        for _, token in rows:
+            if token:
+                try:
+                    primary.decrypt(token.encode())
+                except InvalidToken:
+                    stale += 1
+        cursor = rows[-1][0]
+
+def stale(primary: Fernet, batch_size: int = REENCRYPT_BATCH) -> int:
+    """How many values reencrypt would still have to rewrap for `primary` alone to read everything."""
+    from .db import SessionLocal
+    from .crypto import ENVELOPE_PREFIX
+    from . import models
+
+    with SessionLocal() as db:
+        n = _stale_column(db, models.DataKey.wrapped_dek, primary, batch_size)
+        for column in (models.VaultItem.encrypted_payload, models.Release.bundle_encrypted):
+            n += _stale_column(db, column, primary, batch_size, where=column.not_like(ENVELOPE_PREFIX + "%"))
+    return n
+
+def reencrypt(batch_size: int = REENCRYPT_BATCH, pause: float = REENCRYPT_PAUSE) -> int:
+    """Rewrap every DEK (and any pre-DEK ciphertext) under the current primary key, in committed batches."""
+    from .db import SessionLocal
+    from .crypto import ENVELOPE_PREFIX
+    from . import models
+
+    with SessionLocal() as db:
+        n = _reencrypt_column(db, models.DataKey.wrapped_dek, batch_size, pause)
+        for column in (models.VaultItem.encrypted_payload, models.Release.bundle_encrypted):
+            n += _reencrypt_column(db, column, batch_size, pause, where=column.not_like(ENVELOPE_PREFIX + "%"))
+    logger.info("re-encrypted %d values", n)
+    return n
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    cmd = sys.argv[1] if len(sys.argv) > 1 else ""
+    if cmd == "rotate":
+        rotate()
+        # Workers still wrapping new DEKs under the old primary would be passed over by the walk.
+        logger.info("waiting %.0f s for workers to load the new key", RELOAD_INTERVAL + 1)
+        time.sleep(RELOAD_INTERVAL + 1)
+        reencrypt()
+    elif cmd == "reencrypt":
+        reencrypt()
+    elif cmd == "retire":
+        retire()
+    else:
+        sys.exit(__doc__)
@@ -0,0 +1,51 @@
+import os
+from fastapi import Request, Response
+from sqlalchemy import update
+from sqlalchemy.orm import Query, Session
+from . import models
+from .serialize import columns, rows_response
+
+PAGE_SIZE = int(os.environ.get("AFTERME_PAGE_SIZE", "100"))
+MAX_PAGE_SIZE = int(os.environ.get("AFTERME_MAX_PAGE_SIZE", "1000"))
+
+def bump_owner_version(db: Session, owner_id: int):
+    """Mark the owner's lists as changed; call inside the write's transaction."""
+    db.execute(
+        update(models.User)
+        .where(models.User.id == owner_id)
+        .values(data_version=models.User.data_version + 1)
+    )
+
+def owner_version(db: Session, owner_id: int) -> int:
+    return db.query(models.User.data_version).filter(models.User.id == owner_id).scalar() or 0
+
+def keyset_page(
+    request: Request,
+    db: Session,
+    owner_id: int,
+    scope: str,
+    query: Query,
+    id_col,
+    cursor: int | None,
+    limit: int,
+    schema,
+):
+    """One page of `query` ordered by `id_col`, with ETag/If-None-Match against the owner's change counter.
+
+    Returns a bare 304 without touching the rows when the client's copy is current; otherwise
+    the rows as JSON in `schema`'s shape, with the cursor for the next page in X-Next-Cursor.
+    """
+    etag = f'W/"{scope}-{owner_id}-{owner_version(db, owner_id)}-{cursor or 0}-{limit}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+
+    if cursor is not None:
+        query = query.filter(id_col > cursor)
+    # Only the schema's columns, as plain tuples: no ORM objects to build and validate.
+    query = query.with_entities(*columns(schema, id_col.class_))
+    rows = query.order_by(id_col).limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = str(rows[-1].id)
+    return rows_response(rows, schema, headers)
@@ -1,22 +1,74 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Depends, HTTPException
+from fastapi.responses import PlainTextResponse
 from sqlalchemy.orm import Session
-from .db import Base, engine, get_db
+from .db import SessionLocal, get_db
 from . import models, schemas
-from .auth import hash_password, make_token, verify_password
-from .routes import policies, recipients, vault_items, assignments, claims, releases
+from .auth import PASSWORD_ITERATIONS, make_token, require_admin
+from .kdf import hash_password, verify_password, pool as kdf_pool
+from .routes import policies, recipients, vault_items, assignments, claims, releases, audit, checkins, jobs, dashboard
+from .routes.audit import writer as audit_writer
+from .migrate import AUTO_MIGRATE, migrate
+from .scheduler import SCHEDULER_ENABLED, scheduler
+from .checkins import buffer as checkin_buffer
+from .jobs import JOB_WORKERS, pool as job_pool
+from . import audit_archive, documents  # noqa: F401  (register the audit_archive and claim_documents job handlers)
+from .metrics import MetricsMiddleware, registry as metrics_registry
+from .ratelimit import RateLimitMiddleware, limiter
+from .idempotency import IdempotencyMiddleware
 from fastapi.middleware.cors import CORSMiddleware
 
-Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if AUTO_MIGRATE:
+        migrate()
+    audit_writer.start()
+    checkin_buffer.start()
+    if SCHEDULER_ENABLED:
+        scheduler.start()
+    if JOB_WORKERS:
+        job_pool.start()
+    try:
+        yield
+    finally:
+        job_pool.stop()
+        scheduler.stop()
+        # Flush whatever is still buffered before the process exits.
+        checkin_buffer.stop()
+        audit_writer.stop()
+        kdf_pool.shutdown()
 
-app = FastAPI(title="LifeKey API", version="0.1")
+app = FastAPI(title="LifeKey API", version="0.1", lifespan=lifespan)
 
+# Idempotency innermost, then rate limits, so 429s still get CORS headers and show up in the metrics.
+app.add_middleware(IdempotencyMiddleware)
+app.add_middleware(RateLimitMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # lock down later
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor", "X-Total-Count", "Idempotent-Replayed"],
 )
+app.add_middleware(MetricsMiddleware)
+
+metrics_registry.gauge("afterme_audit_queue_depth", "Audit events waiting for the writer.", lambda: audit_writer.stats()["queue_depth"])
+metrics_registry.gauge("afterme_audit_dropped", "Audit events dropped since start.", lambda: audit_writer.stats()["dropped"])
+metrics_registry.gauge("afterme_checkins_pending", "Coalesced check-ins not yet flushed.", checkin_buffer.pending)
+metrics_registry.gauge("afterme_ratelimit_rejected", "Requests refused by the rate limiter since start.", lambda: limiter.rejected)
+metrics_registry.gauge("afterme_scheduler_pending", "Release deadlines held in memory.", scheduler.pending)
+
+def _queued_jobs() -> int:
+    with SessionLocal() as db:
+        return db.query(models.Job).filter(models.Job.status == "queued").count()
+
+metrics_registry.gauge("afterme_jobs_queued", "Background jobs waiting for a worker.", _queued_jobs)
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False, dependencies=[Depends(require_admin)])
+def metrics():
+    # Prometheus text format; scrapers send X-Admin-Token (http_headers in the scrape config).
+    return metrics_registry.render()
 
 @app.post("/auth/register", response_model=schemas.LoginOut, tags=["auth"])
 def register(body: schemas.RegisterIn, db: Session = Depends(get_db)):
@@ -29,6 +81,7 @@ def register(body: schemas.RegisterIn, db: Session = Depends(get_db)):
         name=body.name,
         password_salt=salt,
         password_hash=password_hash,
+        password_iterations=PASSWORD_ITERATIONS,
     )
     db.add(user)
     db.commit()
@@ -37,9 +90,16 @@ def register(body: schemas.RegisterIn, db: Session = Depends(get_db)):
 
 @app.post("/auth/login", response_model=schemas.LoginOut, tags=["auth"])
 def login(body: schemas.LoginIn, db: Session = Depends(get_db)):
+    # Per-IP limits run in the middleware; this one needs the body. Checked before the KDF.
+    limiter.check("login_email", str(body.email).lower())
     user = db.query(models.User).filter(models.User.email == str(body.email)).first()
-    if not user or not verify_password(body.password, user.password_salt, user.password_hash):
+    if not user or not verify_password(body.password, user.password_salt, user.password_hash, user.password_iterations):
         raise HTTPException(status_code=401, detail="Invalid email or password")
+    if user.password_iterations != PASSWORD_ITERATIONS:
+        # Cost was retuned since this hash was made; upgrade it while we have the plaintext.
+        user.password_salt, user.password_hash = hash_password(body.password)
+        user.password_iterations = PASSWORD_ITERATIONS
+        db.commit()
     return schemas.LoginOut(token=make_token(user.id), user_id=user.id)
 
 # Routers
@@ -49,3 +109,7 @@ app.include_router(vault_items.router)
 app.include_router(assignments.router)
 app.include_router(claims.router)
 app.include_router(releases.router)
+app.include_router(audit.router)
+app.include_router(checkins.router)
+app.include_router(jobs.router)
+app.include_router(dashboard.router)
@@ -0,0 +1,163 @@
+"""Per-request instrumentation: route latency histograms, SQL statement/commit counts, DB time
+and crypto bytes, rendered in Prometheus text format by GET /metrics.
+
+Numbers are per process; with several uvicorn workers each one reports its own.
+"""
+import logging, os, threading, time
+from bisect import bisect_left
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger("afterme.metrics")
+
+METRICS_DEBUG = os.environ.get("AFTERME_METRICS_DEBUG", "0") == "1"
+QUERY_WARN_THRESHOLD = int(os.environ.get("AFTERME_QUERY_WARN_THRESHOLD", "20"))
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class RequestStats:
+    __slots__ = ("statements", "commits", "db_time", "encrypted", "decrypted")
+
+    def __init__(self):
+        self.statements = 0
+        self.commits = 0
+        self.db_time = 0.0
+        self.encrypted = 0
+        self.decrypted = 0
+
+# Mutable per-request stats; the threadpool running sync endpoints inherits the context.
+_current: ContextVar[RequestStats | None] = ContextVar("afterme_request_stats", default=None)
+
+class RouteMetrics:
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.latency_sum = 0.0
+        self.statuses: dict[int, int] = {}
+        self.statements = 0
+        self.commits = 0
+        self.db_time = 0.0
+        self.encrypted = 0
+        self.decrypted = 0
+
+class Registry:
+    def __init__(self):
+        self.routes: dict[tuple[str, str], RouteMetrics] = {}
+        self.gauges: dict[str, callable] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, method: str, route: str, status: int, elapsed: float, stats: RequestStats):
+        with self._lock:
+            m = self.routes.get((method, route))
+            if m is None:
+                m = self.routes[(method, route)] = RouteMetrics()
+            m.buckets[bisect_left(LATENCY_BUCKETS, elapsed)] += 1
+            m.count += 1
+            m.latency_sum += elapsed
+            m.statuses[status] = m.statuses.get(status, 0) + 1
+            m.statements += stats.statements
+            m.commits += stats.commits
+            m.db_time += stats.db_time
+            m.encrypted += stats.encrypted
+            m.decrypted += stats.decrypted
+
+    def gauge(self, name: str, help_text: str, fn):
+        """Register a callable sampled at scrape time (queue depths and the like)."""
+        self.gauges[name] = (help_text, fn)
+
+    def render(self) -> str:
+        out = []
+
+        def family(name: str, kind: str, help_text: str):
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            routes = sorted(self.routes.items())
+            family("afterme_http_requests_total", "counter", "Requests by route and status.")
+            for (method, route), m in routes:
+                for status, n in sorted(m.statuses.items()):
+                    out.append(f'afterme_http_requests_total{{method="{method}",route="{route}",status="{status}"}} {n}')
+            family("afterme_http_request_duration_seconds", "histogram", "Request latency by route.")
+            for (method, route), m in routes:
+                labels = f'method="{method}",route="{route}"'
+                cumulative = 0
+                for le, n in zip(LATENCY_BUCKETS + ("+Inf",), m.buckets):
+                    cumulative += n
+                    out.append(f'afterme_http_request_duration_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+                out.append(f"afterme_http_request_duration_seconds_sum{{{labels}}} {m.latency_sum:.6f}")
+                out.append(f"afterme_http_request_duration_seconds_count{{{labels}}} {m.count}")
+            for name, attr, help_text in (
+                ("afterme_db_statements_total", "statements", "SQL statements executed while serving the route."),
+                ("afterme_db_commits_total", "commits", "Transactions committed while serving the route."),
+                ("afterme_db_time_seconds_total", "db_time", "Time spent in SQL statements while serving the route."),
+                ("afterme_crypto_encrypted_bytes_total", "encrypted", "Plaintext bytes encrypted while serving the route."),
+                ("afterme_crypto_decrypted_bytes_total", "decrypted", "Plaintext bytes decrypted while serving the route."),
+            ):
+                family(name, "counter", help_text)
+                for (method, route), m in routes:
+                    out.append(f'{name}{{method="{method}",route="{route}"}} {getattr(m, attr)}')
+        for name, (help_text, fn) in sorted(self.gauges.items()):
+            family(name, "gauge", help_text)
+            out.append(f"{name} {fn()}")
+        return "\n".join(out) + "\n"
+
+registry = Registry()
+
+def add_crypto_bytes(encrypted: int = 0, decrypted: int = 0):
+    stats = _current.get()
+    if stats is not None:
+        stats.encrypted += encrypted
+        stats.decrypted += decrypted
+
+def instrument_engine(engine: Engine):
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("afterme_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["afterme_query_start"].pop()
+        stats = _current.get()
+        if stats is not None:
+            stats.statements += 1
+            stats.db_time += time.perf_counter() - started
+
+    @event.listens_for(engine, "commit")
+    def _commit(conn):
+        stats = _current.get()
+        if stats is not None:
+            stats.commits += 1
+
+class MetricsMiddleware:
+    """Pure ASGI middleware, so the stats object is shared with the endpoint and streamed bodies."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        stats = RequestStats()
+        token = _current.set(stats)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            route = scope.get("route")
+            # route_path: set by a middleware that answered before routing (rate limits)
+            label = getattr(route, "path", None) or scope.get("route_path", "unmatched")
+            registry.observe(scope["method"], label, status, elapsed, stats)
+            if METRICS_DEBUG and stats.statements > QUERY_WARN_THRESHOLD:
+                logger.warning("%s %s ran %d SQL statements (%d commits) in %.1fms; possible N+1",
+                               scope["method"], label, stats.statements, stats.commits, elapsed * 1000)
+            _current.reset(token)
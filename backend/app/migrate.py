@@ -0,0 +1,50 @@
+"""Schema migration step: `python -m app.migrate` (run before starting the API).
+
+Creates missing tables, then brings existing tables up to date with additive changes
+(new columns and indexes), then backfills derived columns that new code relies on.
+Nothing is dropped.
+"""
+import logging, os
+from sqlalchemy import inspect, literal
+from sqlalchemy.engine import Connection, Engine
+from .db import Base, engine
+from . import documents, identity, models  # noqa: F401  (registers the tables on Base.metadata)
+
+logger = logging.getLogger("afterme.migrate")
+
+# Dev convenience: the API runs migrate() on startup unless this is turned off.
+AUTO_MIGRATE = os.environ.get("AFTERME_AUTO_MIGRATE", "1") == "1"
+
+def _add_column(conn: Connection, table, column):
+    ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(conn.dialect)}"
+    default = column.default.arg if column.default is not None and column.default.is_scalar else None
+    if default is not None:
+        rendered = literal(default).compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True})
+        ddl += f" NOT NULL DEFAULT {rendered}"
+    conn.exec_driver_sql(ddl)
+
+def migrate(bind: Engine = engine):
+    Base.metadata.create_all(bind=bind)
+    with bind.begin() as conn:
+        insp = inspect(conn)
+        for table in Base.metadata.sorted_tables:
+            existing = {c["name"] for c in insp.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    logger.info("adding column %s.%s", table.name, column.name)
+                    _add_column(conn, table, column)
+            indexes = {i["name"] for i in insp.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in indexes:
+                    logger.info("creating index %s", index.name)
+                    index.create(conn)
+        n = identity.backfill(conn)
+        if n:
+            logger.info("backfilled identity keys for %d recipients", n)
+        n = documents.backfill(conn)
+        if n:
+            logger.info("marked %d claims from before document processing as unchecked", n)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    migrate()
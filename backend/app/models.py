@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import String, Integer, DateTime, ForeignKey, Text
+from sqlalchemy import String, Integer, DateTime, ForeignKey, Text, Index, LargeBinary
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from .db import Base
 
@@ -10,6 +10,12 @@ class User(Base):
     name: Mapped[str] = mapped_column(String(255))
     password_salt: Mapped[str] = mapped_column(String(64))
     password_hash: Mapped[str] = mapped_column(String(128))
+    password_iterations: Mapped[int] = mapped_column(Integer, default=120_000)  # PBKDF2 cost of password_hash
+    data_version: Mapped[int] = mapped_column(Integer, default=0)  # bumped on every owner write; feeds list ETags
+    # Dead-man switch: armed by the first check-in; overdue once next_due_at passes.
+    checkin_interval_hours: Mapped[int] = mapped_column(Integer, default=720)
+    last_checkin_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    next_due_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True, index=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
     policies = relationship("WillPolicy", back_populates="owner")
@@ -23,6 +29,12 @@ class VaultItem(Base):
     encrypted_payload: Mapped[str] = mapped_column(Text)  # encrypted JSON
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
+class DataKey(Base):
+    __tablename__ = "data_keys"
+    owner_id: Mapped[int] = mapped_column(ForeignKey("users.id"), primary_key=True)
+    wrapped_dek: Mapped[str] = mapped_column(Text)  # owner's data key, encrypted under the server KEK
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
 class Recipient(Base):
     __tablename__ = "recipients"
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
@@ -31,6 +43,15 @@ class Recipient(Base):
     legal_name: Mapped[str] = mapped_column(String(255))
     dob: Mapped[str] = mapped_column(String(20))  # demo: YYYY-MM-DD
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # Normalized identity for claim matching, see identity.py.
+    identity_key: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    dob_canonical: Mapped[str | None] = mapped_column(String(20), nullable=True)
+    name_tokens: Mapped[str | None] = mapped_column(String(255), nullable=True)
+
+    __table_args__ = (
+        Index("ix_recipients_owner_identity", "owner_id", "identity_key"),
+        Index("ix_recipients_owner_dob", "owner_id", "dob_canonical"),
+    )
 
 class WillPolicy(Base):
     __tablename__ = "will_policies"
@@ -38,6 +59,7 @@ class WillPolicy(Base):
     owner_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
     status: Mapped[str] = mapped_column(String(20), default="active")  # active|paused
     dispute_window_hours: Mapped[int] = mapped_column(Integer, default=24)
+    assignments_version: Mapped[int] = mapped_column(Integer, default=0)  # bumped on every assignment change
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
     owner = relationship("User", back_populates="policies")
@@ -65,6 +87,11 @@ class Claim(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     reviewed_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
     reviewed_by: Mapped[str] = mapped_column(String(255), default="")  # admin email
+    releases_due_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True, index=True)  # end of dispute window; cleared once issued
+    releases_issued_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    documents_status: Mapped[str] = mapped_column(String(20), default="queued")  # queued|verified|rejected|error|unchecked (pre-dated processing)
+    documents_json: Mapped[str] = mapped_column(Text, default="{}")  # per-document hashes, metadata, previews, verdicts
+    documents_checked_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
 
 class Release(Base):
     __tablename__ = "releases"
@@ -72,11 +99,21 @@ class Release(Base):
     claim_id: Mapped[int] = mapped_column(ForeignKey("claims.id"), index=True)
     recipient_id: Mapped[int] = mapped_column(ForeignKey("recipients.id"), index=True)
     token: Mapped[str] = mapped_column(String(500), unique=True, index=True)
-    expires_at: Mapped[datetime] = mapped_column(DateTime)
+    expires_at: Mapped[datetime] = mapped_column(DateTime, index=True)
+    bundle_encrypted: Mapped[str] = mapped_column(Text, default="")  # encrypted snapshot of the recipient's items
+    bundle_version: Mapped[int] = mapped_column(Integer, default=0)  # WillPolicy.assignments_version it was built from
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
 class AuditEvent(Base):
     __tablename__ = "audit_events"
+    __table_args__ = (
+        # Each read filter leads with its equality columns and ends in id for keyset pagination.
+        Index("ix_audit_actor_id", "actor", "id"),
+        Index("ix_audit_action_id", "action", "id"),
+        Index("ix_audit_target_id", "target_type", "target_id", "id"),
+        Index("ix_audit_created_at", "created_at"),
+        Index("ix_audit_seq", "seq", unique=True),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     actor: Mapped[str] = mapped_column(String(255))
     action: Mapped[str] = mapped_column(String(50))
@@ -84,3 +121,55 @@ class AuditEvent(Base):
     target_id: Mapped[str] = mapped_column(String(50))
     metadata_json: Mapped[str] = mapped_column(Text, default="{}")
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # Hash chain, assigned by the sealer after insert (see audit_chain.py); NULL until sealed.
+    seq: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    entry_hash: Mapped[str | None] = mapped_column(String(64), nullable=True)
+
+class Job(Base):  # background work queue, see jobs.py
+    __tablename__ = "jobs"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    kind: Mapped[str] = mapped_column(String(50))
+    payload_json: Mapped[str] = mapped_column(Text, default="{}")
+    status: Mapped[str] = mapped_column(String(20), default="queued")  # queued|running|done|failed
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    run_after: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    locked_until: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)  # lease; expired leases are retried
+    last_error: Mapped[str] = mapped_column(Text, default="")
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+    __table_args__ = (Index("ix_jobs_status_run_after", "status", "run_after"),)
+
+class IdempotencyKey(Base):  # stored responses for Idempotency-Key retries, see idempotency.py
+    __tablename__ = "idempotency_keys"
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)  # sha256 of caller, route and client key
+    fingerprint: Mapped[str] = mapped_column(String(64))  # sha256 of the request body
+    status_code: Mapped[int] = mapped_column(Integer, default=0)  # 0 while the first request is running
+    headers_json: Mapped[str] = mapped_column(Text, default="[]")
+    body: Mapped[bytes] = mapped_column(LargeBinary, default=b"")
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    expires_at: Mapped[datetime] = mapped_column(DateTime, index=True)
+
+class AuditCheckpoint(Base):  # Merkle root per fixed-size block of sealed audit events
+    __tablename__ = "audit_checkpoints"
+    block: Mapped[int] = mapped_column(Integer, primary_key=True)
+    first_seq: Mapped[int] = mapped_column(Integer)
+    last_seq: Mapped[int] = mapped_column(Integer)
+    merkle_root: Mapped[str] = mapped_column(String(64))
+    chain_hash: Mapped[str] = mapped_column(String(64))  # entry_hash of last_seq
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+class AuditSegment(Base):  # archived audit events, one immutable file each, see audit_archive.py
+    __tablename__ = "audit_segments"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    path: Mapped[str] = mapped_column(String(255))  # relative to AFTERME_AUDIT_ARCHIVE_DIR
+    first_seq: Mapped[int] = mapped_column(Integer, unique=True)
+    last_seq: Mapped[int] = mapped_column(Integer)
+    first_id: Mapped[int] = mapped_column(Integer)
+    last_id: Mapped[int] = mapped_column(Integer)
+    min_created_at: Mapped[datetime] = mapped_column(DateTime)
+    max_created_at: Mapped[datetime] = mapped_column(DateTime)
+    rows: Mapped[int] = mapped_column(Integer)
+    bytes: Mapped[int] = mapped_column(Integer)
+    last_hash: Mapped[str] = mapped_column(String(64))  # entry_hash at last_seq; the live chain continues from it
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
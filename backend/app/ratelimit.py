@@ -0,0 +1,204 @@
+"""Token-bucket rate limits for the expensive endpoints.
+
+Each rule names a bucket ("login_ip", "release_token", ...) with a budget of `burst` requests
+refilled evenly over `period` seconds, set as AFTERME_RATE_<NAME>="burst/period". Route-level
+rules run in an ASGI middleware, before the request body (a multipart upload, say) is read;
+limits that need the body, like login attempts per email, call `limiter.check` in the route.
+
+AFTERME_RATELIMIT picks the store: "memory" (per process), "sqlite" (a local file shared by
+every worker on the host, AFTERME_RATELIMIT_DB) or "off".
+"""
+import math, os, re, sqlite3, threading, time
+from collections import OrderedDict
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+
+RATELIMIT_STORE = os.environ.get("AFTERME_RATELIMIT", "memory")
+RATELIMIT_DB = os.environ.get("AFTERME_RATELIMIT_DB", "./afterme-ratelimit.db")
+RATELIMIT_MAX_KEYS = int(os.environ.get("AFTERME_RATELIMIT_MAX_KEYS", "100000"))
+# Behind a reverse proxy, key on the first X-Forwarded-For hop instead of the socket peer.
+TRUST_PROXY = os.environ.get("AFTERME_TRUST_PROXY", "0") == "1"
+
+DEFAULT_LIMITS = {
+    "login_ip": "20/60",
+    "login_email": "5/60",
+    "register_ip": "10/600",
+    "claims_ip": "10/600",
+    "release_ip": "60/60",
+    "release_token": "20/60",
+}
+
+def _parse(spec: str) -> tuple[float, float]:
+    burst, period = spec.split("/")
+    return float(burst), float(burst) / float(period)
+
+LIMITS = {name: _parse(os.environ.get(f"AFTERME_RATE_{name.upper()}", spec)) for name, spec in DEFAULT_LIMITS.items()}
+
+class MemoryStore:
+    """Buckets in an OrderedDict by last use. A bucket that has refilled to full carries no
+    state, so idle ones are dropped from the cold end as they're passed."""
+
+    clock = staticmethod(time.monotonic)
+    blocking = False
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[tuple[str, str], list[float]] = OrderedDict()  # key -> [tokens, updated, full_at]
+        self._lock = threading.Lock()
+
+    def take(self, name: str, key: str, burst: float, rate: float, now: float) -> float:
+        """Spends one token; returns 0 if allowed, else seconds until a token is available."""
+        k = (name, key)
+        with self._lock:
+            b = self._buckets.get(k)
+            tokens = burst if b is None else min(burst, b[0] + (now - b[1]) * rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            if b is None:
+                self._buckets[k] = [tokens, now, now + (burst - tokens) / rate]
+            else:
+                b[0], b[1], b[2] = tokens, now, now + (burst - tokens) / rate
+                self._buckets.move_to_end(k)
+            self._evict(now)
+            return wait
+
+    def _evict(self, now: float):
+        for _ in range(2):  # amortized: at most two per call
+            if not self._buckets:
+                return
+            k, b = next(iter(self._buckets.items()))
+            if b[2] > now and len(self._buckets) <= self.max_keys:
+                return
+            del self._buckets[k]
+
+    def __len__(self):
+        return len(self._buckets)
+
+class SqliteStore:
+    """Same buckets in a SQLite file, so every worker on the host draws from one budget."""
+
+    SWEEP_EVERY = 1000  # checks between deletes of refilled buckets
+    clock = staticmethod(time.time)  # shared across processes
+    blocking = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._count = 0
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL, updated REAL, full_at REAL)"
+        )
+        self._conn().execute("CREATE INDEX IF NOT EXISTS ix_buckets_full_at ON buckets (full_at)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")  # losing a few recent hits on a crash is fine
+            self._local.conn = conn
+        return conn
+
+    def take(self, name: str, key: str, burst: float, rate: float, now: float) -> float:
+        conn = self._conn()
+        k = f"{name}:{key}"
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (k,)).fetchone()
+            tokens = burst if row is None else min(burst, row[0] + (now - row[1]) * rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            conn.execute(
+                "INSERT INTO buckets (key, tokens, updated, full_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated, full_at = excluded.full_at",
+                (k, tokens, now, now + (burst - tokens) / rate),
+            )
+            self._count += 1
+            if self._count % self.SWEEP_EVERY == 0:
+                conn.execute("DELETE FROM buckets WHERE full_at < ?", (now,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+class Limiter:
+    def __init__(self, store):
+        self.store = store
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def wait_for(self, name: str, key: str) -> float:
+        if self.store is None:
+            return 0.0
+        burst, rate = LIMITS[name]
+        wait = self.store.take(name, key, burst, rate, self.store.clock())
+        if wait:
+            with self._lock:
+                self.rejected += 1
+        return wait
+
+    def check(self, name: str, key: str):
+        """Raise 429 with Retry-After if `key` is over the `name` budget."""
+        wait = self.wait_for(name, key)
+        if wait:
+            raise HTTPException(status_code=429, detail="Too many requests", headers={"Retry-After": str(math.ceil(wait))})
+
+def _make_store():
+    if RATELIMIT_STORE == "off":
+        return None
+    if RATELIMIT_STORE == "sqlite":
+        return SqliteStore(RATELIMIT_DB)
+    return MemoryStore(RATELIMIT_MAX_KEYS)
+
+limiter = Limiter(_make_store())
+
+def client_ip(scope) -> str:
+    if TRUST_PROXY:
+        for name, value in scope["headers"]:
+            if name == b"x-forwarded-for":
+                return value.decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+_RELEASE_PATH = re.compile(r"^/release/([^/]+)$")
+
+def _route_rules(method: str, path: str, scope) -> tuple[str | None, list[tuple[str, str]]]:
+    """(route template, [(limit name, key)]) for the request."""
+    if method == "POST":
+        if path == "/auth/login":
+            return path, [("login_ip", client_ip(scope))]
+        if path == "/auth/register":
+            return path, [("register_ip", client_ip(scope))]
+        if path == "/claims":
+            return path, [("claims_ip", client_ip(scope))]
+    elif method == "GET" and (m := _RELEASE_PATH.match(path)):
+        return "/release/{token}", [("release_ip", client_ip(scope)), ("release_token", m.group(1))]
+    return None, []
+
+class RateLimitMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or limiter.store is None:
+            return await self.app(scope, receive, send)
+        template, rules = _route_rules(scope["method"], scope["path"], scope)
+        for name, key in rules:
+            if limiter.store.blocking:
+                wait = await run_in_threadpool(limiter.wait_for, name, key)  # may wait on the file lock
+            else:
+                wait = limiter.wait_for(name, key)
+            if wait:
+                scope["route_path"] = template  # never reaches the router; label the 429 for the metrics
+                headers = [(b"content-type", b"application/json"), (b"retry-after", str(math.ceil(wait)).encode())]
+                await send({"type": "http.response.start", "status": 429, "headers": headers})
+                await send({"type": "http.response.body", "body": b'{"detail":"Too many requests"}'})
+                return
+        await self.app(scope, receive, send)
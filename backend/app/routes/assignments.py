@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 from ..db import get_db
 from .. import models, schemas
 from ..auth import require_user_id
+from ..listing import bump_owner_version
 from .audit import log
 
 router = APIRouter(prefix="/assignments", tags=["assignments"])
@@ -29,7 +30,11 @@ def create_assignment(body: schemas.AssignmentCreate, db: Session = Depends(get_
         permission=body.permission,
     )
     db.add(a)
+    # Invalidates release bundles materialized from the previous assignment set.
+    policy.assignments_version = models.WillPolicy.assignments_version + 1
+    db.flush()
+    bump_owner_version(db, user_id)
+    log(db, actor=f"user:{user_id}", action="ASSIGNMENT_CREATED", target_type="assignment", target_id=str(a.id))
     db.commit()
     db.refresh(a)
-    log(db, actor=f"user:{user_id}", action="ASSIGNMENT_CREATED", target_type="assignment", target_id=str(a.id))
     return {"id": a.id}
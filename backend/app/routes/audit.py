@@ -1,14 +1,274 @@
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import event, insert, select
 from sqlalchemy.orm import Session
-from .. import models
-import json
+from ..db import SessionLocal, get_db
+from .. import audit_archive, audit_chain, models, schemas
+from ..auth import require_admin, require_user_id
+from ..listing import MAX_PAGE_SIZE, PAGE_SIZE
+from ..serialize import columns, rows_response
+from itertools import chain, islice
+import json, logging, os, queue, threading, time
+
+logger = logging.getLogger("afterme.audit")
+
+# "queue": events are handed to a background writer once the caller's transaction commits.
+# "transaction": events are added to the caller's session and committed with it.
+AUDIT_MODE = os.environ.get("AFTERME_AUDIT_MODE", "queue")
+AUDIT_FLUSH_INTERVAL = float(os.environ.get("AFTERME_AUDIT_FLUSH_INTERVAL", "0.5"))  # seconds
+AUDIT_BATCH_SIZE = int(os.environ.get("AFTERME_AUDIT_BATCH_SIZE", "500"))
+AUDIT_QUEUE_MAX = int(os.environ.get("AFTERME_AUDIT_QUEUE_MAX", "100000"))
+EXPORT_BATCH = 1000
+
+router = APIRouter(prefix="/audit", tags=["audit"])
+
+class AuditWriter:
+    """Buffers audit rows in memory and writes them in batches from one background thread.
+    The same thread seals written rows into the hash chain (audit_chain.py)."""
+
+    def __init__(self, flush_interval: float, batch_size: int, max_queue: int):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self.written = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._unsealed = True  # rows left over from before a restart
+
+    def submit(self, rows: list[dict]):
+        for row in rows:
+            try:
+                self.queue.put_nowait(row)
+            except queue.Full:
+                with self._lock:
+                    self.dropped += 1
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        # Guaranteed final drain, also covers events queued while the thread was not running.
+        while self.flush():
+            pass
+        self._seal()
+
+    def flush(self) -> int:
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        self._write(batch)
+        return len(batch)
+
+    def stats(self) -> dict:
+        return {"queue_depth": self.queue.qsize(), "dropped": self.dropped, "written": self.written}
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                batch = [self.queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                # Transaction mode inserts rows without going through the queue.
+                if self._unsealed or AUDIT_MODE == "transaction":
+                    self._seal()
+                continue
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._stop.is_set():
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write(batch)
+            self._seal()
+
+    def _write(self, batch: list[dict]):
+        if not batch:
+            return
+        try:
+            with SessionLocal() as db:
+                db.execute(insert(models.AuditEvent), batch)
+                db.commit()
+        except Exception:
+            logger.exception("failed to write %d audit events", len(batch))
+            with self._lock:
+                self.dropped += len(batch)
+            return
+        with self._lock:
+            self.written += len(batch)
+        self._unsealed = True
+
+    def _seal(self):
+        if not audit_chain.AUDIT_CHAIN:
+            return
+        try:
+            while audit_chain.seal() >= audit_chain.SEAL_BATCH:
+                pass
+            self._unsealed = False
+        except Exception:
+            logger.exception("failed to seal audit events")
+
+writer = AuditWriter(AUDIT_FLUSH_INTERVAL, AUDIT_BATCH_SIZE, AUDIT_QUEUE_MAX)
 
 def log(db: Session, actor: str, action: str, target_type: str, target_id: str, metadata: dict | None = None):
-    evt = models.AuditEvent(
+    """Record an audit event as part of the caller's unit of work; the caller commits."""
+    row = dict(
         actor=actor,
         action=action,
         target_type=target_type,
         target_id=str(target_id),
         metadata_json=json.dumps(metadata or {}),
+        created_at=datetime.utcnow(),
     )
-    db.add(evt)
-    db.commit()
+    if AUDIT_MODE == "transaction":
+        db.add(models.AuditEvent(**row))
+    else:
+        db.info.setdefault("audit_pending", []).append(row)
+
+@event.listens_for(Session, "after_commit")
+def _submit_pending(session: Session):
+    pending = session.info.pop("audit_pending", None)
+    if pending:
+        writer.submit(pending)
+
+@event.listens_for(Session, "after_transaction_create")
+def _mark_savepoint(session: Session, transaction):
+    if transaction.nested:
+        session.info.setdefault("audit_savepoints", {})[transaction] = len(session.info.get("audit_pending", ()))
+
+@event.listens_for(Session, "after_transaction_end")
+def _forget_savepoints(session: Session, transaction):
+    if transaction.parent is None:
+        session.info.pop("audit_savepoints", None)
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_pending(session: Session, previous_transaction):
+    mark = session.info.get("audit_savepoints", {}).pop(previous_transaction, None) if previous_transaction.nested else None
+    if mark is None:
+        session.info.pop("audit_pending", None)
+    elif "audit_pending" in session.info:
+        del session.info["audit_pending"][mark:]  # only what the rolled-back savepoint logged
+
+def _filter(stmt, action: str | None, target_type: str | None, target_id: str | None, since: datetime | None, until: datetime | None):
+    if action:
+        stmt = stmt.where(models.AuditEvent.action == action)
+    if target_type:
+        stmt = stmt.where(models.AuditEvent.target_type == target_type)
+    if target_id:
+        stmt = stmt.where(models.AuditEvent.target_id == target_id)
+    if since:
+        stmt = stmt.where(models.AuditEvent.created_at >= since)
+    if until:
+        stmt = stmt.where(models.AuditEvent.created_at < until)
+    return stmt
+
+@router.get("/me", response_model=list[schemas.AuditEventOut])
+def list_my_events(
+    action: str | None = None,
+    target_type: str | None = None,
+    target_id: str | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    cursor: int | None = None,
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_db),
+    user_id: int = Depends(require_user_id),
+):
+    # Newest first; the cursor is the smallest id already seen.
+    stmt = select(*columns(schemas.AuditEventOut, models.AuditEvent)).where(models.AuditEvent.actor == f"user:{user_id}")
+    stmt = _filter(stmt, action, target_type, target_id, since, until)
+    if cursor is not None:
+        stmt = stmt.where(models.AuditEvent.id < cursor)
+    rows = db.execute(stmt.order_by(models.AuditEvent.id.desc()).limit(limit + 1)).all()
+    # Older events may live in archive segments. Only ones below the cursor and, when the live rows
+    # already fill the page, above the last of them can make this page.
+    floor = rows[-1].id if len(rows) > limit else None
+    archived = list(islice(audit_archive.scan(
+        db, f"user:{user_id}", action, target_type, target_id, since, until,
+        before_id=cursor, after_id=floor, descending=True,
+    ), limit + 1))
+    if archived:
+        rows = sorted(rows + archived, key=lambda r: r.id, reverse=True)[:limit + 1]
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = str(rows[-1].id)
+    return rows_response(rows, schemas.AuditEventOut, headers)
+
+def _export_lines(stmt, filters: dict):
+    # Own session: the request-scoped one is closed before a streamed body finishes.
+    with SessionLocal() as db:
+        archived = audit_archive.scan(db, **filters)  # older, so it goes first
+        live = db.execute(stmt.execution_options(yield_per=EXPORT_BATCH)).partitions()
+        for rows in chain(iter(lambda: list(islice(archived, EXPORT_BATCH)), []), live):
+            yield "".join(
+                json.dumps({
+                    "id": r.id,
+                    "actor": r.actor,
+                    "action": r.action,
+                    "target_type": r.target_type,
+                    "target_id": r.target_id,
+                    "metadata_json": r.metadata_json,
+                    "created_at": r.created_at.isoformat(),
+                }) + "\n"
+                for r in rows
+            )
+
+@router.get("/export", dependencies=[Depends(require_admin)])
+def export_events(
+    actor: str | None = None,
+    action: str | None = None,
+    target_type: str | None = None,
+    target_id: str | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+):
+    e = models.AuditEvent
+    stmt = select(e.id, e.actor, e.action, e.target_type, e.target_id, e.metadata_json, e.created_at)
+    if actor:
+        stmt = stmt.where(e.actor == actor)
+    stmt = _filter(stmt, action, target_type, target_id, since, until).order_by(e.id)
+    filters = dict(actor=actor, action=action, target_type=target_type, target_id=target_id, since=since, until=until)
+    return StreamingResponse(_export_lines(stmt, filters), media_type="application/x-ndjson")
+
+@router.get("/chain", response_model=schemas.AuditAnchorOut, dependencies=[Depends(require_admin)])
+def chain_anchor(db: Session = Depends(get_db)):
+    return audit_chain.anchor(db)
+
+@router.get("/chain/proof/{event_id}", response_model=schemas.AuditProofOut, dependencies=[Depends(require_admin)])
+def chain_proof(event_id: int, db: Session = Depends(get_db)):
+    proof = audit_chain.prove(db, event_id)
+    if proof is None:
+        raise HTTPException(status_code=404, detail="Event not found or not checkpointed yet")
+    return proof
+
+@router.get("/chain/verify", response_model=schemas.AuditVerifyOut, dependencies=[Depends(require_admin)])
+def chain_verify(
+    from_block: int = Query(0, ge=0),
+    to_block: int | None = Query(None, ge=0),
+    since: datetime | None = None,
+    until: datetime | None = None,
+    db: Session = Depends(get_db),
+):
+    """Verify whole blocks; pass the last verified block + 1 as from_block, or a time range."""
+    if since or until:
+        first, last = audit_chain.blocks_between(db, since, until)
+        from_block = max(from_block, first)
+        if last is not None:
+            to_block = last if to_block is None else min(to_block, last)
+    return audit_chain.verify(db, from_block, to_block)
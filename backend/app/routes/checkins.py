@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.orm import Session
+from ..db import get_db
+from .. import models, schemas
+from ..auth import require_admin, require_user_id
+from ..checkins import buffer, overdue_owners
+from ..listing import MAX_PAGE_SIZE, PAGE_SIZE
+
+router = APIRouter(prefix="/checkins", tags=["checkins"])
+
+@router.post("", response_model=schemas.CheckinOut, status_code=202)
+def check_in(user_id: int = Depends(require_user_id)):
+    # No DB work here: the buffer writes the latest check-in per user in periodic batches.
+    now = datetime.utcnow()
+    buffer.record(user_id, now)
+    return schemas.CheckinOut(checked_in_at=now)
+
+def _status(user: models.User) -> schemas.CheckinStatusOut:
+    # A check-in still in the buffer is newer than what's stored.
+    last, due = user.last_checkin_at, user.next_due_at
+    pending = buffer.pending_for(user.id)
+    if pending and (last is None or pending > last):
+        last, due = pending, pending + timedelta(hours=user.checkin_interval_hours)
+    return schemas.CheckinStatusOut(checkin_interval_hours=user.checkin_interval_hours, last_checkin_at=last, next_due_at=due)
+
+@router.get("/me", response_model=schemas.CheckinStatusOut)
+def my_checkin_status(db: Session = Depends(get_db), user_id: int = Depends(require_user_id)):
+    user = db.query(models.User).filter(models.User.id == user_id).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    return _status(user)
+
+@router.put("/me", response_model=schemas.CheckinStatusOut)
+def update_checkin_settings(body: schemas.CheckinSettingsIn, db: Session = Depends(get_db), user_id: int = Depends(require_user_id)):
+    user = db.query(models.User).filter(models.User.id == user_id).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    user.checkin_interval_hours = body.checkin_interval_hours
+    if user.last_checkin_at:
+        user.next_due_at = user.last_checkin_at + timedelta(hours=body.checkin_interval_hours)
+    db.commit()
+    # The flusher reads the interval when it writes, so a buffered check-in lands with the new one.
+    return _status(user)
+
+@router.get("/overdue", response_model=list[schemas.OverdueOwnerOut], dependencies=[Depends(require_admin)])
+def list_overdue(
+    response: Response,
+    cursor: str | None = None,
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_db),
+):
+    # Cursor is "<next_due_at ISO>,<user id>" of the last row seen.
+    after = None
+    if cursor:
+        try:
+            due, uid = cursor.rsplit(",", 1)
+            after = (datetime.fromisoformat(due), int(uid))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    rows = overdue_owners(db, datetime.utcnow(), after, limit + 1)
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = f"{rows[-1].next_due_at.isoformat()},{rows[-1].id}"
+    return rows
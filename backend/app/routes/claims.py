@@ -1,15 +1,19 @@
-import os
-from datetime import datetime
+import json
+from datetime import datetime, timedelta
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
 from sqlalchemy.orm import Session
+from ..auth import require_admin
 from ..db import get_db
 from .. import models, schemas
+from ..blobs import store_upload
+from ..identity import match_recipient
+from ..jobs import enqueue, pool as job_pool
+from ..listing import bump_owner_version
+from ..scheduler import scheduler
 from .audit import log
 
 router = APIRouter(prefix="/claims", tags=["claims"])
 
-UPLOAD_DIR = "app/../uploads"
-
 @router.post("", response_model=schemas.ClaimOut)
 def submit_claim(
     policy_id: int = Form(...),
@@ -24,27 +28,13 @@ def submit_claim(
     if not policy:
         raise HTTPException(status_code=404, detail="Policy not found")
 
-    # Match recipient against policy owner’s recipient list (demo matching)
-    rec = (
-        db.query(models.Recipient)
-        .filter(models.Recipient.owner_id == policy.owner_id)
-        .filter(models.Recipient.email == recipient_email)
-        .filter(models.Recipient.legal_name == legal_name)
-        .filter(models.Recipient.dob == dob)
-        .first()
-    )
+    # Match recipient against policy owner’s recipient list on the normalized identity
+    rec, score = match_recipient(db, policy.owner_id, recipient_email, legal_name, dob)
     if not rec:
         raise HTTPException(status_code=400, detail="Recipient identity did not match will")
 
-    os.makedirs(UPLOAD_DIR, exist_ok=True)
-    ts = int(datetime.utcnow().timestamp())
-    id_path = os.path.join(UPLOAD_DIR, f"claim_{policy_id}_{rec.id}_{ts}_id_{id_doc.filename}")
-    dc_path = os.path.join(UPLOAD_DIR, f"claim_{policy_id}_{rec.id}_{ts}_dc_{death_cert.filename}")
-
-    with open(id_path, "wb") as f:
-        f.write(id_doc.file.read())
-    with open(dc_path, "wb") as f:
-        f.write(death_cert.file.read())
+    id_path = store_upload(id_doc)
+    dc_path = store_upload(death_cert)
 
     claim = models.Claim(
         policy_id=policy_id,
@@ -54,10 +44,15 @@ def submit_claim(
         death_cert_path=dc_path,
     )
     db.add(claim)
+    db.flush()
+    # Hashing, previews and verification run on the job workers; the claim is returned as soon as it's stored.
+    enqueue(db, "claim_documents", {"claim_id": claim.id})
+    bump_owner_version(db, policy.owner_id)
+    log(db, actor=f"recipient:{rec.email}", action="CLAIM_SUBMITTED", target_type="claim", target_id=str(claim.id),
+        metadata={"match_score": round(score, 3)} if score < 1.0 else None)
     db.commit()
     db.refresh(claim)
-
-    log(db, actor=f"recipient:{rec.email}", action="CLAIM_SUBMITTED", target_type="claim", target_id=str(claim.id))
+    job_pool.notify()
     return claim
 
 @router.get("/{claim_id}", response_model=schemas.ClaimOut)
@@ -67,15 +62,36 @@ def get_claim(claim_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Claim not found")
     return claim
 
+@router.get("/{claim_id}/documents", response_model=schemas.ClaimDocumentsOut, dependencies=[Depends(require_admin)])
+def get_claim_documents(claim_id: int, db: Session = Depends(get_db)):
+    # Hashes, metadata, preview paths and verdicts are for reviewers only; GET /claims/{id} carries just the status.
+    claim = db.query(models.Claim).filter(models.Claim.id == claim_id).first()
+    if not claim:
+        raise HTTPException(status_code=404, detail="Claim not found")
+    return schemas.ClaimDocumentsOut(
+        claim_id=claim.id,
+        documents_status=claim.documents_status,
+        documents_checked_at=claim.documents_checked_at,
+        documents=json.loads(claim.documents_json or "{}"),
+    )
+
 @router.post("/{claim_id}/approve", response_model=schemas.ClaimOut)
 def approve_claim(claim_id: int, admin_email: str = Form("admin@afterme.dev"), db: Session = Depends(get_db)):
     claim = db.query(models.Claim).filter(models.Claim.id == claim_id).first()
     if not claim:
         raise HTTPException(status_code=404, detail="Claim not found")
+    policy = db.query(models.WillPolicy).filter(models.WillPolicy.id == claim.policy_id).first()
     claim.status = "approved"
     claim.reviewed_at = datetime.utcnow()
     claim.reviewed_by = admin_email
+    if claim.releases_issued_at is None:
+        # Releases go out automatically once the owner's dispute window has passed.
+        claim.releases_due_at = claim.reviewed_at + timedelta(hours=policy.dispute_window_hours if policy else 0)
+    if policy:
+        bump_owner_version(db, policy.owner_id)
+    log(db, actor=f"admin:{admin_email}", action="CLAIM_APPROVED", target_type="claim", target_id=str(claim.id))
     db.commit()
     db.refresh(claim)
-    log(db, actor=f"admin:{admin_email}", action="CLAIM_APPROVED", target_type="claim", target_id=str(claim.id))
+    if claim.releases_due_at:
+        scheduler.schedule(claim.id, claim.releases_due_at)
     return claim
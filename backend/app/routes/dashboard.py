@@ -0,0 +1,94 @@
+import os, threading
+from collections import OrderedDict
+from fastapi import APIRouter, Depends, Request, Response
+from pydantic_core import to_json
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from ..db import get_db
+from .. import models, schemas
+from ..auth import require_user_id
+from ..listing import owner_version
+from ..serialize import columns, fields
+
+router = APIRouter(prefix="/dashboard", tags=["dashboard"])
+
+DASHBOARD_RECENT_ITEMS = int(os.environ.get("AFTERME_DASHBOARD_RECENT_ITEMS", "50"))
+DASHBOARD_CACHE_SIZE = int(os.environ.get("AFTERME_DASHBOARD_CACHE_SIZE", "1000"))
+
+class DashboardCache:
+    """Rendered dashboards keyed by owner; an entry is only served for the data_version it was built at."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: OrderedDict[int, tuple[int, bytes]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, owner_id: int, version: int) -> bytes | None:
+        with self._lock:
+            entry = self._entries.get(owner_id)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(owner_id)
+            return entry[1]
+
+    def put(self, owner_id: int, version: int, body: bytes):
+        with self._lock:
+            self._entries[owner_id] = (version, body)
+            self._entries.move_to_end(owner_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+cache = DashboardCache(DASHBOARD_CACHE_SIZE)
+
+def _rows(db: Session, schema, entity, *criteria, order_by=None, limit=None) -> list[dict]:
+    names = fields(schema)
+    q = db.query(*columns(schema, entity)).filter(*criteria).order_by(order_by if order_by is not None else entity.id)
+    if limit:
+        q = q.limit(limit)
+    return [dict(zip(names, row)) for row in q]
+
+def build_dashboard(db: Session, owner_id: int) -> dict:
+    """Six queries, whatever the size of the estate."""
+    p, a, v, c = models.WillPolicy, models.WillAssignment, models.VaultItem, models.Claim
+    policy_names = fields(schemas.PolicyOut)
+    policies = [
+        {**dict(zip(policy_names, row[:-1])), "assignment_count": row[-1]}
+        for row in (
+            db.query(*columns(schemas.PolicyOut, p), func.count(a.id))
+            .outerjoin(a, a.policy_id == p.id)
+            .filter(p.owner_id == owner_id)
+            .group_by(p.id)
+            .order_by(p.id)
+        )
+    ]
+    recipients = _rows(db, schemas.RecipientOut, models.Recipient, models.Recipient.owner_id == owner_id)
+    assignments = _rows(db, schemas.AssignmentOut, a, a.policy_id.in_([pol["id"] for pol in policies]))
+    by_type = dict(db.query(v.type, func.count(v.id)).filter(v.owner_id == owner_id).group_by(v.type).all())
+    recent = _rows(db, schemas.VaultItemOut, v, v.owner_id == owner_id, order_by=v.id.desc(), limit=DASHBOARD_RECENT_ITEMS)
+    claims = _rows(
+        db, schemas.DashboardClaimOut, c,
+        c.policy_id.in_([pol["id"] for pol in policies]),
+        c.status.in_(["pending", "approved"]),
+        c.releases_issued_at.is_(None),
+    )
+    return {
+        "policies": policies,
+        "recipients": recipients,
+        "assignments": assignments,
+        "items": {"total": sum(by_type.values()), "by_type": by_type, "recent": recent},
+        "pending_claims": claims,
+    }
+
+@router.get("/me", response_model=schemas.DashboardOut)
+def my_dashboard(request: Request, db: Session = Depends(get_db), user_id: int = Depends(require_user_id)):
+    # Every write that shows up here bumps users.data_version, which keys both the ETag and the cache.
+    version = owner_version(db, user_id)
+    etag = f'W/"dashboard-{user_id}-{version}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    body = cache.get(user_id, version)
+    if body is None:
+        body = to_json(build_dashboard(db, user_id))
+        cache.put(user_id, version, body)
+    return Response(body, media_type="application/json", headers=headers)
@@ -0,0 +1,12 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from ..db import get_db
+from .. import schemas
+from ..auth import require_admin
+from ..jobs import backlog
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+@router.get("/backlog", response_model=schemas.JobBacklogOut, dependencies=[Depends(require_admin)])
+def job_backlog(db: Session = Depends(get_db)):
+    return backlog(db)
@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query, Request
 from sqlalchemy.orm import Session
 from ..db import get_db
 from .. import models, schemas
 from ..auth import require_user_id
+from ..listing import MAX_PAGE_SIZE, PAGE_SIZE, bump_owner_version, keyset_page
 from .audit import log
 
 router = APIRouter(prefix="/policies", tags=["policies"])
@@ -11,11 +12,20 @@ router = APIRouter(prefix="/policies", tags=["policies"])
 def create_policy(body: schemas.PolicyCreate, db: Session = Depends(get_db), user_id: int = Depends(require_user_id)):
     policy = models.WillPolicy(owner_id=user_id, dispute_window_hours=body.dispute_window_hours)
     db.add(policy)
+    db.flush()
+    bump_owner_version(db, user_id)
+    log(db, actor=f"user:{user_id}", action="POLICY_CREATED", target_type="policy", target_id=str(policy.id))
     db.commit()
     db.refresh(policy)
-    log(db, actor=f"user:{user_id}", action="POLICY_CREATED", target_type="policy", target_id=str(policy.id))
     return policy
 
 @router.get("/me", response_model=list[schemas.PolicyOut])
-def list_my_policies(db: Session = Depends(get_db), user_id: int = Depends(require_user_id)):
-    return db.query(models.WillPolicy).filter(models.WillPolicy.owner_id == user_id).all()
+def list_my_policies(
+    request: Request,
+    cursor: int | None = None,
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_db),
+    user_id: int = Depends(require_user_id),
+):
+    query = db.query(models.WillPolicy).filter(models.WillPolicy.owner_id == user_id)
+    return keyset_page(request, db, user_id, "policies", query, models.WillPolicy.id, cursor, limit, schemas.PolicyOut)
@@ -1,8 +1,10 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query, Request
 from sqlalchemy.orm import Session
 from ..db import get_db
 from .. import models, schemas
 from ..auth import require_user_id
+from ..identity import identity_columns
+from ..listing import MAX_PAGE_SIZE, PAGE_SIZE, bump_owner_version, keyset_page
 from .audit import log
 
 router = APIRouter(prefix="/recipients", tags=["recipients"])
@@ -14,13 +16,23 @@ def add_recipient(body: schemas.RecipientCreate, db: Session = Depends(get_db),
         email=str(body.email),
         legal_name=body.legal_name,
         dob=body.dob,
+        **identity_columns(str(body.email), body.legal_name, body.dob),
     )
     db.add(rec)
+    db.flush()
+    bump_owner_version(db, user_id)
+    log(db, actor=f"user:{user_id}", action="RECIPIENT_ADDED", target_type="recipient", target_id=str(rec.id), metadata={"email": rec.email})
     db.commit()
     db.refresh(rec)
-    log(db, actor=f"user:{user_id}", action="RECIPIENT_ADDED", target_type="recipient", target_id=str(rec.id), metadata={"email": rec.email})
     return rec
 
 @router.get("/me", response_model=list[schemas.RecipientOut])
-def list_my_recipients(db: Session = Depends(get_db), user_id: int = Depends(require_user_id)):
-    return db.query(models.Recipient).filter(models.Recipient.owner_id == user_id).all()
+def list_my_recipients(
+    request: Request,
+    cursor: int | None = None,
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_db),
+    user_id: int = Depends(require_user_id),
+):
+    query = db.query(models.Recipient).filter(models.Recipient.owner_id == user_id)
+    return keyset_page(request, db, user_id, "recipients", query, models.Recipient.id, cursor, limit, schemas.RecipientOut)
@@ -1,62 +1,138 @@
 from datetime import datetime, timedelta
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
 from ..db import get_db
 from .. import models, schemas
-from ..crypto import decrypt_payload
+from ..crypto import decrypt_payload, encrypt_payload
+from ..listing import bump_owner_version
+from ..serialize import json_response
 from .audit import log
-import os
+import os, secrets
 
 router = APIRouter(prefix="", tags=["releases"])
 
 SECRET = os.environ.get("AFTERME_RELEASE_SECRET", "dev-release-secret-change-me")
 serializer = URLSafeTimedSerializer(SECRET, salt="afterme-release")
 
-def make_release_token(release_id: int, recipient_id: int) -> str:
-    return serializer.dumps({"release_id": release_id, "recipient_id": recipient_id})
+def make_release_token(release_key: str, recipient_id: int) -> str:
+    return serializer.dumps({"release_key": release_key, "recipient_id": recipient_id})
 
 def parse_release_token(token: str, max_age_seconds: int) -> dict:
     return serializer.loads(token, max_age=max_age_seconds)
 
-@router.post("/claims/{claim_id}/issue-releases", response_model=list[schemas.ReleaseOut])
-def issue_releases(claim_id: int, db: Session = Depends(get_db)):
-    claim = db.query(models.Claim).filter(models.Claim.id == claim_id).first()
-    if not claim:
-        raise HTTPException(status_code=404, detail="Claim not found")
-    if claim.status != "approved":
-        raise HTTPException(status_code=400, detail="Claim must be approved first")
-
+def build_bundles(db: Session, policy_id: int, owner_id: int, recipient_ids: list[int]) -> dict[int, str]:
+    """Encrypted snapshot of each recipient's assigned items, so a release view is a single decrypt."""
+    emails = dict(
+        db.query(models.Recipient.id, models.Recipient.email)
+        .filter(models.Recipient.id.in_(recipient_ids))
+        .all()
+    )
+    rows = (
+        db.query(models.WillAssignment.recipient_id, models.WillAssignment.permission, models.VaultItem)
+        .join(models.VaultItem, models.VaultItem.id == models.WillAssignment.vault_item_id)
+        .filter(models.WillAssignment.policy_id == policy_id)
+        .filter(models.WillAssignment.recipient_id.in_(recipient_ids))
+        .order_by(models.WillAssignment.id)
+        .all()
+    )
+    items: dict[int, list[dict]] = {rid: [] for rid in recipient_ids}
+    payloads: dict[int, dict] = {}
+    for rid, permission, vi in rows:
+        if vi.id not in payloads:
+            payloads[vi.id] = decrypt_payload(vi.encrypted_payload, vi.owner_id)
+        items[rid].append({"title": vi.title, "type": vi.type, "payload": payloads[vi.id], "permission": permission})
+    return {
+        rid: encrypt_payload({"recipient_email": emails.get(rid, ""), "items": items[rid]}, owner_id)
+        for rid in recipient_ids
+    }
+
+def issue_for_claim(db: Session, claim: models.Claim, actor: str = "system") -> list[models.Release] | None:
+    """Create releases for every recipient assigned items on the claim's policy; the caller commits.
+
+    Marks the claim issued with a conditional update, so across workers and the scheduler a claim
+    is issued exactly once. Returns None if someone else got there first.
+    """
     policy = db.query(models.WillPolicy).filter(models.WillPolicy.id == claim.policy_id).first()
     if not policy:
         raise HTTPException(status_code=404, detail="Policy not found")
 
-    # For hackathon: ignore dispute window timing; issue immediately.
     # Recipients that appear in assignments get releases.
-    assignments = db.query(models.WillAssignment).filter(models.WillAssignment.policy_id == policy.id).all()
-    recipient_ids = sorted({a.recipient_id for a in assignments})
+    recipient_ids = sorted(
+        rid for (rid,) in
+        db.query(models.WillAssignment.recipient_id).filter(models.WillAssignment.policy_id == policy.id).distinct()
+    )
 
-    outputs: list[schemas.ReleaseOut] = []
-    for rid in recipient_ids:
-        expires_at = datetime.utcnow() + timedelta(hours=6)
-        release = models.Release(
+    # Bundles first: they may need to create the owner's DEK in its own transaction.
+    version = policy.assignments_version
+    bundles = build_bundles(db, policy.id, policy.owner_id, recipient_ids)
+
+    now = datetime.utcnow()
+    marked = db.execute(
+        update(models.Claim)
+        .where(models.Claim.id == claim.id, models.Claim.releases_issued_at.is_(None))
+        .values(releases_issued_at=now, releases_due_at=None)
+    ).rowcount
+    if not marked:
+        return None
+    bump_owner_version(db, policy.owner_id)  # the claim leaves the owner's pending list
+
+    # One transaction for the whole estate: tokens sign a random key, so no insert-then-update.
+    expires_at = now + timedelta(hours=6)
+    releases = [
+        models.Release(
             claim_id=claim.id,
             recipient_id=rid,
-            token="pending",
+            token=make_release_token(secrets.token_urlsafe(16), rid),
             expires_at=expires_at,
+            bundle_encrypted=bundles[rid],
+            bundle_version=version,
         )
-        db.add(release)
-        db.commit()
-        db.refresh(release)
-
-        token = make_release_token(release.id, rid)
-        release.token = token
-        db.commit()
-
-        release_url = f"http://localhost:8000/release/{token}"
-        outputs.append(schemas.ReleaseOut(release_url=release_url, expires_at=expires_at))
-        log(db, actor="system", action="RELEASE_ISSUED", target_type="release", target_id=str(release.id), metadata={"recipient_id": rid})
+        for rid in recipient_ids
+    ]
+    db.add_all(releases)
+    db.flush()
+    for release in releases:
+        log(db, actor=actor, action="RELEASE_ISSUED", target_type="release", target_id=str(release.id), metadata={"recipient_id": release.recipient_id})
+    return releases
+
+def _release_outputs(releases: list[models.Release]) -> list[schemas.ReleaseOut]:
+    return [
+        schemas.ReleaseOut(release_url=f"http://localhost:8000/release/{r.token}", expires_at=r.expires_at)
+        for r in releases
+    ]
+
+def _issued_releases(db: Session, claim_id: int) -> list[schemas.ReleaseOut]:
+    releases = (
+        db.query(models.Release)
+        .filter(models.Release.claim_id == claim_id)
+        .filter(models.Release.expires_at > datetime.utcnow())
+        .order_by(models.Release.recipient_id)
+        .all()
+    )
+    return _release_outputs(releases)
 
+@router.post("/claims/{claim_id}/issue-releases", response_model=list[schemas.ReleaseOut])
+def issue_releases(claim_id: int, db: Session = Depends(get_db)):
+    claim = db.query(models.Claim).filter(models.Claim.id == claim_id).first()
+    if not claim:
+        raise HTTPException(status_code=404, detail="Claim not found")
+    if claim.status != "approved":
+        raise HTTPException(status_code=400, detail="Claim must be approved first")
+    if claim.releases_issued_at is not None:
+        # Already issued (possibly by the scheduler): hand back the live links.
+        return _issued_releases(db, claim.id)
+    if claim.releases_due_at and datetime.utcnow() < claim.releases_due_at:
+        raise HTTPException(status_code=409, detail=f"Dispute window open until {claim.releases_due_at.isoformat()}Z")
+
+    releases = issue_for_claim(db, claim)
+    if releases is None:
+        db.rollback()
+        return _issued_releases(db, claim.id)
+    # Built before commit, which would expire the rows and reload each one.
+    outputs = _release_outputs(releases)
+    db.commit()
     return outputs
 
 @router.get("/release/{token}", response_model=schemas.ReleaseViewOut)
@@ -69,44 +145,29 @@ def view_release(token: str, db: Session = Depends(get_db)):
     except BadSignature:
         raise HTTPException(status_code=401, detail="Invalid release link")
 
-    release_id = int(data["release_id"])
     recipient_id = int(data["recipient_id"])
 
-    release = db.query(models.Release).filter(models.Release.id == release_id).first()
-    if not release or release.recipient_id != recipient_id:
+    row = (
+        db.query(models.Release, models.Claim.policy_id, models.WillPolicy.owner_id, models.WillPolicy.assignments_version)
+        .join(models.Claim, models.Claim.id == models.Release.claim_id)
+        .join(models.WillPolicy, models.WillPolicy.id == models.Claim.policy_id)
+        .filter(models.Release.token == token)
+        .first()
+    )
+    if not row or row[0].recipient_id != recipient_id:
         raise HTTPException(status_code=404, detail="Release not found")
+    release, policy_id, owner_id, version = row
 
     if datetime.utcnow() > release.expires_at:
         raise HTTPException(status_code=401, detail="Release link expired")
 
-    # Fetch assigned items for this recipient via policy on the claim
-    claim = db.query(models.Claim).filter(models.Claim.id == release.claim_id).first()
-    if not claim:
-        raise HTTPException(status_code=404, detail="Claim not found")
-
-    policy_id = claim.policy_id
-    rec = db.query(models.Recipient).filter(models.Recipient.id == recipient_id).first()
-    if not rec:
-        raise HTTPException(status_code=404, detail="Recipient not found")
-
-    assigns = (
-        db.query(models.WillAssignment)
-        .filter(models.WillAssignment.policy_id == policy_id)
-        .filter(models.WillAssignment.recipient_id == recipient_id)
-        .all()
-    )
+    if not release.bundle_encrypted or release.bundle_version != version:
+        # Assignments changed since issue (or a pre-bundle release): rebuild the snapshot once.
+        release.bundle_encrypted = build_bundles(db, policy_id, owner_id, [recipient_id])[recipient_id]
+        release.bundle_version = version
 
-    items = []
-    for a in assigns:
-        vi = db.query(models.VaultItem).filter(models.VaultItem.id == a.vault_item_id).first()
-        if not vi:
-            continue
-        items.append(schemas.ReleasedItem(
-            title=vi.title,
-            type=vi.type,
-            payload=decrypt_payload(vi.encrypted_payload),
-            permission=a.permission,
-        ))
-
-    log(db, actor=f"recipient:{rec.email}", action="RELEASE_VIEWED", target_type="release", target_id=str(release.id))
-    return schemas.ReleaseViewOut(recipient_email=rec.email, items=items)
+    bundle = decrypt_payload(release.bundle_encrypted, owner_id)
+    log(db, actor=f"recipient:{bundle['recipient_email']}", action="RELEASE_VIEWED", target_type="release", target_id=str(release.id))
+    db.commit()
+    # The bundle was built server-side in ReleaseViewOut's shape; skip re-validating every item.
+    return json_response(bundle)
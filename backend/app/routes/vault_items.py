@@ -1,27 +1,169 @@
-from fastapi import APIRouter, Depends
+import codecs, json, os
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy import insert, select
 from sqlalchemy.orm import Session
-from ..db import get_db
+from ..db import SessionLocal, get_db
 from .. import models, schemas
 from ..auth import require_user_id
-from ..crypto import encrypt_payload
+from ..listing import MAX_PAGE_SIZE, PAGE_SIZE, bump_owner_version, keyset_page
+from ..search import index as search_index
+from ..serialize import columns, fields, json_response
+from ..crypto import decrypt_payload, encrypt_payload, encrypt_payloads
 from .audit import log
 
 router = APIRouter(prefix="/vault-items", tags=["vault-items"])
 
+IMPORT_MAX_ITEMS = int(os.environ.get("AFTERME_IMPORT_MAX_ITEMS", "50000"))
+EXPORT_BATCH = 1000
+
 @router.post("", response_model=schemas.VaultItemOut)
 def create_item(body: schemas.VaultItemCreate, db: Session = Depends(get_db), user_id: int = Depends(require_user_id)):
     item = models.VaultItem(
         owner_id=user_id,
         title=body.title,
         type=body.type,
-        encrypted_payload=encrypt_payload(body.payload),
+        encrypted_payload=encrypt_payload(body.payload, user_id),
     )
     db.add(item)
+    db.flush()
+    bump_owner_version(db, user_id)
+    log(db, actor=f"user:{user_id}", action="VAULT_ITEM_CREATED", target_type="vault_item", target_id=str(item.id))
     db.commit()
     db.refresh(item)
-    log(db, actor=f"user:{user_id}", action="VAULT_ITEM_CREATED", target_type="vault_item", target_id=str(item.id))
+    search_index.add(user_id, item.id, item.title, item.type)
     return item
 
 @router.get("/me", response_model=list[schemas.VaultItemOut])
-def list_my_items(db: Session = Depends(get_db), user_id: int = Depends(require_user_id)):
-    return db.query(models.VaultItem).filter(models.VaultItem.owner_id == user_id).all()
+def list_my_items(
+    request: Request,
+    cursor: int | None = None,
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_db),
+    user_id: int = Depends(require_user_id),
+):
+    query = db.query(models.VaultItem).filter(models.VaultItem.owner_id == user_id)
+    return keyset_page(request, db, user_id, "vault_items", query, models.VaultItem.id, cursor, limit, schemas.VaultItemOut)
+
+SEARCH_PAGE_SIZE = 20
+
+@router.get("/search", response_model=list[schemas.VaultItemMatchOut])
+def search_items(
+    q: str = Query(..., min_length=1, max_length=200),
+    type: str | None = None,
+    cursor: int = Query(0, ge=0),
+    limit: int = Query(SEARCH_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_db),
+    user_id: int = Depends(require_user_id),
+):
+    """Ranked matches on title and type. Results are ordered by rank, so the cursor is an offset."""
+    hits, total = search_index.search(db, user_id, q, type, cursor, limit)
+    headers = {"X-Total-Count": str(total)}
+    if cursor + len(hits) < total:
+        headers["X-Next-Cursor"] = str(cursor + len(hits))
+    names = fields(schemas.VaultItemOut)
+    rows = {
+        r.id: dict(zip(names, r))
+        for r in db.query(*columns(schemas.VaultItemOut, models.VaultItem))
+        .filter(models.VaultItem.owner_id == user_id, models.VaultItem.id.in_([item_id for item_id, _ in hits]))
+    }
+    return json_response([{**rows[item_id], "score": score} for item_id, score in hits if item_id in rows], headers)
+
+async def _iter_json_objects(chunks):
+    """Yield the top-level values of a streamed body holding a JSON array or NDJSON."""
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    malformed = HTTPException(status_code=400, detail="Malformed JSON body")
+    buf = ""
+    opened = closed = False  # the one optional top-level [ ... ]
+    count, after_value = 0, False
+    async for chunk in chunks:
+        buf += utf8.decode(chunk)
+        pos = 0
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n":
+                pos += 1
+            if pos == len(buf):
+                break
+            ch = buf[pos]
+            if closed:
+                raise malformed  # nothing may follow the closing bracket
+            if ch == "[":
+                if opened or count:
+                    raise malformed  # nested arrays aren't items
+                opened, pos = True, pos + 1
+                continue
+            if ch == "]":
+                if not opened or (count and not after_value):
+                    raise malformed
+                closed, pos = True, pos + 1
+                continue
+            if ch == ",":
+                if not opened or not after_value:
+                    raise malformed
+                after_value, pos = False, pos + 1
+                continue
+            if opened and after_value:
+                raise malformed  # array elements need a comma between them
+            try:
+                obj, pos_end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                break  # value continues in the next chunk
+            yield obj
+            count, after_value, pos = count + 1, True, pos_end
+        buf = buf[pos:]
+    if buf.strip(" \t\r\n") or opened != closed:
+        raise malformed
+
+def _import_items(db: Session, items: list[schemas.VaultItemCreate], user_id: int) -> int:
+    tokens = encrypt_payloads([i.payload for i in items], user_id)
+    db.execute(
+        insert(models.VaultItem),
+        [
+            {"owner_id": user_id, "title": i.title, "type": i.type, "encrypted_payload": token}
+            for i, token in zip(items, tokens)
+        ],
+    )
+    bump_owner_version(db, user_id)
+    log(db, actor=f"user:{user_id}", action="VAULT_ITEMS_IMPORTED", target_type="user", target_id=str(user_id), metadata={"count": len(items)})
+    db.commit()
+    return len(items)
+
+@router.post("/import")
+async def import_items(request: Request, db: Session = Depends(get_db), user_id: int = Depends(require_user_id)):
+    """Create many items from a JSON array or NDJSON body of VaultItemCreate objects, in one transaction."""
+    items: list[schemas.VaultItemCreate] = []
+    async for obj in _iter_json_objects(request.stream()):
+        if len(items) >= IMPORT_MAX_ITEMS:
+            raise HTTPException(status_code=413, detail=f"At most {IMPORT_MAX_ITEMS} items per import")
+        try:
+            items.append(schemas.VaultItemCreate.model_validate(obj))
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=f"Item {len(items)}: {e.errors()[0]['msg']}")
+    if not items:
+        return {"imported": 0}
+    return {"imported": await run_in_threadpool(_import_items, db, items, user_id)}
+
+def _export_lines(owner_id: int):
+    # Own session: the request-scoped one is closed before a streamed body finishes.
+    with SessionLocal() as db:
+        v = models.VaultItem
+        stmt = select(v.id, v.title, v.type, v.encrypted_payload, v.created_at).where(v.owner_id == owner_id).order_by(v.id)
+        for rows in db.execute(stmt.execution_options(yield_per=EXPORT_BATCH)).partitions():
+            yield "".join(
+                json.dumps({
+                    "id": r.id,
+                    "title": r.title,
+                    "type": r.type,
+                    "payload": decrypt_payload(r.encrypted_payload, owner_id),
+                    "created_at": r.created_at.isoformat(),
+                }) + "\n"
+                for r in rows
+            )
+
+@router.get("/export")
+def export_items(user_id: int = Depends(require_user_id)):
+    """All of the caller's items with decrypted payloads, as NDJSON that /vault-items/import accepts."""
+    return StreamingResponse(_export_lines(user_id), media_type="application/x-ndjson")
@@ -0,0 +1,182 @@
+import heapq, logging, os, threading
+from datetime import datetime, timedelta
+from sqlalchemy import delete
+from .db import SessionLocal
+from . import audit_archive, models
+from .jobs import pool as job_pool
+
+logger = logging.getLogger("afterme.scheduler")
+
+SCHEDULER_ENABLED = os.environ.get("AFTERME_SCHEDULER", "1") == "1"
+# Only deadlines this close are held in memory; the rest wait in the indexed releases_due_at column.
+SCHEDULER_HORIZON = timedelta(seconds=float(os.environ.get("AFTERME_SCHEDULER_HORIZON", "3600")))
+RELEASE_SWEEP_INTERVAL = timedelta(seconds=float(os.environ.get("AFTERME_RELEASE_SWEEP_INTERVAL", "300")))
+# Expired releases are kept this long so their links keep answering "expired" rather than "not found".
+RELEASE_RETENTION = timedelta(seconds=float(os.environ.get("AFTERME_RELEASE_RETENTION", str(7 * 24 * 3600))))
+ISSUE_BATCH = int(os.environ.get("AFTERME_SCHEDULER_BATCH", "100"))
+ISSUE_RETRY = timedelta(seconds=float(os.environ.get("AFTERME_SCHEDULER_RETRY", "30")))  # doubles per failure, up to the horizon
+
+class DeadlineScheduler:
+    """Issues releases when a claim's dispute window closes and deletes expired releases.
+
+    Near-term deadlines sit in a heap; the thread sleeps until the earliest of the next
+    deadline, the next horizon reload and the next expiry sweep.
+    """
+
+    def __init__(self, horizon: timedelta, sweep_interval: timedelta):
+        self.horizon = horizon
+        self.sweep_interval = sweep_interval
+        self._heap: list[tuple[datetime, int]] = []
+        self._queued: set[int] = set()
+        self._failures: dict[int, int] = {}
+        self._loaded_until = datetime.min
+        self._next_sweep = datetime.min
+        self._next_archive = datetime.min
+        self._cond = threading.Condition()
+        self._stop = False
+        self._thread: threading.Thread | None = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop = False
+        self._loaded_until = datetime.min  # reload pending deadlines after a restart
+        self._thread = threading.Thread(target=self._run, name="deadline-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stop = True
+            self._cond.notify()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def schedule(self, claim_id: int, due_at: datetime):
+        """Called after a claim's deadline is committed; later deadlines are picked up by the next reload."""
+        with self._cond:
+            if due_at <= self._loaded_until and claim_id not in self._queued:
+                heapq.heappush(self._heap, (due_at, claim_id))
+                self._queued.add(claim_id)
+                self._cond.notify()
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._heap)
+
+    def _reload(self, now: datetime):
+        until = now + self.horizon
+        with SessionLocal() as db:
+            rows = (
+                db.query(models.Claim.releases_due_at, models.Claim.id)
+                .filter(models.Claim.releases_due_at.is_not(None))
+                .filter(models.Claim.releases_due_at <= until)
+                .all()
+            )
+        with self._cond:
+            for due_at, claim_id in rows:
+                if claim_id not in self._queued:
+                    heapq.heappush(self._heap, (due_at, claim_id))
+                    self._queued.add(claim_id)
+            self._loaded_until = until
+
+    def _pop_due(self, now: datetime) -> list[int]:
+        due = []
+        with self._cond:
+            while self._heap and self._heap[0][0] <= now and len(due) < ISSUE_BATCH:
+                _, claim_id = heapq.heappop(self._heap)
+                self._queued.discard(claim_id)
+                due.append(claim_id)
+        return due
+
+    def _issue(self, claim_ids: list[int]):
+        from .crypto import owner_dek
+        from .routes.releases import issue_for_claim
+
+        with SessionLocal() as db:
+            due = (
+                db.query(models.Claim.id, models.WillPolicy.owner_id)
+                .outerjoin(models.WillPolicy, models.WillPolicy.id == models.Claim.policy_id)
+                .filter(models.Claim.id.in_(claim_ids))
+                .filter(models.Claim.status == "approved")
+                .filter(models.Claim.releases_issued_at.is_(None))
+                .all()
+            )
+        issued, failed = 0, []
+        # DEKs first: owner_dek may commit a new one, which must not wait behind a claim's write.
+        for owner_id in {owner_id for _, owner_id in due if owner_id is not None}:
+            try:
+                owner_dek(owner_id)
+            except Exception:
+                logger.exception("loading the data key for owner %d failed", owner_id)
+        for claim_id, _ in due:
+            # A transaction per claim: one that can't be issued doesn't hold back the rest of the batch.
+            # No savepoint: on SQLite that would open a read snapshot that can't be upgraded to a
+            # write once another connection commits; plain reads run outside a transaction.
+            try:
+                with SessionLocal() as db:
+                    claim = db.get(models.Claim, claim_id)
+                    releases = issue_for_claim(db, claim, actor="scheduler")
+                    db.commit()
+                issued += len(releases or [])
+            except Exception:
+                logger.exception("issuing releases for claim %d failed", claim_id)
+                failed.append(claim_id)
+        for claim_id in set(claim_ids) - set(failed):
+            self._failures.pop(claim_id, None)
+        for claim_id in failed:
+            self._retry(claim_id)
+        logger.info("issued %d releases for %d claims", issued, len(due) - len(failed))
+
+    def _retry(self, claim_id: int):
+        n = self._failures[claim_id] = self._failures.get(claim_id, 0) + 1
+        due_at = datetime.utcnow() + min(ISSUE_RETRY * 2 ** (n - 1), self.horizon)
+        with self._cond:
+            if claim_id not in self._queued:
+                heapq.heappush(self._heap, (due_at, claim_id))
+                self._queued.add(claim_id)
+
+    def _sweep(self, now: datetime):
+        with SessionLocal() as db:
+            n = db.execute(delete(models.Release).where(models.Release.expires_at < now - RELEASE_RETENTION)).rowcount
+            db.execute(delete(models.IdempotencyKey).where(models.IdempotencyKey.expires_at < now))
+            archive = now >= self._next_archive and audit_archive.schedule(db)
+            db.commit()
+        if archive:
+            job_pool.notify()
+        if now >= self._next_archive:
+            self._next_archive = now + audit_archive.AUDIT_ARCHIVE_INTERVAL
+        if n:
+            logger.info("deleted %d expired releases", n)
+
+    def _run(self):
+        while True:
+            now = datetime.utcnow()
+            try:
+                if now + self.horizon / 2 >= self._loaded_until:
+                    self._reload(now)
+                while due := self._pop_due(now):
+                    self._issue(due)
+                if now >= self._next_sweep:
+                    self._sweep(now)
+                    self._next_sweep = now + self.sweep_interval
+                failed = False
+            except Exception:
+                logger.exception("scheduler tick failed")
+                failed = True
+            with self._cond:
+                if self._stop:
+                    return
+                if failed:
+                    timeout = 5.0  # back off; pending deadlines are still in the database
+                else:
+                    wake = min(self._loaded_until - self.horizon / 2, self._next_sweep)
+                    if self._heap:
+                        wake = min(wake, self._heap[0][0])
+                    timeout = (wake - datetime.utcnow()).total_seconds()
+                if timeout > 0:
+                    self._cond.wait(timeout)
+                if self._stop:
+                    return
+
+scheduler = DeadlineScheduler(SCHEDULER_HORIZON, RELEASE_SWEEP_INTERVAL)
@@ -50,6 +50,9 @@ class VaultItemOut(BaseModel):
     type: str
     created_at: datetime
 
+class VaultItemMatchOut(VaultItemOut):
+    score: int
+
 class AssignmentCreate(BaseModel):
     policy_id: int
     vault_item_id: int
@@ -70,6 +73,14 @@ class ClaimOut(BaseModel):
     created_at: datetime
     reviewed_at: Optional[datetime] = None
     reviewed_by: str = ""
+    documents_status: str = "queued"
+    documents_checked_at: Optional[datetime] = None
+
+class ClaimDocumentsOut(BaseModel):
+    claim_id: int
+    documents_status: str
+    documents_checked_at: Optional[datetime] = None
+    documents: dict
 
 class ReleaseOut(BaseModel):
     release_url: str
@@ -84,3 +95,93 @@ class ReleasedItem(BaseModel):
 class ReleaseViewOut(BaseModel):
     recipient_email: EmailStr
     items: List[ReleasedItem]
+
+class AuditEventOut(BaseModel):
+    id: int
+    actor: str
+    action: str
+    target_type: str
+    target_id: str
+    metadata_json: str
+    created_at: datetime
+
+class AuditAnchorOut(BaseModel):
+    blocks: int
+    root: str
+    head_seq: int
+    head_hash: str
+
+class AuditProofOut(BaseModel):
+    event_id: int
+    seq: int
+    leaf: str
+    block: int
+    block_path: List[List[str]]
+    block_root: str
+    anchor_path: List[List[str]]
+    anchor_root: str
+    anchor_blocks: int
+
+class AuditVerifyOut(BaseModel):
+    ok: bool
+    from_block: int = 0
+    blocks: int
+    events: int
+    last_block: Optional[int] = None
+    head_seq: Optional[int] = None
+    head_hash: Optional[str] = None
+    block: Optional[int] = None
+    error: Optional[str] = None
+
+class CheckinOut(BaseModel):
+    checked_in_at: datetime
+
+class CheckinStatusOut(BaseModel):
+    checkin_interval_hours: int
+    last_checkin_at: Optional[datetime] = None
+    next_due_at: Optional[datetime] = None
+
+class CheckinSettingsIn(BaseModel):
+    checkin_interval_hours: int = Field(ge=1, le=24 * 365)
+
+class OverdueOwnerOut(BaseModel):
+    id: int
+    email: str
+    last_checkin_at: Optional[datetime] = None
+    next_due_at: datetime
+
+class JobBacklogOut(BaseModel):
+    queued: int
+    running: int
+    done: int
+    failed: int
+
+class AssignmentOut(BaseModel):
+    id: int
+    policy_id: int
+    vault_item_id: int
+    recipient_id: int
+    permission: str
+
+class DashboardPolicyOut(PolicyOut):
+    assignment_count: int
+
+class DashboardItemsOut(BaseModel):
+    total: int
+    by_type: dict[str, int]
+    recent: List[VaultItemOut]
+
+class DashboardClaimOut(BaseModel):
+    id: int
+    policy_id: int
+    status: str
+    created_at: datetime
+    documents_status: str
+    releases_due_at: Optional[datetime] = None
+
+class DashboardOut(BaseModel):
+    policies: List[DashboardPolicyOut]
+    recipients: List[RecipientOut]
+    assignments: List[AssignmentOut]
+    items: DashboardItemsOut
+    pending_claims: List[DashboardClaimOut]
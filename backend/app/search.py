@@ -0,0 +1,223 @@
+"""Per-owner search over vault item titles and types.
+
+Each owner's index is built in memory on their first search from (id, title, type) only;
+payloads are never read. Titles and types are normalized (accents, case and punctuation
+folded, as for recipient names) and split into words. Every distinct word has a posting list
+of item keys, and the words themselves are kept sorted (for prefix lookup) and indexed by
+trigram (for substring lookup), so a query word first resolves to a handful of indexed words
+and only then touches items.
+
+A query word hits an item's title as a whole word (4), a word prefix (3) or, from three
+characters on, a substring (2); hitting only the item's type scores 1. Every query word has to
+hit. Results are ranked by total score, then shorter titles, then newest first. An item's key
+packs (title length, -id) into one int, so posting lists sorted by key are already in rank
+order within a score, and a one-word query reads only the head of each list it needs.
+
+Vault items are append-only, so keeping an index current means adding items with a higher id:
+create_item does it for its own process, and a search that sees the owner's data_version
+change catches up from the database (and rebuilds if the item count disagrees).
+"""
+import bisect, heapq, os, threading
+from array import array
+from collections import OrderedDict
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from .identity import normalize_name
+from .listing import owner_version
+from . import models
+
+SEARCH_CACHE_OWNERS = int(os.environ.get("AFTERME_SEARCH_CACHE_OWNERS", "200"))
+LOAD_BATCH = 10_000
+ID_BITS = 40
+ID_MASK = (1 << ID_BITS) - 1
+
+def normalize(text: str) -> str:
+    return normalize_name(text.replace("_", " "))
+
+def item_key(item_id: int, title: str) -> int:
+    return (len(title) << ID_BITS) | (ID_MASK - item_id)
+
+def key_id(key: int) -> int:
+    return ID_MASK - (key & ID_MASK)
+
+def _trigrams(word: str) -> set[str]:
+    return {word[i:i + 3] for i in range(len(word) - 2)}
+
+class WordIndex:
+    """Posting list (sorted item keys) per distinct word, plus prefix and substring lookup over the words."""
+
+    def __init__(self):
+        self.postings: dict[str, array] = {}
+        self.words: list[str] = []  # sorted before each lookup
+        self.grams: dict[str, set[str]] = {}
+        self._unsorted = False
+
+    def add(self, word: str, key: int):
+        posting = self.postings.get(word)
+        if posting is None:
+            posting = self.postings[word] = array("q")
+            self.words.append(word)
+            self._unsorted = True
+            for g in _trigrams(word):
+                self.grams.setdefault(g, set()).add(word)
+        if not posting or posting[-1] < key:
+            posting.append(key)
+        else:
+            posting.insert(bisect.bisect(posting, key), key)
+
+    def lookup(self, word: str) -> list[tuple[int, list[array]]]:
+        """[(score, posting lists)] for the indexed words `word` hits as a whole word, prefix and substring."""
+        if self._unsorted:
+            self.words.sort()  # nearly sorted after the first time: a linear pass
+            self._unsorted = False
+        exact = [self.postings[word]] if word in self.postings else []
+        prefix, i = [], bisect.bisect_right(self.words, word)
+        while i < len(self.words) and self.words[i].startswith(word):
+            prefix.append(self.postings[self.words[i]])
+            i += 1
+        inner = []
+        if len(word) >= 3:
+            sets = sorted((self.grams.get(g, set()) for g in _trigrams(word)), key=len)
+            for w in sets[0].intersection(*sets[1:]):
+                if word in w and not w.startswith(word):
+                    inner.append(self.postings[w])
+        return [(4, exact), (3, prefix), (2, inner)]
+
+class OwnerIndex:
+    def __init__(self):
+        self.titles = WordIndex()
+        self.types = WordIndex()
+        self.by_type: dict[str, set[int]] = {}
+        self.seen: set[int] = set()
+        self.last_id = 0
+        self.version: int | None = None
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.seen)
+
+    def add(self, item_id: int, title: str, type_: str):
+        if item_id in self.seen:
+            return
+        self.seen.add(item_id)
+        self.last_id = max(self.last_id, item_id)
+        title, type_ = normalize(title), normalize(type_)
+        key = item_key(item_id, title)
+        for word in set(title.split()):
+            self.titles.add(word, key)
+        for word in set(type_.split()):
+            self.types.add(word, key)
+        self.by_type.setdefault(type_, set()).add(key)
+
+    def _hits(self, word: str) -> list[tuple[int, list[array]]]:
+        hits = [h for h in self.titles.lookup(word) if h[1]]
+        type_lists = [p for _, lists in self.types.lookup(word) for p in lists]
+        if type_lists:
+            hits.append((1, type_lists))
+        return hits
+
+    def search(self, query: str, type_: str | None, offset: int, limit: int) -> tuple[list[tuple[int, int]], int]:
+        """Returns ([(item_id, score)] for the page, total matches)."""
+        words = normalize(query).split()
+        if not words:
+            return [], 0
+        allowed = None
+        if type_:
+            allowed = self.by_type.get(normalize(type_))
+            if not allowed:
+                return [], 0
+        per_word = [self._hits(w) for w in words]
+        if not all(per_word):
+            return [], 0
+        want = offset + limit
+
+        if len(per_word) == 1:
+            # Score tiers in order; within a tier the merged posting lists are already ranked.
+            page, seen, total = [], set(), 0
+            for score, lists in per_word[0]:
+                members = set().union(*lists) - seen
+                if allowed is not None:
+                    members &= allowed
+                total += len(members)
+                if len(page) < want and members:
+                    last = None
+                    for key in heapq.merge(*lists):
+                        if key != last and key in members:
+                            page.append((key, score))
+                            if len(page) >= want:
+                                break
+                        last = key
+                seen |= members
+            return [(key_id(k), s) for k, s in page[offset:]], total
+
+        tiers = [[(score, set().union(*lists)) for score, lists in hits] for hits in per_word]
+        matched = sorted((set().union(*(s for _, s in t)) for t in tiers), key=len)
+        candidates = matched[0].intersection(*matched[1:])
+        if allowed is not None:
+            candidates &= allowed
+        ranked = []
+        for key in candidates:
+            score = sum(next(score for score, s in t if key in s) for t in tiers)
+            ranked.append((-score, key))
+        page = heapq.nsmallest(want, ranked)[offset:]
+        return [(key_id(k), -neg) for neg, k in page], len(ranked)
+
+class SearchIndex:
+    """LRU of owner indexes."""
+
+    def __init__(self, max_owners: int):
+        self.max_owners = max_owners
+        self._owners: OrderedDict[int, OwnerIndex] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _entry(self, owner_id: int) -> OwnerIndex:
+        with self._lock:
+            idx = self._owners.get(owner_id)
+            if idx is None:
+                idx = self._owners[owner_id] = OwnerIndex()
+            self._owners.move_to_end(owner_id)
+            while len(self._owners) > self.max_owners:
+                self._owners.popitem(last=False)
+            return idx
+
+    def _load(self, db: Session, idx: OwnerIndex, owner_id: int, after_id: int):
+        v = models.VaultItem
+        stmt = (
+            select(v.id, v.title, v.type).where(v.owner_id == owner_id).where(v.id > after_id).order_by(v.id)
+            .execution_options(yield_per=LOAD_BATCH)
+        )
+        for rows in db.execute(stmt).partitions():
+            for r in rows:
+                idx.add(r.id, r.title, r.type)
+
+    def get(self, db: Session, owner_id: int) -> OwnerIndex:
+        """The owner's index, current as of their data_version."""
+        version = owner_version(db, owner_id)
+        idx = self._entry(owner_id)
+        with idx.lock:
+            if idx.version != version:
+                self._load(db, idx, owner_id, idx.last_id)
+                count = db.execute(select(func.count(models.VaultItem.id)).where(models.VaultItem.owner_id == owner_id)).scalar()
+                if count != len(idx):  # an item committed out of id order; start over
+                    fresh = OwnerIndex()
+                    self._load(db, fresh, owner_id, 0)
+                    with self._lock:
+                        self._owners[owner_id] = fresh
+                    idx = fresh
+                idx.version = version
+        return idx
+
+    def add(self, owner_id: int, item_id: int, title: str, type_: str):
+        """Called after an item is committed; a no-op unless the owner's index is loaded."""
+        with self._lock:
+            idx = self._owners.get(owner_id)
+        if idx is not None and idx.version is not None:
+            with idx.lock:
+                idx.add(item_id, title, type_)
+
+    def search(self, db: Session, owner_id: int, query: str, type_: str | None, offset: int, limit: int):
+        idx = self.get(db, owner_id)
+        with idx.lock:
+            return idx.search(query, type_, offset, limit)
+
+index = SearchIndex(SEARCH_CACHE_OWNERS)
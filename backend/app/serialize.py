@@ -0,0 +1,32 @@
+"""Fast JSON path for list and release responses.
+
+Routes keep their `response_model` for the OpenAPI schema but return a ready Response, so
+FastAPI skips its per-field validate-then-serialize pass. Lists select only the columns the
+schema exposes (no ORM hydration) and pydantic-core writes the JSON bytes directly.
+"""
+from functools import lru_cache
+from fastapi import Response
+from pydantic import BaseModel
+from pydantic_core import to_json
+
+@lru_cache(maxsize=None)
+def fields(schema: type[BaseModel]) -> tuple[str, ...]:
+    return tuple(schema.model_fields)
+
+def columns(schema: type[BaseModel], entity) -> list:
+    """The ORM columns backing `schema`'s fields, for Query.with_entities / select()."""
+    return [getattr(entity, name) for name in fields(schema)]
+
+def rows_response(rows: list, schema: type[BaseModel], headers: dict | None = None) -> Response:
+    """JSON array of column-tuple rows selected with `columns(schema, ...)`.
+
+    Callers page at MAX_PAGE_SIZE and have the rows in hand already, so the body is one buffer;
+    unbounded reads (the audit export) stream NDJSON instead.
+    """
+    names = fields(schema)
+    body = to_json([dict(zip(names, row)) for row in rows])
+    return Response(body, media_type="application/json", headers=headers)
+
+def json_response(value, headers: dict | None = None) -> Response:
+    """For values the server built itself in the response schema's shape (e.g. release bundles)."""
+    return Response(to_json(value), media_type="application/json", headers=headers)
@@ -0,0 +1,127 @@
+"""Audit archive: table size before/after archiving and read latency from segments.
+
+Inserts --events synthetic events from --actors users spread over --days days, seals them,
+archives everything older than --keep-days, then compares reads of one actor's history and
+of a one-hour window served by the live table and by the segments.
+
+    python bench/bench_audit_archive.py --events 1000000 --actors 5000 --days 365 --keep-days 30
+"""
+import argparse, os, random, sys, tempfile, time
+from datetime import datetime, timedelta
+from itertools import islice
+from _common import BACKEND_DIR, percentile
+
+ap = argparse.ArgumentParser()
+ap.add_argument("--events", type=int, default=1_000_000)
+ap.add_argument("--actors", type=int, default=5000)
+ap.add_argument("--days", type=int, default=365)
+ap.add_argument("--keep-days", type=int, default=30)
+ap.add_argument("--queries", type=int, default=50)
+args = ap.parse_args()
+
+tmp = tempfile.mkdtemp(prefix="afterme-archive-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+os.environ.setdefault("AFTERME_KEYSTORE", os.path.join(tmp, "bench.keys"))
+os.environ.setdefault("AFTERME_AUDIT_ARCHIVE_DIR", os.path.join(tmp, "archive"))
+os.environ.setdefault("AFTERME_AUDIT_SEAL_BATCH", "50000")
+os.environ["AFTERME_AUDIT_RETENTION_DAYS"] = str(args.keep_days)
+sys.path.insert(0, BACKEND_DIR)
+from sqlalchemy import func, insert, select, text  # noqa: E402
+from app import audit_archive, audit_chain, models  # noqa: E402
+from app.db import SessionLocal, engine  # noqa: E402
+from app.migrate import migrate  # noqa: E402
+
+E = models.AuditEvent
+ACTIONS = ["VAULT_ITEM_CREATED", "ASSIGNMENT_CREATED", "RECIPIENT_CREATED", "CHECKIN", "RELEASE_VIEWED"]
+NOW = datetime.utcnow()
+START = NOW - timedelta(days=args.days)
+
+def fill():
+    step = timedelta(days=args.days) / args.events
+    rng = random.Random(1)
+    with SessionLocal() as db:
+        for lo in range(0, args.events, 50_000):
+            db.execute(insert(E), [
+                {
+                    "actor": f"user:{rng.randrange(args.actors)}",
+                    "action": ACTIONS[i % len(ACTIONS)],
+                    "target_type": "vault_item",
+                    "target_id": str(i),
+                    "metadata_json": '{"title_length": %d}' % (i % 64),
+                    "created_at": START + step * i,
+                }
+                for i in range(lo, min(lo + 50_000, args.events))
+            ])
+            db.commit()
+
+def db_bytes() -> int:
+    with engine.connect() as conn:
+        conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+    return os.path.getsize(engine.url.database)
+
+def live_actor(db, actor: str, limit: int):
+    return db.execute(select(E.id).where(E.actor == actor).order_by(E.id.desc()).limit(limit)).all()
+
+def live_window(db, since: datetime):
+    return db.execute(select(E.id).where(E.created_at >= since).where(E.created_at < since + timedelta(hours=1))).all()
+
+def timed_ms(fn, n: int) -> list[float]:
+    out = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        fn()
+        out.append((time.perf_counter() - t0) * 1000)
+    return out
+
+def report(label: str, samples: list[float]):
+    print(f"  {label:<34} p50 {percentile(samples, 50):7.2f} ms   p95 {percentile(samples, 95):7.2f} ms")
+
+def main():
+    migrate()
+    fill()
+    audit_chain.seal_all()
+    before = db_bytes()
+    rng = random.Random(2)
+    actors = [f"user:{rng.randrange(args.actors)}" for _ in range(args.queries)]
+    windows = [START + timedelta(hours=rng.randrange((args.days - args.keep_days) * 24)) for _ in range(args.queries)]
+
+    print(f"{args.events:,} events, {args.actors:,} actors, {args.days} days; archiving all but the last {args.keep_days}")
+    print("live table only")
+    with SessionLocal() as db:
+        it = iter(actors)
+        report("actor, newest 50", timed_ms(lambda: live_actor(db, next(it), 50), args.queries))
+        it = iter(actors)
+        report("actor, full history", timed_ms(lambda: live_actor(db, next(it), 10**9), args.queries))
+        it = iter(windows)
+        report("one-hour window (old)", timed_ms(lambda: live_window(db, next(it)), args.queries))
+
+    t0 = time.perf_counter()
+    moved = audit_archive.archive()
+    elapsed = time.perf_counter() - t0
+    with engine.connect() as conn:
+        conn.execution_options(isolation_level="AUTOCOMMIT").exec_driver_sql("VACUUM")
+    with SessionLocal() as db:
+        segs = db.execute(select(func.count(), func.sum(models.AuditSegment.bytes))).one()
+        live = db.execute(select(func.count(E.id))).scalar()
+    print(f"\narchived {moved:,} events in {elapsed:.1f} s into {segs[0]} segments, {segs[1] / 2**20:,.1f} MiB")
+    print(f"database {before / 2**20:,.1f} MiB -> {db_bytes() / 2**20:,.1f} MiB ({live:,} live events)")
+
+    print("live table + segments")
+    with SessionLocal() as db:
+        it = iter(actors)
+        report("actor, newest 50 (live)", timed_ms(lambda: live_actor(db, next(it), 50), args.queries))
+        it = iter(actors)
+        report("actor, full history", timed_ms(
+            lambda: (live_actor(db, a := next(it), 10**9), list(audit_archive.scan(db, actor=a, descending=True))), args.queries))
+        it = iter(actors)
+        report("actor, 50 before the cutoff", timed_ms(
+            lambda: list(islice(audit_archive.scan(db, actor=next(it), descending=True), 50)), args.queries))
+        it = iter(windows)
+        report("one-hour window (archived)", timed_ms(
+            lambda: list(audit_archive.scan(db, since=(w := next(it)), until=w + timedelta(hours=1))), args.queries))
+        t0 = time.perf_counter()
+        result = audit_chain.verify(db)
+        print(f"  full chain verify across segments: {time.perf_counter() - t0:.1f} s, ok={result['ok']}")
+
+if __name__ == "__main__":
+    main()
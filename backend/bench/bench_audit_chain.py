@@ -0,0 +1,109 @@
+"""Audit hash chain: sealing throughput and verification time as the log grows.
+
+Inserts --events synthetic audit rows unsealed, seals them (chain + Merkle checkpoints), then
+times a full verification, an incremental one covering only --append new events, a time-range
+verification of the newest hour, and inclusion proofs for random events.
+
+    python bench/bench_audit_chain.py --events 10000000 --append 10000
+
+10M events take roughly 3 GB of SQLite on disk; --db keeps the file for reruns with --reuse.
+"""
+import argparse, os, random, sys, tempfile, time
+from datetime import datetime, timedelta
+from _common import BACKEND_DIR, percentile
+
+ap = argparse.ArgumentParser()
+ap.add_argument("--events", type=int, default=10_000_000)
+ap.add_argument("--append", type=int, default=10_000, help="events added before the incremental verify")
+ap.add_argument("--proofs", type=int, default=200)
+ap.add_argument("--db", default=None, help="database file (default: a temp dir)")
+ap.add_argument("--reuse", action="store_true", help="skip insert/seal if the database already holds the events")
+args = ap.parse_args()
+
+path = args.db or os.path.join(tempfile.mkdtemp(prefix="afterme-chain-"), "bench.db")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{path}")
+os.environ.setdefault("AFTERME_KEYSTORE", path + ".keys")
+os.environ.setdefault("AFTERME_AUDIT_SEAL_BATCH", "50000")
+sys.path.insert(0, BACKEND_DIR)
+from sqlalchemy import func, insert, select  # noqa: E402
+from app import audit_chain, models  # noqa: E402
+from app.db import SessionLocal  # noqa: E402
+from app.migrate import migrate  # noqa: E402
+
+INSERT_CHUNK = 50_000
+ACTIONS = ["vault_item.create", "vault_item.update", "assignment.create", "claim.submit", "release.view"]
+T0 = datetime(2024, 1, 1)
+
+def fill(start: int, n: int):
+    """Rows start+1 .. start+n, one second apart, inserted without seq/entry_hash."""
+    with SessionLocal() as db:
+        for lo in range(start, start + n, INSERT_CHUNK):
+            hi = min(lo + INSERT_CHUNK, start + n)
+            db.execute(insert(models.AuditEvent), [
+                {
+                    "actor": f"user:{i % 5000}",
+                    "action": ACTIONS[i % len(ACTIONS)],
+                    "target_type": "vault_item",
+                    "target_id": str(i),
+                    "metadata_json": '{"title_length": %d}' % (i % 64),
+                    "created_at": T0 + timedelta(seconds=i),
+                }
+                for i in range(lo, hi)
+            ])
+            db.commit()
+
+def timed(fn, *a, **kw):
+    t0 = time.perf_counter()
+    out = fn(*a, **kw)
+    return out, time.perf_counter() - t0
+
+def main():
+    migrate()
+    with SessionLocal() as db:
+        have = db.execute(select(func.count(models.AuditEvent.id))).scalar()
+    if not (args.reuse and have >= args.events):
+        _, t = timed(fill, have, args.events - have)
+        print(f"insert  {args.events - have:>11,} events  {t:8.1f} s")
+        sealed, t = timed(audit_chain.seal_all)
+        print(f"seal    {sealed:>11,} events  {t:8.1f} s  ({sealed / max(t, 1e-9):,.0f}/s)")
+    print(f"database {os.path.getsize(path) / 2**20:,.0f} MiB, block size {audit_chain.AUDIT_BLOCK_SIZE}")
+
+    with SessionLocal() as db:
+        report, t = timed(audit_chain.verify, db)
+    assert report["ok"], report
+    print(f"full verify        {report['events']:>11,} events {report['blocks']:>7,} blocks  {t:8.2f} s  ({report['events'] / t:,.0f}/s)")
+    last_block = report.get("last_block", -1)
+
+    with SessionLocal() as db:
+        total = db.execute(select(func.count(models.AuditEvent.id))).scalar()
+    fill(total, args.append)
+    sealed, t = timed(audit_chain.seal_all)
+    print(f"seal    {sealed:>11,} appended  {t:8.2f} s")
+    with SessionLocal() as db:
+        report, t = timed(audit_chain.verify, db, last_block + 1)
+    assert report["ok"], report
+    print(f"incremental verify {report['events']:>11,} events {report['blocks']:>7,} blocks  {t * 1000:8.1f} ms")
+
+    with SessionLocal() as db:
+        newest = db.execute(select(func.max(models.AuditEvent.created_at))).scalar()
+        first, last = audit_chain.blocks_between(db, newest - timedelta(hours=1), None)
+        report, t = timed(audit_chain.verify, db, first, last)
+    assert report["ok"], report
+    print(f"last-hour verify   {report['events']:>11,} events {report['blocks']:>7,} blocks  {t * 1000:8.1f} ms")
+
+    with SessionLocal() as db:
+        anchor, t = timed(audit_chain.anchor, db)
+        print(f"anchor over {anchor['blocks']:,} checkpoints  {t * 1000:.1f} ms")
+        head = anchor["blocks"] * audit_chain.AUDIT_BLOCK_SIZE
+        ids = [db.execute(select(models.AuditEvent.id).where(models.AuditEvent.seq == random.randint(1, head))).scalar()
+               for _ in range(args.proofs)]
+        samples, size = [], 0
+        for eid in ids:
+            proof, t = timed(audit_chain.prove, db, eid)
+            assert audit_chain.check_proof(proof)
+            samples.append(t)
+            size = len(proof["block_path"]) + len(proof["anchor_path"])
+    print(f"proof   p50 {percentile(samples, 50) * 1000:.1f} ms  p95 {percentile(samples, 95) * 1000:.1f} ms  ({size} hashes)")
+
+if __name__ == "__main__":
+    main()
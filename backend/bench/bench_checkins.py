@@ -0,0 +1,67 @@
+"""Check-in ingestion rate and the cost of the overdue scan over a large user table.
+
+    python bench/bench_checkins.py --users 1000000 --checkins 500000
+"""
+import argparse, os, random, sys, tempfile, time
+from datetime import datetime, timedelta
+from _common import BACKEND_DIR
+
+tmp = tempfile.mkdtemp(prefix="afterme-checkins-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+sys.path.insert(0, BACKEND_DIR)
+from sqlalchemy import insert, text  # noqa: E402
+from app import models  # noqa: E402
+from app.checkins import CheckinBuffer, overdue_owners  # noqa: E402
+from app.db import SessionLocal, engine  # noqa: E402
+from app.migrate import migrate  # noqa: E402
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=1_000_000)
+    ap.add_argument("--checkins", type=int, default=500_000)
+    ap.add_argument("--overdue-pct", type=float, default=1.0, help="share of users already past due")
+    args = ap.parse_args()
+
+    migrate()
+    now = datetime.utcnow()
+    t0 = time.perf_counter()
+    with engine.begin() as conn:
+        for start in range(0, args.users, 50_000):
+            rows = []
+            for i in range(start, min(start + 50_000, args.users)):
+                overdue = random.random() * 100 < args.overdue_pct
+                due = now - timedelta(hours=random.randint(1, 500)) if overdue else now + timedelta(hours=random.randint(1, 720))
+                rows.append({"email": f"u{i}@bench.dev", "name": "u", "password_salt": "", "password_hash": "",
+                             "last_checkin_at": due - timedelta(hours=720), "next_due_at": due})
+            conn.execute(insert(models.User), rows)
+    print(f"seeded {args.users:,} users in {time.perf_counter() - t0:.1f}s")
+
+    buf = CheckinBuffer(flush_interval=3600, batch_size=1000)
+    t0 = time.perf_counter()
+    for _ in range(args.checkins):
+        buf.record(random.randint(1, args.users), datetime.utcnow())
+    ingest = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    written = buf.flush()
+    flush = time.perf_counter() - t0
+    print(f"check-ins: {args.checkins / ingest:,.0f}/s buffered; {args.checkins:,} coalesced into {written:,} rows, "
+          f"flushed in {flush:.2f}s ({written / flush:,.0f} rows/s)")
+
+    with SessionLocal() as db:
+        plan = db.execute(text("EXPLAIN QUERY PLAN SELECT id FROM users WHERE next_due_at <= :now ORDER BY next_due_at, id"),
+                          {"now": now}).all()
+        print("plan:", "; ".join(r[-1] for r in plan))
+        t0 = time.perf_counter()
+        page = overdue_owners(db, datetime.utcnow(), None, 100)
+        first = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        total, after = 0, None
+        while page:
+            total += len(page)
+            after = (page[-1].next_due_at, page[-1].id)
+            page = overdue_owners(db, datetime.utcnow(), after, 1000)
+        full = time.perf_counter() - t0
+    print(f"overdue scan: first page {first * 1000:.1f}ms; all {total:,} overdue owners in {full * 1000:.0f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Claim submission throughput with multi-MB documents, plus the server's peak RSS.
+
+    python bench/bench_claims.py --claims 40 --mb 8 --concurrency 4
+"""
+import argparse, os, time, urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from _common import Server, call, multipart, percentile
+
+def peak_rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--claims", type=int, default=40)
+    ap.add_argument("--mb", type=int, default=8)
+    ap.add_argument("--concurrency", type=int, default=4)
+    ap.add_argument("--distinct", action="store_true", help="unique documents per claim (no dedup)")
+    args = ap.parse_args()
+
+    with Server() as srv:
+        _, out = call(srv.base, "POST", "/auth/register", {"email": "owner@bench.dev", "name": "o", "password": "password123"})
+        token = out["token"]
+        _, policy = call(srv.base, "POST", "/policies", {"dispute_window_hours": 24}, token=token)
+        call(srv.base, "POST", "/recipients", {"email": "heir@bench.dev", "legal_name": "Heir", "dob": "1990-01-01"}, token=token)
+        fields = {"policy_id": policy["id"], "recipient_email": "heir@bench.dev", "legal_name": "Heir", "dob": "1990-01-01"}
+        shared = os.urandom(args.mb * 1024 * 1024)
+        rss_before = peak_rss_mb(srv.proc.pid)
+
+        def submit(i: int) -> float:
+            doc = os.urandom(args.mb * 1024 * 1024) if args.distinct else shared
+            body, ctype = multipart(fields, {"id_doc": ("id.pdf", doc), "death_cert": ("dc.pdf", doc[::-1])})
+            req = urllib.request.Request(srv.base + "/claims", data=body, method="POST", headers={"Content-Type": ctype})
+            t0 = time.perf_counter()
+            with urllib.request.urlopen(req, timeout=120) as resp:
+                assert resp.status == 200
+            return time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(args.concurrency) as ex:
+            latencies = list(ex.map(submit, range(args.claims)))
+        elapsed = time.perf_counter() - t0
+        rss_after = peak_rss_mb(srv.proc.pid)
+
+    print(f"{args.claims} claims x 2 x {args.mb} MB in {elapsed:.2f}s ({args.claims / elapsed:.1f} claims/s, "
+          f"{args.claims * 2 * args.mb / elapsed:.0f} MB/s)")
+    print(f"latency p50={percentile(latencies, 50) * 1000:.0f}ms p99={percentile(latencies, 99) * 1000:.0f}ms")
+    print(f"server peak RSS: {rss_before:.0f} MB before, {rss_after:.0f} MB after")
+
+if __name__ == "__main__":
+    main()
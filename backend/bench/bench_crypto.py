@@ -0,0 +1,45 @@
+"""Payload decrypts/sec with a cold DEK cache (lookup + unwrap every time) vs a warm one.
+
+    python bench/bench_crypto.py --owners 200 --items 20
+"""
+import argparse, os, sys, tempfile, time
+from _common import BACKEND_DIR
+
+tmp = tempfile.mkdtemp(prefix="afterme-crypto-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+os.environ.setdefault("AFTERME_KEYSTORE", os.path.join(tmp, "bench.keys"))
+sys.path.insert(0, BACKEND_DIR)
+from app import models  # noqa: E402
+from app.crypto import decrypt_payload, dek_cache, encrypt_payload  # noqa: E402
+from app.db import SessionLocal  # noqa: E402
+from app.migrate import migrate  # noqa: E402
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--owners", type=int, default=200)
+    ap.add_argument("--items", type=int, default=20)
+    args = ap.parse_args()
+
+    migrate()
+    with SessionLocal() as db:
+        db.add_all(models.User(email=f"u{i}@bench.dev", name="u", password_salt="", password_hash="") for i in range(args.owners))
+        db.commit()
+        owner_ids = [uid for (uid,) in db.query(models.User.id)]
+    tokens = [(oid, encrypt_payload({"username": "someone", "password": "x" * 24}, oid))
+              for oid in owner_ids for _ in range(args.items)]
+
+    for label, cold in (("cold", True), ("warm", False)):
+        dek_cache.clear()
+        if not cold:
+            for oid, token in tokens[::args.items]:  # one decrypt per owner primes the cache
+                decrypt_payload(token, oid)
+        t0 = time.perf_counter()
+        for oid, token in tokens:
+            if cold:
+                dek_cache.clear()
+            decrypt_payload(token, oid)
+        elapsed = time.perf_counter() - t0
+        print(f"{label}: {len(tokens) / elapsed:,.0f} decrypts/s ({elapsed / len(tokens) * 1e6:.0f} us each)")
+
+if __name__ == "__main__":
+    main()
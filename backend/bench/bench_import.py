@@ -0,0 +1,44 @@
+"""Bulk import throughput (items/sec) vs one POST /vault-items per item.
+
+    python bench/bench_import.py --items 10000 --single 500
+"""
+import argparse, json, time, urllib.request
+from _common import Server, call
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--items", type=int, default=10_000)
+    ap.add_argument("--single", type=int, default=500, help="items to create one request at a time")
+    args = ap.parse_args()
+
+    items = [{"title": f"site-{i}.example", "type": "login", "payload": {"username": f"user{i}", "password": "x" * 20}}
+             for i in range(args.items)]
+    with Server() as srv:
+        _, out = call(srv.base, "POST", "/auth/register", {"email": "owner@bench.dev", "name": "o", "password": "password123"})
+        token = out["token"]
+
+        t0 = time.perf_counter()
+        for item in items[:args.single]:
+            call(srv.base, "POST", "/vault-items", item, token=token)
+        single = time.perf_counter() - t0
+
+        body = "\n".join(json.dumps(i) for i in items).encode()
+        req = urllib.request.Request(srv.base + "/vault-items/import", data=body, method="POST",
+                                     headers={"Authorization": f"Bearer {token}", "Content-Type": "application/x-ndjson"})
+        t0 = time.perf_counter()
+        with urllib.request.urlopen(req, timeout=600) as resp:
+            imported = json.loads(resp.read())["imported"]
+        bulk = time.perf_counter() - t0
+
+        req = urllib.request.Request(srv.base + "/vault-items/export", headers={"Authorization": f"Bearer {token}"})
+        t0 = time.perf_counter()
+        with urllib.request.urlopen(req, timeout=600) as resp:
+            exported = sum(1 for _ in resp)
+        export = time.perf_counter() - t0
+
+    print(f"single POSTs: {args.single / single:,.0f} items/s")
+    print(f"bulk import:  {imported / bulk:,.0f} items/s ({imported} items in {bulk:.2f}s)")
+    print(f"export:       {exported / export:,.0f} items/s ({exported} items)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""Release issuance time as the number of recipients on a policy grows.
+
+    python bench/bench_issue.py --recipients 1 10 50 200
+"""
+import argparse, time
+from _common import Server, call, post_form
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--recipients", type=int, nargs="+", default=[1, 10, 50, 200])
+    ap.add_argument("--items", type=int, default=3, help="items assigned to each recipient")
+    args = ap.parse_args()
+
+    with Server() as srv:
+        _, out = call(srv.base, "POST", "/auth/register", {"email": "owner@bench.dev", "name": "o", "password": "password123"})
+        token = out["token"]
+        items = [call(srv.base, "POST", "/vault-items", {"title": f"item {i}", "type": "login", "payload": {"password": "x" * 32}}, token=token)[1]
+                 for i in range(args.items)]
+        print(f"{'recipients':>10} {'issue ms':>10} {'per recipient ms':>17}")
+        for n in args.recipients:
+            _, policy = call(srv.base, "POST", "/policies", {"dispute_window_hours": 24}, token=token)
+            for r in range(n):
+                _, rec = call(srv.base, "POST", "/recipients", {"email": f"p{policy['id']}r{r}@bench.dev", "legal_name": "Heir", "dob": "1990-01-01"}, token=token)
+                for item in items:
+                    call(srv.base, "POST", "/assignments", {"policy_id": policy["id"], "vault_item_id": item["id"], "recipient_id": rec["id"]}, token=token)
+            status, claim = post_form(srv.base, "/claims",
+                                      {"policy_id": policy["id"], "recipient_email": f"p{policy['id']}r0@bench.dev", "legal_name": "Heir", "dob": "1990-01-01"},
+                                      {"id_doc": ("id.pdf", b"id"), "death_cert": ("dc.pdf", b"dc")})
+            assert status == 200, status
+            post_form(srv.base, f"/claims/{claim['id']}/approve", {"admin_email": "admin@bench.dev"})
+            t0 = time.perf_counter()
+            status, releases = call(srv.base, "POST", f"/claims/{claim['id']}/issue-releases")
+            elapsed = time.perf_counter() - t0
+            assert status == 200 and len(releases) == n, status
+            print(f"{n:>10} {elapsed * 1000:>10.1f} {elapsed * 1000 / n:>17.2f}")
+
+if __name__ == "__main__":
+    main()
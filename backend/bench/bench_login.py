@@ -0,0 +1,55 @@
+"""Login storm: logins/sec plus p99 of an unrelated endpoint while PBKDF2 is saturated.
+
+    python bench/bench_login.py --users 50 --concurrency 32 --seconds 10
+    AFTERME_KDF_WORKERS=0 python bench/bench_login.py   # inline hashing, for comparison
+"""
+import argparse, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from _common import Server, call, percentile
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=50)
+    ap.add_argument("--concurrency", type=int, default=32)
+    ap.add_argument("--seconds", type=float, default=10)
+    args = ap.parse_args()
+
+    with Server() as srv:
+        tokens = []
+        for i in range(args.users):
+            status, out = call(srv.base, "POST", "/auth/register", {"email": f"u{i}@bench.dev", "name": "u", "password": "password123"})
+            assert status == 200, status
+            tokens.append(out["token"])
+
+        stop = time.monotonic() + args.seconds
+        statuses: dict[int, int] = {}
+        lock = threading.Lock()
+        probe_latencies: list[float] = []
+
+        def storm(worker: int):
+            i = worker
+            while time.monotonic() < stop:
+                status, _ = call(srv.base, "POST", "/auth/login", {"email": f"u{i % args.users}@bench.dev", "password": "password123"})
+                with lock:
+                    statuses[status] = statuses.get(status, 0) + 1
+                i += args.concurrency
+
+        def probe():
+            while time.monotonic() < stop:
+                t0 = time.perf_counter()
+                call(srv.base, "GET", "/policies/me", token=tokens[0])
+                probe_latencies.append(time.perf_counter() - t0)
+                time.sleep(0.01)
+
+        with ThreadPoolExecutor(args.concurrency + 1) as ex:
+            ex.submit(probe)
+            for w in range(args.concurrency):
+                ex.submit(storm, w)
+
+    ok = statuses.get(200, 0)
+    print(f"logins ok: {ok} ({ok / args.seconds:.1f}/s), statuses: {statuses}")
+    print(f"/policies/me during storm: n={len(probe_latencies)} "
+          f"p50={percentile(probe_latencies, 50) * 1000:.1f}ms p99={percentile(probe_latencies, 99) * 1000:.1f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Rate limiter cost and effect.
+
+1. Overhead: token-bucket checks/s for the in-memory and SQLite stores.
+2. Flood: legitimate logins (each from its own account and address, spaced out) while
+   attacker threads hammer /auth/login from a single address, with the limiter off, in memory
+   and on SQLite. Addresses are simulated with X-Forwarded-For (AFTERME_TRUST_PROXY=1).
+
+    python bench/bench_ratelimit.py --checks 200000 --keys 10000 --duration 15 --attackers 8
+"""
+import argparse, json, os, sys, tempfile, threading, time, urllib.error, urllib.request
+from _common import BACKEND_DIR, Server, percentile
+
+sys.path.insert(0, BACKEND_DIR)
+from app.ratelimit import MemoryStore, SqliteStore  # noqa: E402
+
+def overhead(checks: int, keys: int):
+    tmp = tempfile.mkdtemp(prefix="afterme-ratelimit-")
+    for label, store in (("memory", MemoryStore(100_000)), ("sqlite", SqliteStore(os.path.join(tmp, "rl.db")))):
+        n = checks if label == "memory" else checks // 10
+        t0 = time.perf_counter()
+        for i in range(n):
+            store.take("bench", str(i % keys), 20.0, 20 / 60, store.clock())
+        elapsed = time.perf_counter() - t0
+        print(f"{label:>7}: {n / elapsed:>12,.0f} checks/s ({elapsed / n * 1e6:.1f} us each)")
+
+def post(base: str, path: str, body: dict, ip: str) -> int:
+    req = urllib.request.Request(base + path, data=json.dumps(body).encode(), method="POST",
+                                 headers={"Content-Type": "application/json", "X-Forwarded-For": ip})
+    try:
+        with urllib.request.urlopen(req, timeout=60) as resp:
+            resp.read()
+            return resp.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+def flood(store: str, args) -> dict:
+    env = {"AFTERME_RATELIMIT": store, "AFTERME_TRUST_PROXY": "1", "AFTERME_KDF_WORKERS": "0",
+           "AFTERME_PASSWORD_ITERATIONS": str(args.iterations), "AFTERME_SCHEDULER": "0"}
+    with Server(env=env) as server:
+        per_client = int(args.duration / args.interval) + 2
+        users = [f"legit{i}@bench.dev" for i in range(args.clients * per_client)]
+        for i, email in enumerate(users):
+            post(server.base, "/auth/register", {"email": email, "name": "u", "password": "password123"}, f"10.1.{i // 250}.{i % 250}")
+        post(server.base, "/auth/register", {"email": "victim@bench.dev", "name": "v", "password": "password123"}, "10.9.9.9")
+
+        stop = threading.Event()
+        legit: list[float] = []
+        statuses: dict[int, int] = {}
+        attack_count = [0]
+
+        def attacker():
+            while not stop.is_set():
+                post(server.base, "/auth/login", {"email": "victim@bench.dev", "password": "wrong-password"}, "10.66.0.1")
+                attack_count[0] += 1
+
+        def client(c: int):
+            for i in range(c * per_client, (c + 1) * per_client):
+                if stop.is_set():
+                    return
+                t0 = time.perf_counter()
+                status = post(server.base, "/auth/login", {"email": users[i], "password": "password123"}, f"10.1.{i // 250}.{i % 250}")
+                legit.append(time.perf_counter() - t0)
+                statuses[status] = statuses.get(status, 0) + 1
+                stop.wait(args.interval)
+
+        threads = [threading.Thread(target=attacker) for _ in range(args.attackers)]
+        threads += [threading.Thread(target=client, args=(i,)) for i in range(args.clients)]
+        for t in threads:
+            t.start()
+        time.sleep(args.duration)
+        stop.set()
+        for t in threads:
+            t.join()
+    return {"legit": legit, "statuses": statuses, "attacks": attack_count[0]}
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--checks", type=int, default=200_000)
+    ap.add_argument("--keys", type=int, default=10_000)
+    ap.add_argument("--duration", type=float, default=15)
+    ap.add_argument("--attackers", type=int, default=8)
+    ap.add_argument("--clients", type=int, default=4)
+    ap.add_argument("--interval", type=float, default=0.5, help="seconds between a legitimate client's logins")
+    ap.add_argument("--iterations", type=int, default=120_000, help="PBKDF2 iterations on the server")
+    ap.add_argument("--skip-flood", action="store_true")
+    args = ap.parse_args()
+
+    print("limiter overhead")
+    overhead(args.checks, args.keys)
+    if args.skip_flood:
+        return
+    print(f"\nflood: {args.attackers} attackers on one address, {args.clients} legitimate clients, {args.duration:.0f}s")
+    print(f"{'store':>7}{'attacks':>9}{'legit':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}  statuses")
+    for store in ("off", "memory", "sqlite"):
+        r = flood(store, args)
+        s = r["legit"]
+        print(f"{store:>7}{r['attacks']:>9}{len(s):>7}{percentile(s, 50) * 1000:>9.1f}"
+              f"{percentile(s, 95) * 1000:>9.1f}{percentile(s, 99) * 1000:>9.1f}  {r['statuses']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Vault search: index build cost and query latency for one owner with many items.
+
+Compares the in-memory index (index time alone, and the whole /vault-items/search request)
+with a SQL LIKE scan over the owner's titles.
+
+    python bench/bench_search.py --items 100000 --queries 200
+"""
+import argparse, os, random, sys, tempfile, time, tracemalloc
+from _common import BACKEND_DIR, percentile
+
+tmp = tempfile.mkdtemp(prefix="afterme-search-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+os.environ.setdefault("AFTERME_KEYSTORE", os.path.join(tmp, "bench.keys"))
+sys.path.insert(0, BACKEND_DIR)
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+from app import models  # noqa: E402
+from app.auth import make_token  # noqa: E402
+from app.db import SessionLocal  # noqa: E402
+from app.main import app  # noqa: E402
+from app.migrate import migrate  # noqa: E402
+from app.search import SearchIndex  # noqa: E402
+
+SERVICES = [
+    "github", "gitlab", "gmail", "outlook", "amazon", "netflix", "spotify", "dropbox", "slack", "zoom",
+    "paypal", "stripe", "coinbase", "binance", "kraken", "ledger", "metamask", "chase", "wells fargo",
+    "bank of america", "fidelity", "vanguard", "schwab", "etrade", "robinhood", "facebook", "instagram",
+    "twitter", "linkedin", "reddit", "discord", "steam", "nintendo", "playstation", "xbox", "apple id",
+    "icloud", "google drive", "onedrive", "adobe", "figma", "notion", "trello", "jira", "aws console",
+    "azure portal", "digitalocean", "heroku", "namecheap", "godaddy", "cloudflare", "verizon", "comcast",
+]
+QUALIFIERS = ["personal", "work", "family", "old", "backup", "shared", "joint", "savings", "checking", "admin", "test", "kids"]
+TYPES = ["login"] * 6 + ["crypto_wallet", "secure_note"]
+
+def title(rng: random.Random, i: int) -> str:
+    return f"{rng.choice(SERVICES).title()} {rng.choice(QUALIFIERS)} {i}"
+
+QUERIES = {
+    "whole word": ["github", "savings", "paypal", "steam", "notion"],
+    "prefix (1-2 chars)": ["g", "sp", "n", "ku"],
+    "substring": ["hub", "flix", "base", "drive"],
+    "two words": ["github work", "bank savings", "google backup", "amazon kids"],
+    "rare (number)": ["4242", "99999", "12345"],
+    "type word": ["wallet", "note"],
+    "no match": ["zzzz", "qwerty"],
+}
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--items", type=int, default=100_000)
+    ap.add_argument("--queries", type=int, default=200)
+    args = ap.parse_args()
+
+    migrate()
+    rng = random.Random(1)
+    with SessionLocal() as db:
+        db.add(models.User(id=1, email="owner@bench.dev", name="owner", password_hash="x", password_salt="x"))
+        db.flush()
+        for lo in range(0, args.items, 10_000):
+            db.execute(insert(models.VaultItem), [
+                {"owner_id": 1, "title": title(rng, i), "type": TYPES[i % len(TYPES)], "encrypted_payload": "-"}
+                for i in range(lo, min(lo + 10_000, args.items))
+            ])
+        db.commit()
+
+    tracemalloc.start()
+    idx = SearchIndex(10)
+    with SessionLocal() as db:
+        t0 = time.perf_counter()
+        owner = idx.get(db, 1)
+        build = time.perf_counter() - t0
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"{args.items:,} items: index built in {build:.2f} s, {len(owner.titles.words):,} distinct words, {memory / 2**20:.1f} MiB")
+
+    client = TestClient(app)
+    headers = {"Authorization": f"Bearer {make_token(1)}"}
+    client.get("/vault-items/search", params={"q": "warm"}, headers=headers)  # the route's own index builds here
+    print(f"\n{'query kind':<20}{'matches':>9}{'index p50':>11}{'p95':>9}{'request p50':>13}{'p95':>9}{'LIKE p50':>10}")
+    with SessionLocal() as db:
+        for kind, queries in QUERIES.items():
+            index_ms, request_ms, like_ms, total = [], [], [], 0
+            for i in range(args.queries):
+                q = queries[i % len(queries)]
+                t0 = time.perf_counter()
+                _, n = owner.search(q, None, 0, 20)
+                total = n if i == 0 else total
+                index_ms.append((time.perf_counter() - t0) * 1000)
+                t0 = time.perf_counter()
+                r = client.get("/vault-items/search", params={"q": q}, headers=headers)
+                request_ms.append((time.perf_counter() - t0) * 1000)
+                assert r.status_code == 200, r.text
+                if i < 20:
+                    t0 = time.perf_counter()
+                    db.query(models.VaultItem.id).filter(models.VaultItem.owner_id == 1, models.VaultItem.title.ilike(f"%{q}%")).limit(20).all()
+                    like_ms.append((time.perf_counter() - t0) * 1000)
+            print(f"{kind:<20}{total:>9,}{percentile(index_ms, 50):>9.3f}ms{percentile(index_ms, 95):>7.3f}ms"
+                  f"{percentile(request_ms, 50):>11.2f}ms{percentile(request_ms, 95):>7.2f}ms{percentile(like_ms, 50):>8.2f}ms")
+
+    # Appends after the build: what create_item costs the index.
+    t0 = time.perf_counter()
+    for i in range(1000):
+        owner.add(10**9 + i, title(rng, i), "login")
+    print(f"\nincremental add: {(time.perf_counter() - t0) / 1000 * 1e6:.1f} us per item")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""List serialization: FastAPI's response_model path over ORM rows vs the column-projection path.
+
+"orm": hydrate VaultItem objects, validate them against list[VaultItemOut], dump, json.dumps.
+"projection": select only VaultItemOut's columns and write the JSON bytes with pydantic-core.
+Both include the query.
+
+    python bench/bench_serialize.py --rows 1000 10000 --repeat 20
+"""
+import argparse, asyncio, json, os, sys, tempfile, time
+from _common import BACKEND_DIR, percentile
+
+tmp = tempfile.mkdtemp(prefix="afterme-serialize-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+os.environ.setdefault("AFTERME_KEYSTORE", os.path.join(tmp, "bench.keys"))
+sys.path.insert(0, BACKEND_DIR)
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from app import models, schemas  # noqa: E402
+from app.db import SessionLocal  # noqa: E402
+from app.main import app  # noqa: E402
+from app.migrate import migrate  # noqa: E402
+from app.serialize import columns, rows_response  # noqa: E402
+
+def orm_path(db, field, n: int) -> bytes:
+    rows = db.query(models.VaultItem).filter(models.VaultItem.owner_id == 1).order_by(models.VaultItem.id).limit(n).all()
+    content = asyncio.run(serialize_response(field=field, response_content=rows))
+    return JSONResponse(content).body
+
+def projection_path(db, n: int) -> bytes:
+    rows = (
+        db.query(*columns(schemas.VaultItemOut, models.VaultItem))
+        .filter(models.VaultItem.owner_id == 1)
+        .order_by(models.VaultItem.id)
+        .limit(n)
+        .all()
+    )
+    return rows_response(rows, schemas.VaultItemOut).body
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, nargs="+", default=[1000, 10000])
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+
+    migrate()
+    with SessionLocal() as db:
+        db.add(models.User(email="owner@bench.dev", name="owner", password_salt="", password_hash=""))
+        db.flush()
+        db.execute(models.VaultItem.__table__.insert(), [
+            {"owner_id": 1, "title": f"account {i}", "type": "login", "encrypted_payload": "x" * 200}
+            for i in range(max(args.rows))
+        ])
+        db.commit()
+    field = next(r.response_field for r in app.routes if getattr(r, "path", "") == "/vault-items/me")
+
+    print(f"{'rows':>7}{'path':>12}{'p50 ms':>9}{'p95 ms':>9}{'rows/s':>12}")
+    for n in args.rows:
+        with SessionLocal() as db:
+            assert json.loads(orm_path(db, field, n)) == json.loads(projection_path(db, n))
+            for label, fn in (("orm", lambda: orm_path(db, field, n)), ("projection", lambda: projection_path(db, n))):
+                samples = []
+                for _ in range(args.repeat):
+                    t0 = time.perf_counter()
+                    fn()
+                    samples.append(time.perf_counter() - t0)
+                    db.expunge_all()
+                p50 = percentile(samples, 50)
+                print(f"{n:>7}{label:>12}{p50 * 1000:>9.1f}{percentile(samples, 95) * 1000:>9.1f}{n / p50:>12,.0f}")
+
+if __name__ == "__main__":
+    main()
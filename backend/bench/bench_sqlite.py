@@ -0,0 +1,60 @@
+"""Concurrent write throughput: stock SQLite settings vs the tuned engine from app.db.
+
+    python bench/bench_sqlite.py --threads 8 --seconds 5
+"""
+import argparse, os, sys, tempfile, threading, time
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from _common import BACKEND_DIR, percentile
+
+sys.path.insert(0, BACKEND_DIR)
+from app import models  # noqa: E402
+from app.db import Base, make_engine  # noqa: E402
+
+def run(engine, threads: int, seconds: float) -> dict:
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    stop = time.monotonic() + seconds
+    latencies: list[float] = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def writer(n: int):
+        while time.monotonic() < stop:
+            t0 = time.perf_counter()
+            try:
+                with Session() as db:
+                    # Read-then-write, like a typical mutating request.
+                    db.execute(select(models.AuditEvent.id).order_by(models.AuditEvent.id.desc()).limit(1)).all()
+                    db.execute(insert(models.AuditEvent).values(actor=f"bench:{n}", action="BENCH", target_type="bench", target_id=str(n)))
+                    db.commit()
+            except OperationalError:
+                with lock:
+                    errors[0] += 1
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - t0)
+
+    ts = [threading.Thread(target=writer, args=(i,)) for i in range(threads)]
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    return {"commits/s": len(latencies) / seconds, "errors": errors[0],
+            "p50 ms": percentile(latencies, 50) * 1000, "p99 ms": percentile(latencies, 99) * 1000}
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--seconds", type=float, default=5)
+    args = ap.parse_args()
+    tmp = tempfile.mkdtemp(prefix="afterme-sqlite-")
+    old = create_engine(f"sqlite:///{os.path.join(tmp, 'old.db')}", connect_args={"check_same_thread": False})
+    new = make_engine(f"sqlite:///{os.path.join(tmp, 'new.db')}")
+    for name, engine in (("default (rollback journal)", old), ("tuned (WAL)", new)):
+        stats = run(engine, args.threads, args.seconds)
+        print(f"{name:<28}" + "  ".join(f"{k}={v:.1f}" if isinstance(v, float) else f"{k}={v}" for k, v in stats.items()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""End-to-end load test of the estate lifecycle, with per-route latency and a regression baseline.
+
+Each synthetic estate goes through: register, login, create policy, add recipients and vault
+items, assign, submit a claim with uploads, approve, issue releases and view every release.
+
+    python bench/lifecycle.py --estates 20 --recipients 3 --items 10             # in-process app
+    python bench/lifecycle.py --mode http --workers 2 --concurrency 8            # local uvicorn
+    python bench/lifecycle.py --save baseline.json
+    python bench/lifecycle.py --baseline baseline.json --tolerance 0.25          # exit 1 on regression
+    python bench/lifecycle.py --mode http --workers 4 --concurrency 4 --scheduled
+
+--scheduled leaves issuing to the deadline scheduler (dispute window 0) instead of calling
+issue-releases, then checks every claim got its releases while the other estates were writing;
+the first scheduler retry is 30 s out, so a failed issue shows up as a timeout.
+
+In-process mode needs httpx (FastAPI's TestClient).
+"""
+import argparse, json, os, platform, sqlite3, sys, tempfile, threading, time, urllib.error, urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from _common import BACKEND_DIR, Server, multipart, percentile
+
+class HttpClient:
+    def __init__(self, base: str):
+        self.base = base
+
+    def request(self, method: str, path: str, json_body=None, fields=None, files=None, token=None):
+        headers = {}
+        data = None
+        if json_body is not None:
+            data = json.dumps(json_body).encode()
+            headers["Content-Type"] = "application/json"
+        elif fields is not None or files is not None:
+            data, headers["Content-Type"] = multipart(fields or {}, files or {})
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        req = urllib.request.Request(self.base + path, data=data, method=method, headers=headers)
+        try:
+            with urllib.request.urlopen(req, timeout=120) as resp:
+                raw = resp.read()
+                return resp.status, json.loads(raw) if raw else None
+        except urllib.error.HTTPError as e:
+            return e.code, None
+
+class InProcessClient:
+    def __init__(self, app):
+        from fastapi.testclient import TestClient
+
+        self.client = TestClient(app)
+        self.client.__enter__()  # runs the lifespan (migrations, background writers)
+
+    def close(self):
+        self.client.__exit__(None, None, None)
+
+    def request(self, method: str, path: str, json_body=None, fields=None, files=None, token=None):
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        resp = self.client.request(method, path, json=json_body, data=fields, files=files, headers=headers)
+        return resp.status_code, resp.json() if resp.content else None
+
+class Recorder:
+    def __init__(self):
+        self.samples: dict[str, list[float]] = {}
+        self.errors: dict[str, int] = {}
+        self.scheduled: list[int] = []
+        self._lock = threading.Lock()
+
+    def call(self, client, label: str, method: str, path: str, expect: int = 200, **kw):
+        t0 = time.perf_counter()
+        status, body = client.request(method, path, **kw)
+        elapsed = time.perf_counter() - t0
+        with self._lock:
+            self.samples.setdefault(label, []).append(elapsed)
+            if status != expect:
+                self.errors[label] = self.errors.get(label, 0) + 1
+        if status != expect:
+            raise RuntimeError(f"{label}: HTTP {status}")
+        return body
+
+def run_estate(client, rec: Recorder, n: int, args, doc: bytes):
+    email = f"owner{n}-{os.getpid()}-{time.time_ns()}@bench.dev"
+    rec.call(client, "POST /auth/register", "POST", "/auth/register", json_body={"email": email, "name": "Owner", "password": "password123"})
+    token = rec.call(client, "POST /auth/login", "POST", "/auth/login", json_body={"email": email, "password": "password123"})["token"]
+    policy = rec.call(client, "POST /policies", "POST", "/policies", json_body={"dispute_window_hours": 0}, token=token)
+    recipients = [
+        rec.call(client, "POST /recipients", "POST", "/recipients", token=token,
+                 json_body={"email": f"heir{r}-{n}@bench.dev", "legal_name": f"Heir {r}", "dob": "1990-01-01"})
+        for r in range(args.recipients)
+    ]
+    items = [
+        rec.call(client, "POST /vault-items", "POST", "/vault-items", token=token,
+                 json_body={"title": f"account {i}", "type": "login", "payload": {"username": f"user{i}", "password": "x" * 24}})
+        for i in range(args.items)
+    ]
+    for i, item in enumerate(items):
+        rec.call(client, "POST /assignments", "POST", "/assignments", token=token,
+                 json_body={"policy_id": policy["id"], "vault_item_id": item["id"], "recipient_id": recipients[i % len(recipients)]["id"]})
+    for path in ("/policies/me", "/recipients/me", "/vault-items/me"):
+        rec.call(client, f"GET {path}", "GET", path, token=token)
+    heir = recipients[0]
+    claim = rec.call(client, "POST /claims", "POST", "/claims",
+                     fields={"policy_id": str(policy["id"]), "recipient_email": heir["email"], "legal_name": heir["legal_name"], "dob": heir["dob"]},
+                     files={"id_doc": ("id.pdf", doc), "death_cert": ("dc.pdf", doc[::-1])})
+    rec.call(client, "POST /claims/{id}/approve", "POST", f"/claims/{claim['id']}/approve", fields={"admin_email": "admin@bench.dev"})
+    if args.scheduled:
+        rec.scheduled.append(claim["id"])
+        return
+    releases = rec.call(client, "POST /claims/{id}/issue-releases", "POST", f"/claims/{claim['id']}/issue-releases")
+    for release in releases:
+        path = "/release/" + release["release_url"].rsplit("/", 1)[1]
+        rec.call(client, "GET /release/{token}", "GET", path)
+
+def wait_scheduled(db_path: str, claim_ids: list[int], timeout: float) -> tuple[int, float]:
+    """(claims issued, seconds waited) once all are issued or `timeout` runs out."""
+    t0 = time.perf_counter()
+    marks = ",".join("?" * len(claim_ids))
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, timeout=5)
+    try:
+        while True:
+            done = conn.execute(
+                f"SELECT count(*) FROM claims WHERE id IN ({marks}) AND releases_issued_at IS NOT NULL", claim_ids
+            ).fetchone()[0]
+            waited = time.perf_counter() - t0
+            if done == len(claim_ids) or waited > timeout:
+                return done, waited
+            time.sleep(0.1)
+    finally:
+        conn.close()
+
+def summarize(rec: Recorder, elapsed: float) -> dict:
+    routes = {}
+    for label, samples in sorted(rec.samples.items()):
+        routes[label] = {
+            "count": len(samples),
+            "errors": rec.errors.get(label, 0),
+            "rps": len(samples) / elapsed,
+            "p50_ms": percentile(samples, 50) * 1000,
+            "p95_ms": percentile(samples, 95) * 1000,
+            "p99_ms": percentile(samples, 99) * 1000,
+        }
+    return routes
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list[str]:
+    for key in ("mode", "estates", "recipients", "items", "doc_kb", "concurrency", "workers"):
+        if current["meta"][key] != baseline["meta"].get(key):
+            print(f"warning: baseline was run with {key}={baseline['meta'].get(key)}, this run has {current['meta'][key]}")
+    regressions = []
+    for label, stats in current["routes"].items():
+        base = baseline["routes"].get(label)
+        if not base:
+            continue
+        for key in ("p95_ms", "p99_ms"):
+            # Ignore sub-millisecond noise.
+            if stats[key] > base[key] * (1 + tolerance) and stats[key] - base[key] > 1.0:
+                regressions.append(f"{label} {key}: {base[key]:.1f} -> {stats[key]:.1f}")
+    if current["estates_per_s"] < baseline["estates_per_s"] / (1 + tolerance):
+        regressions.append(f"estates/s: {baseline['estates_per_s']:.2f} -> {current['estates_per_s']:.2f}")
+    return regressions
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--mode", choices=["inprocess", "http"], default="inprocess")
+    ap.add_argument("--estates", type=int, default=20)
+    ap.add_argument("--recipients", type=int, default=3)
+    ap.add_argument("--items", type=int, default=10)
+    ap.add_argument("--doc-kb", type=int, default=256, help="size of each uploaded claim document")
+    ap.add_argument("--concurrency", type=int, default=1)
+    ap.add_argument("--workers", type=int, default=1, help="uvicorn workers (http mode)")
+    ap.add_argument("--scheduled", action="store_true", help="let the deadline scheduler issue releases, and check it did")
+    ap.add_argument("--scheduled-timeout", type=float, default=20.0)
+    ap.add_argument("--save", help="write results as a JSON baseline")
+    ap.add_argument("--baseline", help="compare against a saved baseline")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown before flagging")
+    args = ap.parse_args()
+    # In-process mode changes directory to a scratch dir.
+    args.save = args.save and os.path.abspath(args.save)
+    args.baseline = args.baseline and os.path.abspath(args.baseline)
+
+    doc = os.urandom(args.doc_kb * 1024)
+    rec = Recorder()
+    server = None
+    if args.mode == "http":
+        server = Server(workers=args.workers).__enter__()
+        client = HttpClient(server.base)
+    else:
+        workdir = tempfile.mkdtemp(prefix="afterme-lifecycle-")
+        os.chdir(workdir)  # fresh database, keystore and uploads
+        sys.path.insert(0, BACKEND_DIR)
+        from app.main import app
+
+        client = InProcessClient(app)
+
+    failures = 0
+    t0 = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(args.concurrency) as ex:
+            for fut in [ex.submit(run_estate, client, rec, n, args, doc) for n in range(args.estates)]:
+                try:
+                    fut.result()
+                except RuntimeError as e:
+                    failures += 1
+                    print("estate failed:", e, file=sys.stderr)
+        elapsed = time.perf_counter() - t0
+        if rec.scheduled:
+            db_path = os.path.join(server.workdir if server else os.getcwd(), "afterme.db")
+            issued, waited = wait_scheduled(db_path, rec.scheduled, args.scheduled_timeout)
+            print(f"scheduled issuance: {issued}/{len(rec.scheduled)} claims issued, {waited:.1f}s after the last estate")
+            failures += len(rec.scheduled) - issued
+    finally:
+        if server:
+            server.__exit__(None, None, None)
+        else:
+            client.close()
+
+    result = {
+        "meta": {
+            "mode": args.mode, "estates": args.estates, "recipients": args.recipients, "items": args.items,
+            "doc_kb": args.doc_kb, "concurrency": args.concurrency, "workers": args.workers,
+            "python": platform.python_version(), "cpus": os.cpu_count(), "at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "elapsed_s": elapsed,
+        "estates_per_s": (args.estates - failures) / elapsed,
+        "requests_per_s": sum(len(s) for s in rec.samples.values()) / elapsed,
+        "failed_estates": failures,
+        "routes": summarize(rec, elapsed),
+    }
+
+    print(f"{args.estates - failures}/{args.estates} estates in {elapsed:.1f}s: "
+          f"{result['estates_per_s']:.2f} estates/s, {result['requests_per_s']:.0f} req/s")
+    print(f"{'route':<34}{'count':>7}{'err':>5}{'rps':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for label, s in result["routes"].items():
+        print(f"{label:<34}{s['count']:>7}{s['errors']:>5}{s['rps']:>8.1f}{s['p50_ms']:>9.1f}{s['p95_ms']:>9.1f}{s['p99_ms']:>9.1f}")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        for r in regressions:
+            print("REGRESSION", r)
+        if regressions:
+            sys.exit(1)
+    if failures:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
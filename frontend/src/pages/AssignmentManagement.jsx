@@ -11,6 +11,8 @@ export default function AssignmentManagement() {
   const [policies, setPolicies] = useState([]);
   const [recipients, setRecipients] = useState([]);
   const [vaultItems, setVaultItems] = useState([]);
+  const [itemQuery, setItemQuery] = useState('');
+  const [itemMatches, setItemMatches] = useState(null);
   const [loading, setLoading] = useState(true);
   const [showCreateModal, setShowCreateModal] = useState(false);
   const [formData, setFormData] = useState({
@@ -25,6 +27,20 @@ export default function AssignmentManagement() {
     loadData();
   }, []);
 
+  useEffect(() => {
+    const q = itemQuery.trim();
+    if (!q) {
+      setItemMatches(null);
+      return;
+    }
+    const timer = setTimeout(() => {
+      vaultItemsAPI.search(q, { limit: 50 })
+        .then(setItemMatches)
+        .catch((err) => console.error('Failed to search vault items:', err));
+    }, 150);
+    return () => clearTimeout(timer);
+  }, [itemQuery]);
+
   const loadData = async () => {
     try {
       const [policiesData, recipientsData, vaultItemsData] = await Promise.all([
@@ -54,6 +70,7 @@ export default function AssignmentManagement() {
       );
       setShowCreateModal(false);
       setFormData({ policy_id: '', vault_item_id: '', recipient_id: '', permission: 'view' });
+      setItemQuery('');
       alert('Assignment created successfully!');
     } catch (err) {
       console.error('Failed to create assignment:', err);
@@ -169,6 +186,13 @@ export default function AssignmentManagement() {
                 <label className="block text-sm font-medium text-gray-700 mb-2">
                   Vault Item <span className="text-red-500">*</span>
                 </label>
+                <input
+                  type="search"
+                  value={itemQuery}
+                  onChange={(e) => setItemQuery(e.target.value)}
+                  placeholder="Search by title or type"
+                  className="w-full px-4 py-2 mb-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-primary-500 focus:border-primary-500"
+                />
                 <select
                   value={formData.vault_item_id}
                   onChange={(e) => setFormData({ ...formData, vault_item_id: e.target.value })}
@@ -176,7 +200,7 @@ export default function AssignmentManagement() {
                   required
                 >
                   <option value="">Select a vault item</option>
-                  {vaultItems.map((item) => (
+                  {(itemMatches ?? vaultItems).map((item) => (
                     <option key={item.id} value={item.id}>
                       {item.title} ({item.type})
                     </option>
@@ -3,7 +3,7 @@ import { Link } from 'react-router-dom';
 import Layout from '../components/Layout';
 import Card from '../components/Card';
 import Button from '../components/Button';
-import { policiesAPI, recipientsAPI, vaultItemsAPI } from '../services/api';
+import { dashboardAPI } from '../services/api';
 import { FileText, Users, Lock, ArrowRight, Plus } from 'lucide-react';
 
 export default function OwnerDashboard() {
@@ -20,15 +20,11 @@ export default function OwnerDashboard() {
 
   const loadStats = async () => {
     try {
-      const [policies, recipients, vaultItems] = await Promise.all([
-        policiesAPI.list(),
-        recipientsAPI.list(),
-        vaultItemsAPI.list(),
-      ]);
+      const dashboard = await dashboardAPI.get();
       setStats({
-        policies: policies.length,
-        recipients: recipients.length,
-        vaultItems: vaultItems.length,
+        policies: dashboard.policies.length,
+        recipients: dashboard.recipients.length,
+        vaultItems: dashboard.items.total,
       });
     } catch (err) {
       console.error('Failed to load stats:', err);
@@ -31,6 +31,19 @@ api.interceptors.response.use(
   }
 );
 
+// Follow X-Next-Cursor until the list is exhausted. Pages carry ETags, so the
+// browser cache revalidates unchanged pages with a 304 instead of a full download.
+const listAll = async (path) => {
+  const items = [];
+  let cursor = null;
+  do {
+    const response = await api.get(path, { params: cursor ? { cursor } : {} });
+    items.push(...response.data);
+    cursor = response.headers['x-next-cursor'];
+  } while (cursor);
+  return items;
+};
+
 // Auth API
 export const authAPI = {
   login: async (email, name) => {
@@ -59,10 +72,7 @@ export const policiesAPI = {
     const response = await api.post('/policies', { dispute_window_hours: disputeWindowHours });
     return response.data;
   },
-  list: async () => {
-    const response = await api.get('/policies/me');
-    return response.data;
-  },
+  list: async () => listAll('/policies/me'),
 };
 
 // Recipients API
@@ -71,10 +81,7 @@ export const recipientsAPI = {
     const response = await api.post('/recipients', { email, legal_name: legalName, dob });
     return response.data;
   },
-  list: async () => {
-    const response = await api.get('/recipients/me');
-    return response.data;
-  },
+  list: async () => listAll('/recipients/me'),
 };
 
 // Vault Items API
@@ -83,8 +90,9 @@ export const vaultItemsAPI = {
     const response = await api.post('/vault-items', { title, type, payload });
     return response.data;
   },
-  list: async () => {
-    const response = await api.get('/vault-items/me');
+  list: async () => listAll('/vault-items/me'),
+  search: async (q, params = {}) => {
+    const response = await api.get('/vault-items/search', { params: { q, ...params } });
     return response.data;
   },
 };
@@ -144,6 +152,14 @@ export const releasesAPI = {
   },
 };
 
+// Dashboard API: one request (revalidated by ETag) instead of a call per list
+export const dashboardAPI = {
+  get: async () => {
+    const response = await api.get('/dashboard/me');
+    return response.data;
+  },
+};
+
 // Audit API
 export const auditAPI = {
   list: async () => {